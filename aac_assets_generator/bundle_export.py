@@ -0,0 +1,341 @@
+"""把整個系列（或任意多份結果）打包成一個 ZIP
+
+文件以有限的並行數逐份產生，完成一份就寫入 ZIP 並釋放；記憶體中同時最多只有
+workers + 1 份文件，不隨文件數增加。ZIP 可寫到磁碟上的檔案或任何可寫入的串流。
+最後附上 manifest.json，以及可選的合併 PDF 手冊。
+"""
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+from loguru import logger
+from reportlab.platypus import PageBreak, Paragraph
+from reportlab.platypus.doctemplate import ActionFlowable
+
+from aac_assets_generator import pdf_templates
+from aac_assets_generator.memory_governor import get_artifact_store
+from aac_assets_generator.pipeline import fetch_board_context, generate_board_assets
+from aac_assets_generator.prefetch import find_sibling_boards
+from aac_assets_generator.result_cache import get_result_cache
+from aac_assets_generator.roster import Roster
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.session_cache import SessionResult, result_key
+from aac_assets_generator.utils import (
+    combine_pdf_buffers,
+    create_backend_session,
+    extract_main_title,
+    generate_combined_docx,
+)
+
+BUNDLE_DIR = os.getenv("AAC_BUNDLE_DIR", os.path.join(tempfile.gettempdir(), "aac_bundles"))
+# 同時產生的文件數；ReportLab 排版受 GIL 限制，並行主要省下 DOCX 壓縮與磁碟 I/O 的時間
+BUNDLE_WORKERS = int(os.getenv("AAC_BUNDLE_WORKERS", "2"))
+# 打包時往前、往後各最多探查幾個版面 ID；探查遇到第一個缺口即停止，可以設得比預取大
+BUNDLE_SERIES_WINDOW = int(os.getenv("AAC_BUNDLE_SERIES_WINDOW", "20"))
+# 磁碟上的 ZIP 超過此時間即刪除（秒）
+BUNDLE_TTL = float(os.getenv("AAC_BUNDLE_TTL", "3600"))
+
+MANIFEST_NAME = "manifest.json"
+BOOKLET_NAME = "booklet.pdf"
+_UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+@dataclass
+class BundleItem:
+    """要打包的一份結果；result 為 None 或不完整時只記錄在 manifest 中"""
+
+    name: str
+    result: Optional[SessionResult]
+
+
+class _SectionTitle(ActionFlowable):
+    """手冊中換到下一份文件時，把頁首標題換成該文件的標題"""
+
+    def __init__(self, title: str):
+        ActionFlowable.__init__(self)
+        self.title = title
+
+    def apply(self, doc):
+        doc.title = self.title
+
+
+class _LazyFlowables(list):
+    """doc.build 逐一取用並刪除 flowable；清單用完時才向產生器要下一份文件的內容"""
+
+    def __init__(self, documents: Iterable[List]):
+        super().__init__()
+        self._documents = iter(documents)
+
+    def __len__(self):
+        while not super().__len__():
+            elements = next(self._documents, None)
+            if elements is None:
+                break
+            self.extend(elements)
+        return super().__len__()
+
+
+def _safe_name(name: str) -> str:
+    return _UNSAFE_NAME.sub("_", name).strip("_") or "document"
+
+
+def _render(item: BundleItem, learningasset_generator, learningevaluate_generator, booklet):
+    """回傳 (PDF, DOCX, 手冊用的 flowable)；已在 ArtifactStore 中的檔案不重新產生"""
+    result = item.result
+    store = get_artifact_store()
+
+    def elements():
+        return learningasset_generator.markdown_to_pdf(
+            result.learning_asset, result.main_title, result.sub_title, result.case_info
+        ) + learningevaluate_generator.markdown_to_pdf(result.learning_evaluate)
+
+    pdf_bytes = store.get(result.pdf_handle)
+    if pdf_bytes is None:
+        pdf_bytes = combine_pdf_buffers(
+            elements(), [], title=f"{result.main_title}-{result.sub_title}"
+        ).getvalue()
+    docx_bytes = store.get(result.docx_handle)
+    if docx_bytes is None:
+        docx_bytes = generate_combined_docx(
+            result.learning_asset,
+            result.learning_evaluate,
+            result.main_title,
+            result.sub_title,
+            result.case_info,
+        ).getvalue()
+    # flowable 排版後不能重複使用，手冊需要另一份
+    return pdf_bytes, docx_bytes, elements() if booklet else None
+
+
+class BundleWriter:
+    """依序寫入 ZIP 項目並累積 manifest"""
+
+    def __init__(self, bundle, learningasset_generator, learningevaluate_generator, booklet):
+        self.bundle = bundle
+        self.learningasset_generator = learningasset_generator
+        self.learningevaluate_generator = learningevaluate_generator
+        self.booklet = booklet
+        self.entries: List[dict] = []
+
+    def _write_file(self, path: str, data: bytes) -> dict:
+        self.bundle.writestr(path, data)
+        return {"path": path, "bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+    def documents(self, items: Iterable[BundleItem], workers: int) -> Iterator[List]:
+        """產生並寫入每份文件；每寫完一份就回傳它在手冊中的 flowable"""
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aac-bundle") as executor:
+            for index, item in enumerate(items, start=1):
+                future = None
+                if item.result is not None and item.result.is_complete:
+                    future = executor.submit(
+                        _render,
+                        item,
+                        self.learningasset_generator,
+                        self.learningevaluate_generator,
+                        self.booklet,
+                    )
+                pending.append((index, item, future))
+                # 只保留 workers 份在產生中，寫入最早的一份後才繼續取下一個項目
+                while len(pending) > workers:
+                    elements = self._write(*pending.popleft())
+                    if elements:
+                        yield elements
+            while pending:
+                elements = self._write(*pending.popleft())
+                if elements:
+                    yield elements
+
+    def _write(self, index: int, item: BundleItem, future) -> Optional[List]:
+        entry = {"index": index, "name": item.name, "files": []}
+        self.entries.append(entry)
+        if future is None:
+            entry["status"] = "missing"
+            return None
+        try:
+            pdf_bytes, docx_bytes, elements = future.result()
+        except Exception as e:
+            logger.error(f"打包 {item.name} 時發生錯誤: {str(e)}")
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+            return None
+        result = item.result
+        base = f"{index:03d}-{_safe_name(item.name)}"
+        entry["files"].append(self._write_file(f"{base}.pdf", pdf_bytes))
+        entry["files"].append(self._write_file(f"{base}.docx", docx_bytes))
+        entry.update(
+            status="ok",
+            title=f"{result.main_title}-{result.sub_title}",
+            content_hash=result.content_hash,
+            generated_at=time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(result.generated_at)),
+        )
+        if not elements:
+            return None
+        # 每份文件從新的一頁開始，頁首顯示該文件的標題
+        return [_SectionTitle(entry["title"]), PageBreak()] + elements
+
+
+def export_bundle(
+    items: Iterable[BundleItem],
+    output,
+    learningasset_generator,
+    learningevaluate_generator,
+    title: str = "",
+    booklet: bool = False,
+    workers: int = BUNDLE_WORKERS,
+) -> dict:
+    """把 items 打包成 ZIP 寫入 output（檔案路徑或可寫入的串流），回傳 manifest
+
+    items 可以是產生器：項目在寫入前一刻才取出，需要時才生成。
+    """
+    start = time.perf_counter()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as bundle:
+        writer = BundleWriter(bundle, learningasset_generator, learningevaluate_generator, booklet)
+        documents = writer.documents(items, max(workers, 1))
+        booklet_file = None
+        if booklet:
+            # 手冊與 ZIP 同時逐份產生：doc.build 需要下一個 flowable 時才產生下一份文件
+            os.makedirs(BUNDLE_DIR, exist_ok=True)
+            fd, booklet_file = tempfile.mkstemp(suffix=".pdf", dir=BUNDLE_DIR)
+            os.close(fd)
+            cover = [Paragraph(title or "AAC 教材合輯", pdf_templates.get_styles()["Heading1"])]
+            try:
+                pdf_templates.build_pdf(
+                    _LazyFlowables(itertools.chain([cover], documents)), title, output=booklet_file
+                )
+            except BaseException:
+                os.remove(booklet_file)
+                raise
+        else:
+            for _ in documents:
+                pass
+        manifest = {
+            "title": title,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "documents": writer.entries,
+            "ok": sum(1 for entry in writer.entries if entry["status"] == "ok"),
+            "booklet": None,
+        }
+        if booklet_file is not None:
+            if manifest["ok"]:
+                bundle.write(booklet_file, BOOKLET_NAME)
+                manifest["booklet"] = BOOKLET_NAME
+            os.remove(booklet_file)
+        bundle.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+    logger.info(
+        f"打包完成：{manifest['ok']}/{len(writer.entries)} 份文件，"
+        f"耗時 {time.perf_counter() - start:.1f}s"
+    )
+    return manifest
+
+
+async def series_boards(api_key, board_id, window=BUNDLE_SERIES_WINDOW):
+    """目前版面與相鄰同系列版面的 [(board_id, prompt_data)]（依版面 ID 排序）與使用者資料"""
+    user_data, prompt_data = await fetch_board_context(api_key, board_id)
+    main_title = extract_main_title(prompt_data["promptContent"])
+    async with create_backend_session() as session:
+        siblings = await find_sibling_boards(
+            session,
+            api_key,
+            board_id,
+            main_title,
+            window=window,
+            user_account=user_data.get("userAccount"),
+        )
+    boards = sorted(
+        [(str(board_id), prompt_data)] + siblings,
+        key=lambda board: int(board[0]) if board[0].isdigit() else 0,
+    )
+    return user_data, main_title, boards
+
+
+def series_items(
+    api_key,
+    user_data,
+    boards,
+    learningasset_generator=None,
+    learningevaluate_generator=None,
+) -> Iterator[BundleItem]:
+    """依序取出每個版面的結果；有傳入產生器時，快取中沒有的版面會在輪到它時才生成"""
+    result_cache = get_result_cache()
+    for board_id, prompt_data in boards:
+        key = result_key(api_key, board_id)
+        result = result_cache.get(key, allow_stale=True)
+        if result is None and learningasset_generator is not None:
+            logger.info(f"打包時生成版面 {board_id}")
+            result = SessionResult(
+                *asyncio.run(
+                    generate_board_assets(
+                        user_data,
+                        prompt_data,
+                        learningasset_generator,
+                        learningevaluate_generator,
+                        priority=Priority.BATCH,
+                    )
+                )
+            )
+            result_cache.put(key, result)
+        yield BundleItem(f"{board_id}-{prompt_data.get('promptTitle') or board_id}", result)
+
+
+def roster_items(roster: Roster, boards, results) -> Iterator[BundleItem]:
+    """把 generate_roster_assets 的結果依學生、版面順序轉成打包項目（結果物件在取出時才建立）"""
+    names = roster.frame["name"]
+    for row in range(len(roster)):
+        for board_id, prompt_data in boards:
+            result = results.get((row, board_id))
+            yield BundleItem(
+                f"{names.iloc[row]}-{prompt_data.get('promptTitle') or board_id}",
+                SessionResult(*result) if result is not None else None,
+            )
+
+
+def _sweep_bundles():
+    cutoff = time.time() - BUNDLE_TTL
+    for entry in os.scandir(BUNDLE_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def build_series_bundle(
+    api_key,
+    board_id,
+    learningasset_generator,
+    learningevaluate_generator,
+    booklet=False,
+    generate_missing=False,
+):
+    """把目前版面所屬系列打包成 BUNDLE_DIR 下的 ZIP，回傳 (路徑, manifest)"""
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    _sweep_bundles()
+    user_data, main_title, boards = asyncio.run(series_boards(api_key, board_id))
+    items = series_items(
+        api_key,
+        user_data,
+        boards,
+        learningasset_generator if generate_missing else None,
+        learningevaluate_generator if generate_missing else None,
+    )
+    path = os.path.join(BUNDLE_DIR, f"{result_key(api_key, board_id)}-{int(time.time())}.zip")
+    manifest = export_bundle(
+        items,
+        path,
+        learningasset_generator,
+        learningevaluate_generator,
+        title=main_title,
+        booklet=booklet,
+    )
+    return path, manifest
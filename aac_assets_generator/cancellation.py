@@ -0,0 +1,172 @@
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import streamlit as st
+from loguru import logger
+
+from aac_assets_generator.deadline import DeadlineExceeded
+from aac_assets_generator.memory_governor import current_session_id
+from aac_assets_generator.state_backend import finish_job, publish_job
+
+# script 執行緒檢查重跑/分頁關閉的間隔（秒）
+CANCEL_POLL_INTERVAL = float(os.getenv("AAC_CANCEL_POLL_INTERVAL", "0.5"))
+# 使用者離開後是否讓生成跑完並寫入結果快取（預設直接取消，釋放名額與 token）
+KEEP_ABANDONED_RESULTS = os.getenv("AAC_KEEP_ABANDONED_RESULTS", "0") == "1"
+
+
+class GenerationCancelled(Exception):
+    """生成工作被取消（例如透過 JobRegistry.cancel）"""
+
+
+class BackgroundLoop:
+    """在獨立執行緒中持續運作的 event loop；工作可從其他執行緒提交與取消"""
+
+    def __init__(self, name: str = "aac-generation-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+class GenerationJob:
+    def __init__(self, job_id: int, key: str, session_id: Optional[str], future):
+        self.job_id = job_id
+        self.key = key
+        self.session_id = session_id
+        self.future: concurrent.futures.Future = future
+        self.started_at = time.monotonic()
+
+    def cancel(self, reason: str = "") -> bool:
+        """取消背景 task；CancelledError 會傳到等待中的 OpenAI/aiohttp 請求並中斷連線"""
+        if self.future.done():
+            return False
+        logger.info(f"取消生成工作 {self.job_id}（{reason or '未註明原因'}）")
+        return self.future.cancel()
+
+    def abandon(self, keep_result: Optional[Callable] = None):
+        """呼叫端不再等待：有指定 keep_result 時讓工作跑完並交給它保存，否則取消"""
+        if self.future.done():
+            return
+        if keep_result is None:
+            self.cancel("session 重跑或已關閉")
+            return
+
+        def _keep(future):
+            if future.cancelled() or future.exception() is not None:
+                return
+            try:
+                keep_result(future.result())
+            except Exception as e:
+                logger.error(f"保存已放棄工作的結果時發生錯誤: {str(e)}")
+
+        logger.info(f"生成工作 {self.job_id} 已無人等待，繼續執行以寫入快取")
+        self.future.add_done_callback(_keep)
+
+
+class JobRegistry:
+    """追蹤進行中的生成工作，可依工作 ID、快取鍵或 session 取消
+
+    共享狀態啟用時，同時記錄各快取鍵的工作狀態，其他副本可得知該鍵正在生成。
+    """
+
+    def __init__(self, background_loop: Optional[BackgroundLoop] = None):
+        self._background_loop = background_loop
+        self._jobs: Dict[int, GenerationJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def background_loop(self) -> BackgroundLoop:
+        with self._lock:
+            if self._background_loop is None:
+                self._background_loop = BackgroundLoop()
+            return self._background_loop
+
+    def start(self, coro, key: str = "", session_id: Optional[str] = None) -> GenerationJob:
+        future = self.background_loop.submit(coro)
+        with self._lock:
+            job = GenerationJob(next(self._ids), key, session_id, future)
+            self._jobs[job.job_id] = job
+        publish_job(key, job.job_id)
+        future.add_done_callback(lambda _: self._forget(job))
+        return job
+
+    def _forget(self, job: GenerationJob):
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+        try:
+            finish_job(job.key, job.job_id)
+        except Exception as e:
+            logger.warning(f"清除共享的工作狀態失敗: {str(e)}")
+
+    def active(self) -> List[GenerationJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: int, reason: str = "手動取消") -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job is not None and job.cancel(reason)
+
+    def cancel_matching(self, key=None, session_id=None, reason: str = "手動取消") -> int:
+        cancelled = 0
+        for job in self.active():
+            if key is not None and job.key != key:
+                continue
+            if session_id is not None and job.session_id != session_id:
+                continue
+            cancelled += job.cancel(reason)
+        return cancelled
+
+
+_job_registry = JobRegistry()
+
+
+def get_job_registry() -> JobRegistry:
+    return _job_registry
+
+
+def run_cancellable(
+    coro,
+    key: str = "",
+    keep_result: Optional[Callable] = None,
+    deadline: Optional[float] = None,
+):
+    """在背景 loop 執行生成工作，script 執行緒輪詢等待
+
+    等待期間定期更新 placeholder：Streamlit 只在送出元素時檢查重跑/停止要求，
+    這讓 session 重跑或關閉時能丟出 RerunException/StopException，接著取消背景工作。
+    超過 deadline 時丟出 DeadlineExceeded，工作交給 keep_result 在背景完成。
+    """
+    job = get_job_registry().start(coro, key=key, session_id=current_session_id())
+    placeholder = st.empty()
+    finished = False
+    try:
+        while True:
+            try:
+                result = job.future.result(timeout=CANCEL_POLL_INTERVAL)
+                finished = True
+                break
+            except concurrent.futures.TimeoutError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    placeholder.empty()
+                    raise DeadlineExceeded(job)
+                placeholder.caption(f"已等待 {time.monotonic() - job.started_at:.0f} 秒")
+            except concurrent.futures.CancelledError:
+                raise GenerationCancelled(f"生成工作 {job.job_id} 已取消")
+    finally:
+        if not finished:
+            job.abandon(keep_result)
+    placeholder.empty()
+    return result
@@ -0,0 +1,219 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from loguru import logger
+
+from aac_assets_generator.deadline import budget
+
+# 設為 0 時停用斷路器（所有呼叫直接送出）
+BREAKER_ENABLED = os.getenv("AAC_BREAKER_ENABLED", "1") == "1"
+# 統計錯誤率與慢呼叫比例的時間窗（秒）與最少呼叫數
+BREAKER_WINDOW = float(os.getenv("AAC_BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("AAC_BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("AAC_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_RATE = float(os.getenv("AAC_BREAKER_SLOW_RATE", "0.8"))
+# 斷路後多久放行試探請求（秒）與同時放行的試探數
+BREAKER_OPEN_SECONDS = float(os.getenv("AAC_BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("AAC_BREAKER_HALF_OPEN_PROBES", "1"))
+# 後端請求的逾時與慢呼叫門檻（秒）；OpenAI 只設慢呼叫門檻，逾時沿用 client 設定
+BACKEND_TIMEOUT = float(os.getenv("AAC_BACKEND_TIMEOUT", "15"))
+BACKEND_SLOW_CALL = float(os.getenv("AAC_BACKEND_SLOW_CALL", "5"))
+OPENAI_SLOW_CALL = float(os.getenv("AAC_OPENAI_SLOW_CALL", "240"))
+
+BACKEND = "aac_backend"
+OPENAI = "openai"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """上游服務的斷路器開啟中，請求直接失敗而不等待逾時"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} 暫時無法使用，約 {max(retry_after, 1):.0f} 秒後重試")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """依近期錯誤率與慢呼叫比例斷路；開啟一段時間後放行少量試探請求，成功即恢復
+
+    狀態存在模組層級，同一程序內所有 session 共用。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        window: float = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_rate: float = BREAKER_SLOW_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.is_failure = is_failure or (lambda error: True)
+        # 可替換的時鐘（測試用），也用來計算呼叫耗時
+        self.clock = clock
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (完成時間, 是否失敗, 是否過慢)
+        self._calls: deque = deque()
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _transition(self, state: str, now: float):
+        if state == self.state:
+            return
+        logger.warning(f"斷路器 {self.name}: {self.state} -> {state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = now
+        if state != HALF_OPEN:
+            self._probes = 0
+        if state == CLOSED:
+            self._calls.clear()
+
+    def retry_after(self) -> float:
+        return max(self._opened_at + self.open_seconds - self.clock(), 0.0)
+
+    def check(self):
+        """斷路中時拋出 CircuitOpenError；不佔用試探名額"""
+        with self._lock:
+            if self.state == OPEN and self.clock() - self._opened_at < self.open_seconds:
+                self._rejected += 1
+                raise CircuitOpenError(self.name, self.retry_after())
+
+    def _acquire(self):
+        now = self.clock()
+        with self._lock:
+            if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN, now)
+            if self.state == OPEN or (
+                self.state == HALF_OPEN and self._probes >= self.half_open_probes
+            ):
+                self._rejected += 1
+                raise CircuitOpenError(self.name, self.retry_after())
+            if self.state == HALF_OPEN:
+                self._probes += 1
+
+    def _record(self, failed: bool, seconds: float):
+        now = self.clock()
+        slow = seconds > self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                self._transition(OPEN if failed or slow else CLOSED, now)
+                return
+            self._calls.append((now, failed, slow))
+            self._trim(now)
+            total = len(self._calls)
+            if self.state != CLOSED or total < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            if failures / total >= self.error_rate or slow_calls / total >= self.slow_rate:
+                self._transition(OPEN, now)
+
+    def _release(self):
+        # 呼叫被取消時沒有結果可記錄，只歸還試探名額
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+
+    @asynccontextmanager
+    async def guard(self):
+        """包住一次上游呼叫：斷路中直接失敗，否則記錄結果與耗時"""
+        if not BREAKER_ENABLED:
+            yield
+            return
+        self._acquire()
+        start = self.clock()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self._release()
+            raise
+        except Exception as e:
+            self._record(self.is_failure(e), self.clock() - start)
+            raise
+        self._record(False, self.clock() - start)
+
+    def metrics(self) -> dict:
+        now = self.clock()
+        with self._lock:
+            self._trim(now)
+            total = len(self._calls)
+            return {
+                "state": self.state,
+                "calls": total,
+                "error_rate": sum(1 for _, f, _ in self._calls if f) / total if total else 0.0,
+                "slow_rate": sum(1 for _, _, s in self._calls if s) / total if total else 0.0,
+                "rejected": self._rejected,
+            }
+
+
+def _backend_failure(error: BaseException) -> bool:
+    # 使用者的 API 金鑰錯誤等 4xx 不代表後端故障
+    status = getattr(error, "status", None)
+    return status is None or status >= 500 or status == 429
+
+
+def _openai_failure(error: BaseException) -> bool:
+    # 請求內容本身的錯誤（4xx）不計入，限流與伺服器錯誤、連線逾時才算
+    status = getattr(error, "status_code", None)
+    return status is None or status >= 500 or status == 429
+
+
+_breakers = {
+    BACKEND: CircuitBreaker(BACKEND, BACKEND_SLOW_CALL, is_failure=_backend_failure),
+    OPENAI: CircuitBreaker(OPENAI, OPENAI_SLOW_CALL, is_failure=_openai_failure),
+}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    return _breakers[name]
+
+
+def breaker_metrics() -> dict:
+    return {name: breaker.metrics() for name, breaker in _breakers.items()}
+
+
+def protected(name: str, timeout: Optional[float] = None):
+    """以斷路器保護 async 函式；timeout 到期時視為失敗，不讓呼叫端一直等待
+
+    請求設有時限時，timeout 不超過剩餘時間。
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            async with get_breaker(name).guard():
+                if timeout is None:
+                    return await fn(*args, **kwargs)
+                return await asyncio.wait_for(fn(*args, **kwargs), budget(timeout))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,92 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from aac_assets_generator.state_backend import running_elsewhere
+
+# 頁面請求的端到端時限（秒）；逾時且有舊結果時先顯示舊結果，0 為不限制
+REQUEST_DEADLINE = float(os.getenv("AAC_REQUEST_DEADLINE", "60"))
+# 時限將至時，每個階段仍至少給的時間（秒）
+MIN_STAGE_BUDGET = float(os.getenv("AAC_MIN_STAGE_BUDGET", "2"))
+# 顯示舊結果時，檢查新結果是否完成的間隔（秒）
+STALE_REFRESH_INTERVAL = float(os.getenv("AAC_STALE_REFRESH_INTERVAL", "3"))
+
+# 目前請求的截止時間（time.monotonic()），由 deadline_scope 設定
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "aac_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """等待生成超過時限；job 仍在背景執行"""
+
+    def __init__(self, job):
+        super().__init__(f"生成工作 {job.job_id} 超過時限，改在背景完成")
+        self.job = job
+
+
+def deadline_after(seconds: float = REQUEST_DEADLINE) -> Optional[float]:
+    return time.monotonic() + seconds if seconds > 0 else None
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]):
+    """此範圍內的後端請求與 LLM 階段依剩餘時間調整逾時與推理強度"""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """距離截止時間的秒數；沒有設定時限時回傳 None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def budget(limit: float) -> float:
+    """階段可用的時間：不超過原本的上限，也不超過剩餘時間（但至少 MIN_STAGE_BUDGET）"""
+    left = remaining()
+    if left is None:
+        return limit
+    return min(limit, max(left, MIN_STAGE_BUDGET))
+
+
+class RefreshTracker:
+    """逾時後仍在背景生成的工作；同一快取鍵只保留一個，重新整理頁面時不會重複生成
+
+    共享狀態啟用時，其他副本正在生成的鍵也視為進行中（重新整理後被分到別的副本）。
+    """
+
+    def __init__(self):
+        self._futures: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def track(self, key: str, future):
+        with self._lock:
+            self._futures[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+
+    def _forget(self, key: str, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def pending(self, key: str) -> bool:
+        with self._lock:
+            if key in self._futures:
+                return True
+        return running_elsewhere(key)
+
+
+_refresh_tracker = RefreshTracker()
+
+
+def get_refresh_tracker() -> RefreshTracker:
+    return _refresh_tracker
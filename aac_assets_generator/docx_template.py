@@ -0,0 +1,233 @@
+import functools
+import io
+import os
+import re
+import zipfile
+from typing import List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+from docx import Document
+from docx.shared import Pt
+
+from aac_assets_generator.learning_asset_models import LearningAsset
+from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+
+# 可指定預先做好的 .docx 範本（需包含 Title/Heading1/Heading2/TableGrid 樣式）
+DOCX_TEMPLATE_PATH = os.getenv("AAC_DOCX_TEMPLATE", "")
+
+_DOCUMENT_PART = "word/document.xml"
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_TABLE_LOOK = (
+    '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+    'w:noHBand="0" w:noVBand="1" w:val="04A0"/>'
+)
+_PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+
+class DocxTemplate:
+    """載入一次的 .docx 範本：保留樣式等所有零件，每份文件只重新產生 document.xml"""
+
+    def __init__(self, template_bytes: bytes):
+        with zipfile.ZipFile(io.BytesIO(template_bytes)) as template_zip:
+            self.parts = [
+                (info, template_zip.read(info.filename))
+                for info in template_zip.infolist()
+                if info.filename != _DOCUMENT_PART
+            ]
+            document_xml = template_zip.read(_DOCUMENT_PART).decode("utf-8")
+        body_start = document_xml.index("<w:body>") + len("<w:body>")
+        self.document_head = document_xml[:body_start]
+        sect_pr = re.search(r"<w:sectPr[ >].*</w:sectPr>", document_xml, re.DOTALL)
+        self.document_tail = (sect_pr.group(0) if sect_pr else "") + "</w:body></w:document>"
+        page_width = re.search(r'<w:pgSz w:w="(\d+)"', self.document_tail)
+        margins = re.findall(r'w:(?:left|right)="(\d+)"', self.document_tail)
+        if page_width and len(margins) >= 2:
+            self.text_width = int(page_width.group(1)) - int(margins[0]) - int(margins[1])
+        else:
+            self.text_width = 8640
+
+    def save(self, body_xml: str) -> io.BytesIO:
+        docx_file = io.BytesIO()
+        with zipfile.ZipFile(docx_file, "w", zipfile.ZIP_DEFLATED) as docx_zip:
+            for info, data in self.parts:
+                docx_zip.writestr(info, data)
+            docx_zip.writestr(
+                _DOCUMENT_PART, (self.document_head + body_xml + self.document_tail).encode("utf-8")
+            )
+        docx_file.seek(0)
+        return docx_file
+
+
+@functools.lru_cache(maxsize=1)
+def get_template() -> DocxTemplate:
+    if DOCX_TEMPLATE_PATH:
+        with open(DOCX_TEMPLATE_PATH, "rb") as template_file:
+            return DocxTemplate(template_file.read())
+    # 與原本 python-docx 流程相同的預設範本與字型設定
+    doc = Document()
+    style = doc.styles["Normal"]
+    style.font.name = "Arial"
+    style.font.size = Pt(11)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return DocxTemplate(buffer.getvalue())
+
+
+def _cm_to_twips(value: float) -> int:
+    return round(value * 1440 / 2.54)
+
+
+def _text_runs(text: str) -> str:
+    """對應 python-docx run.text 的行為：換行轉 <w:br/>、Tab 轉 <w:tab/>"""
+    pieces = []
+    for line_index, line in enumerate(_INVALID_XML_CHARS.sub("", text).split("\n")):
+        if line_index:
+            pieces.append("<w:br/>")
+        for tab_index, chunk in enumerate(line.split("\t")):
+            if tab_index:
+                pieces.append("<w:tab/>")
+            if chunk:
+                pieces.append(f'<w:t xml:space="preserve">{escape(chunk)}</w:t>')
+    return "".join(pieces)
+
+
+def paragraph(text: str = "", style: Optional[str] = None, bold_prefix: str = "") -> str:
+    p_pr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    runs = ""
+    if bold_prefix:
+        runs += f"<w:r><w:rPr><w:b/></w:rPr>{_text_runs(bold_prefix)}</w:r>"
+    if text:
+        runs += f"<w:r>{_text_runs(text)}</w:r>"
+    return f"<w:p>{p_pr}{runs}</w:p>"
+
+
+def heading(text: str, level: int) -> str:
+    return paragraph(text, "Title" if level == 0 else f"Heading{level}")
+
+
+def table(rows: Sequence[Sequence[str]], cell_widths: Sequence[int], grid_widths: Sequence[int]):
+    """一次輸出整個表格的 WordprocessingML，取代逐格設定與 add_row()"""
+    grid = "".join(f'<w:gridCol w:w="{width}"/>' for width in grid_widths)
+    cell_props = [f'<w:tcPr><w:tcW w:type="dxa" w:w="{width}"/></w:tcPr>' for width in cell_widths]
+    row_xml = []
+    for row in rows:
+        cells = "".join(
+            f"<w:tc>{cell_props[i]}{paragraph(text)}</w:tc>" for i, text in enumerate(row)
+        )
+        row_xml.append(f"<w:tr>{cells}</w:tr>")
+    return (
+        '<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:type="auto" w:w="0"/>'
+        f"{_TABLE_LOOK}</w:tblPr><w:tblGrid>{grid}</w:tblGrid>{''.join(row_xml)}</w:tbl>"
+    )
+
+
+def _numbered(lines: Sequence[str]) -> str:
+    return "\n".join(f"{i+1}. {line}" for i, line in enumerate(lines))
+
+
+def render_combined_docx(
+    learning_asset: LearningAsset,
+    learning_evaluate: EvaluationAssetTable,
+    main_title,
+    sub_title,
+    case_info,
+) -> io.BytesIO:
+    """與 utils.generate_combined_docx 版面相同，但直接輸出 XML 並在記憶體中打包"""
+    template = get_template()
+    even_grid = lambda cols: [template.text_width // cols] * cols  # noqa: E731
+    lesson_plan = learning_asset.lesson_plan
+    worksheet = learning_asset.worksheet
+    body: List[str] = [
+        heading(f"{main_title}-{sub_title}", 0),
+        heading("教案", 1),
+        heading("個案基本資料", 2),
+        paragraph(case_info),
+        table(
+            [
+                ["教案名稱", lesson_plan.title],
+                ["教學目標", lesson_plan.objectives],
+                ["教學內容", _numbered(lesson_plan.content)],
+                [
+                    "教學方法",
+                    _numbered(
+                        [f"{m.title}: {m.explanation}" for m in lesson_plan.teaching_methods]
+                    ),
+                ],
+                [
+                    "教學步驟",
+                    _numbered([f"{s.title}: {s.explanation}" for s in lesson_plan.teaching_steps]),
+                ],
+                [
+                    "評量方式",
+                    _numbered(
+                        [f"{m.title}: {m.explanation}" for m in lesson_plan.assessment_methods]
+                    ),
+                ],
+            ],
+            cell_widths=[_cm_to_twips(3), _cm_to_twips(15)],
+            grid_widths=even_grid(2),
+        ),
+        _PAGE_BREAK,
+        heading("學習單", 1),
+    ]
+
+    sections = [
+        ("一、練習題", [q.question for q in worksheet.practice_questions]),
+        ("二、活動指導", [g.description for g in worksheet.activity_guides]),
+        ("三、反思問題", [q.question for q in worksheet.reflection_questions]),
+        ("四、評量題", [q.question for q in worksheet.assessment_questions]),
+    ]
+    for title, lines in sections:
+        body.append(heading(title, 2))
+        body.extend(paragraph(f"{i}. {line}") for i, line in enumerate(lines, 1))
+
+    body.append(heading("五、自我評估表", 2))
+    body.append(
+        table(
+            [["評估項目", "滿意(✓)", "需改進(✗)", "反思與改進方法"]]
+            + [[item.item, "", "", ""] for item in worksheet.self_assessment_items],
+            cell_widths=even_grid(4),
+            grid_widths=even_grid(4),
+        )
+    )
+    body.append(heading("六、合作學習活動", 2))
+    body.append(paragraph(worksheet.collaborative_learning_activity))
+    body.append(_PAGE_BREAK)
+
+    body.append(heading(learning_evaluate.evaluation_asset_title, 1))
+    body.append(
+        table(
+            [["評量項目", "評量指標", "優良（4分）", "良好（3分）", "尚可（2分）", "待加強（1分）"]]
+            + [
+                [
+                    item.evaluation_item_title,
+                    item.evaluation_metric,
+                    item.score_descriptions.excellent_with_score_4,
+                    item.score_descriptions.good_with_score_3,
+                    item.score_descriptions.fair_with_score_2,
+                    item.score_descriptions.needs_improvement_with_score_1,
+                ]
+                for item in learning_evaluate.evaluation_items
+            ],
+            cell_widths=[_cm_to_twips(3)] * 6,
+            grid_widths=even_grid(6),
+        )
+    )
+    body.append(paragraph())  # Add some space
+    body.append(heading("評分標準", 2))
+    n = len(learning_evaluate.evaluation_items)
+    criteria = [
+        f"優良: {3*(n-1)}-{4*n} 分, 表示學生能充分掌握技巧並理解其重要性。",
+        f"良好: {2*(n)}-{3*(n-1)} 分, 表示學生能較好地完成步驟，但仍有待改進的部分。",
+        f"尚可: {1*(n)}-{2*(n-1)} 分, 表示學生能完成部分步驟，但正確性和時間效率需加強。",
+        f"待加強: {1*(n-1)} 分, 表示學生需更多練習和輔助以掌握技巧。",
+    ]
+    body.extend(paragraph(criterion, bold_prefix="• ") for criterion in criteria)
+    body.append(heading("AI生成內容使用提醒", 2))
+    body.append(
+        paragraph(
+            "使用提醒：本教案、學習單與評估表皆由人工智慧輔助生成，內容僅供專業參考。"
+            "請依據實際學生狀況、課程目標與場地條件進行調整，並與專業特教人員或治療師討論後使用。"
+        )
+    )
+    return template.save("".join(body))
@@ -0,0 +1,175 @@
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+from loguru import logger
+
+from aac_assets_generator.deadline import remaining
+from aac_assets_generator.metrics import percentile, stage_stats
+from aac_assets_generator.prompt_builder import estimate_tokens
+from aac_assets_generator.scheduler import FairScheduler, Priority, get_scheduler
+
+# 設為 0 時不指定 reasoning_effort，沿用模型預設（medium）
+EFFORT_CONTROL = os.getenv("AAC_REASONING_EFFORT_CONTROL", "1") == "1"
+# 接受 reasoning_effort 參數的模型（不含日期後綴）；o1-mini、o1-preview 等會以 400 拒絕
+REASONING_EFFORT_MODELS = frozenset(
+    name.strip()
+    for name in os.getenv(
+        "AAC_REASONING_EFFORT_MODELS", "o1,o1-pro,o3,o3-mini,o3-pro,o4-mini"
+    ).split(",")
+    if name.strip()
+)
+# 互動請求單一生成階段（含排隊）的目標延遲（秒）
+LLM_LATENCY_SLO = float(os.getenv("AAC_LLM_LATENCY_SLO", "90"))
+# 各階段在負載正常、內容一般時的推理強度；評量表結構固定，預設較低
+STAGE_BASE_EFFORT = {
+    "learning_asset": os.getenv("AAC_EFFORT_LEARNING_ASSET", "medium"),
+    "learning_evaluate": os.getenv("AAC_EFFORT_LEARNING_EVALUATE", "low"),
+    "learning_joint": os.getenv("AAC_EFFORT_LEARNING_JOINT", "medium"),
+    "learning_adapt": os.getenv("AAC_EFFORT_LEARNING_ADAPT", "low"),
+    # 修復截斷輸出時的補件呼叫，只補少數欄位
+    "salvage": os.getenv("AAC_EFFORT_SALVAGE", "low"),
+}
+# 版面內容的 token 數低於/高於此值時，推理強度降/升一級
+SIMPLE_CONTENT_TOKENS = int(os.getenv("AAC_EFFORT_SIMPLE_TOKENS", "300"))
+COMPLEX_CONTENT_TOKENS = int(os.getenv("AAC_EFFORT_COMPLEX_TOKENS", "1500"))
+
+EFFORTS = ("low", "medium", "high")
+# 沒有某一級的實測資料時，以其他級的耗時依此比例推估
+_EFFORT_COST = {"low": 0.5, "medium": 1.0, "high": 2.0}
+_MIN_SAMPLES = 5
+_SNAPSHOT_SUFFIX = re.compile(r"-\d{4}-\d{2}-\d{2}$")
+
+
+def supports_reasoning_effort(model: str) -> bool:
+    # 帶日期的快照（例如 o3-mini-2025-01-31）依其模型名稱判斷
+    return _SNAPSHOT_SUFFIX.sub("", model or "") in REASONING_EFFORT_MODELS
+
+
+def _latency_stage(stage: str, effort: str) -> str:
+    return f"llm:{stage}:{effort}"
+
+
+class EffortController:
+    """依延遲 SLO、近期實測耗時、排隊深度與內容複雜度決定每個階段的 reasoning_effort
+
+    負載升高時逐級降低推理強度，讓延遲隨負載平緩上升，而不是排隊塞車後突然逾時。
+    """
+
+    def __init__(
+        self,
+        scheduler: Optional[FairScheduler] = None,
+        slo_seconds: float = LLM_LATENCY_SLO,
+        stats=stage_stats,
+    ):
+        self.scheduler = scheduler
+        self.slo_seconds = slo_seconds
+        self.stats = stats
+        self._decisions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def predicted_latency(self, stage: str, effort: str) -> Optional[float]:
+        """該推理強度的 p50 耗時；資料不足時由其他強度的實測值推估"""
+        samples = self.stats.samples(_latency_stage(stage, effort))
+        if len(samples) >= _MIN_SAMPLES:
+            return percentile(samples, 0.50)
+        for other in EFFORTS:
+            samples = self.stats.samples(_latency_stage(stage, other))
+            if len(samples) >= _MIN_SAMPLES:
+                return percentile(samples, 0.50) * _EFFORT_COST[effort] / _EFFORT_COST[other]
+        return None
+
+    def _queue_ahead(self) -> float:
+        """排在前面的工作相當於幾輪完整的並行名額"""
+        if self.scheduler is None:
+            return 0.0
+        return self.scheduler.queue_depth() / max(self.scheduler.max_concurrency, 1)
+
+    def choose(
+        self,
+        stage: str,
+        model: str,
+        content: str = "",
+        priority=Priority.INTERACTIVE,
+    ) -> Optional[str]:
+        if not EFFORT_CONTROL or not supports_reasoning_effort(model):
+            return None
+        level = EFFORTS.index(STAGE_BASE_EFFORT.get(stage, "medium"))
+        content_tokens = estimate_tokens(content or "")
+        if content_tokens < SIMPLE_CONTENT_TOKENS:
+            level -= 1
+        elif content_tokens > COMPLEX_CONTENT_TOKENS:
+            level += 1
+        level = min(max(level, 0), len(EFFORTS) - 1)
+
+        queue_ahead = self._queue_ahead()
+        reason = "內容"
+        # 請求設有時限時以剩餘時間與 SLO 較小者為目標；已逾時的工作在背景完成，不必再降級
+        slo_seconds = self.slo_seconds
+        left = remaining()
+        if left is not None and left > 0:
+            slo_seconds = min(slo_seconds, left)
+        if priority != Priority.INTERACTIVE:
+            # 背景工作不受 SLO 限制，但有人排隊時一律用最低強度，盡快讓出名額
+            if queue_ahead > 0:
+                level, reason = 0, "背景工作且有排隊"
+        else:
+            # 預估等待 + 執行時間超過 SLO 時逐級降低
+            while level > 0:
+                latency = self.predicted_latency(stage, EFFORTS[level])
+                if latency is None:
+                    # 尚無實測資料時，只在排隊超過一輪名額時降級
+                    if queue_ahead < 1:
+                        break
+                elif latency * (1 + queue_ahead) <= slo_seconds:
+                    break
+                level -= 1
+                reason = "負載/SLO"
+
+        effort = EFFORTS[level]
+        with self._lock:
+            self._decisions[(stage, effort)] += 1
+        logger.info(
+            f"{stage} 使用 reasoning_effort={effort}"
+            f"（內容約 {content_tokens} tokens，排隊 {queue_ahead:.1f} 輪，依據：{reason}）"
+        )
+        return effort
+
+    @contextmanager
+    def observe(self, stage: str, effort: Optional[str]):
+        """記錄實際 LLM 呼叫耗時（不含排隊），作為之後的預估依據
+
+        只記錄成功的呼叫：失敗通常很快（或卡到逾時），混入後會讓預估失真。
+        """
+        start = time.perf_counter()
+        yield
+        if effort is not None:
+            self.stats.record(_latency_stage(stage, effort), time.perf_counter() - start)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            decisions = dict(self._decisions)
+        return {
+            "slo_seconds": self.slo_seconds,
+            "decisions": {f"{stage}:{effort}": n for (stage, effort), n in decisions.items()},
+            "predicted_latency": {
+                f"{stage}:{effort}": self.predicted_latency(stage, effort)
+                for stage in STAGE_BASE_EFFORT
+                for effort in EFFORTS
+            },
+        }
+
+
+_effort_controller = EffortController(get_scheduler())
+
+
+def get_effort_controller() -> EffortController:
+    return _effort_controller
+
+
+def effort_kwargs(effort: Optional[str]) -> dict:
+    return {"reasoning_effort": effort} if effort else {}
@@ -1,196 +1,199 @@
 import io
+from contextlib import nullcontext
 
 from loguru import logger
 from openai import AsyncOpenAI
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import cm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+from reportlab.platypus import PageBreak, Paragraph
 from reportlab.platypus import Spacer
 
+from aac_assets_generator.circuit_breaker import OPENAI, CircuitOpenError, get_breaker
+from aac_assets_generator.effort_controller import effort_kwargs, get_effort_controller
 from aac_assets_generator.learning_asset_models import LearningAsset, LessonPlan, WorksheetSection
+from aac_assets_generator.pdf_templates import (
+    LESSON_PLAN_TABLE_STYLE,
+    SELF_ASSESSMENT_HEADERS,
+    SELF_ASSESSMENT_TABLE_STYLE,
+    cell,
+    fragment,
+    get_styles,
+    list_cell,
+    long_table,
+)
+from aac_assets_generator.profiling import profiled
+from aac_assets_generator.prompt_builder import build_full_prompt
+from aac_assets_generator.salvage import parse_with_salvage
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.serialization import content_hash
+from aac_assets_generator.singleflight import flight_key, get_single_flight
+from aac_assets_generator.wire_models import from_wire, wire_format_for
 import streamlit as st
 
 class LearningAssetGenerator:
     """生成學習單/教案"""
 
-    def __init__(self, client):
+    def __init__(self, client, scheduler=None):
         self.client = client
+        self.scheduler = scheduler
+
+    def _slot(self, user_account, priority):
+        # 有設定排程器時，LLM 呼叫需先取得名額
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(user_account, priority)
+
+    async def _parse(self, full_prompt, model, user_account, priority, reasoning_effort=None):
+        async with self._slot(user_account, priority):
+            with get_effort_controller().observe("learning_asset", reasoning_effort):
+                # 輸出被截斷或格式有誤時先在本機修復，必要時只補缺少的部分
+                parsed = await parse_with_salvage(
+                    self.client,
+                    model,
+                    [{"role": "system", "content": full_prompt}],
+                    # 實際呼叫使用短鍵名的精簡格式以減少輸出 token，取回後轉回公開模型
+                    wire_format_for(LearningAsset),
+                    **effort_kwargs(reasoning_effort),
+                )
+        return from_wire(LearningAsset, parsed)
 
     async def generate_learning_asset_async(
-        self, case_info, learn_assets_contents, prompt, model="o3"
+        self,
+        case_info,
+        learn_assets_contents,
+        prompt,
+        model="o3",
+        user_account=None,
+        priority=Priority.INTERACTIVE,
     ):
         logger.info(f"use model:{model}")
-        full_prompt = prompt.replace("<case_info>", case_info)
-        full_prompt = full_prompt.replace("<learn_assets_contents>", learn_assets_contents)
+        full_prompt, _ = build_full_prompt(prompt, case_info, learn_assets_contents)
         logger.info(f"full_prompt:{full_prompt}")
+        reasoning_effort = get_effort_controller().choose(
+            "learning_asset", model, learn_assets_contents, priority
+        )
 
         try:
-            response = await self.client.beta.chat.completions.parse(
-                model=model,
-                messages=[
-                    {"role": "system", "content": full_prompt},
-                ],
-                response_format=LearningAsset,
+            # OpenAI 斷路中時直接失敗，不必排隊等名額
+            get_breaker(OPENAI).check()
+            # 相同提示詞的並行請求（重複點擊、同時開兩個分頁）只呼叫一次
+            parsed = await get_single_flight().do(
+                flight_key(model, LearningAsset, full_prompt),
+                lambda: self._parse(full_prompt, model, user_account, priority, reasoning_effort),
+                model_cls=LearningAsset,
+                priority=priority,
             )
-            logger.info(f"response:{response}")
-            return response.choices[0].message.parsed, case_info
+            return parsed, case_info
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"生成學習單時發生錯誤: {str(e)}")
             return None, case_info
 
+    @profiled("learning_asset.markdown_to_pdf")
     def markdown_to_pdf(self,learning_asset: LearningAsset, main_title, sub_title, case_info):
-
-        pdfmetrics.registerFont(TTFont("NotoSansTC", "NotoSansTC-Regular.ttf"))
-
-        styles = getSampleStyleSheet()
-        styles.add(
-            ParagraphStyle(
-                name="CustomStyle",
-                fontName="NotoSansTC",
-                fontSize=12,
-                leading=14,
-                encoding="utf-8",
-                leftIndent=20,  # Add this line to create indentation
-            )
-        )
-
-        for style in styles.byName.values():
-            style.fontName = "NotoSansTC"
-
+        styles = get_styles()
         elements = []
 
         elements.append(Paragraph(f"{main_title}-{sub_title}", styles["Title"]))
         # Lesson Plan Title 
-        elements.append(Paragraph("教案", styles["Title"]))
-        elements.append(Paragraph("個案基本資料", styles["Heading2"]))
+        elements.append(fragment("教案", "Title"))
+        elements.append(fragment("個案基本資料", "Heading2"))
         for line in case_info.split('\n'):
             elements.append(Paragraph(line.strip(), styles["CustomStyle"]))          
         elements.append(Spacer(1, 12))
         # Lesson Plan Table
         lesson_plan_data = [
-            ["教案名稱", Paragraph(learning_asset.lesson_plan.title, styles["CustomStyle"])],
+            ["教案名稱", cell(learning_asset.lesson_plan.title, "CustomStyle")],
             [
                 "教學目標",
-                Paragraph(" ".join(learning_asset.lesson_plan.objectives), styles["CustomStyle"]),
+                cell(" ".join(learning_asset.lesson_plan.objectives), "CustomStyle"),
             ],
             # ["教學內容", Paragraph(learning_asset.lesson_plan.content, styles["CustomStyle"])],
             [
                 "教學內容",
-                Paragraph(
-                    "<br/><br/>".join(
+                list_cell(
+                    [
                         f"{i+1}. {content}"
                         for i, content in enumerate(learning_asset.lesson_plan.content)
-                    ),
-                    styles["CustomStyle"],
+                    ],
+                    "CustomStyle",
                 ),
             ],
             [
                 "教學方法",
-                Paragraph(
-                    "<br/><br/>".join(
-                        [
-                            f"{i+1}. {method.title}: {method.explanation}"
-                            for i, method in enumerate(learning_asset.lesson_plan.teaching_methods)
-                        ]
-                    ),
-                    styles["CustomStyle"],
+                list_cell(
+                    [
+                        f"{i+1}. {method.title}: {method.explanation}"
+                        for i, method in enumerate(learning_asset.lesson_plan.teaching_methods)
+                    ],
+                    "CustomStyle",
                 ),
             ],
             [
                 "教學步驟",
-                Paragraph(
-                    "<br/><br/>".join(
-                        [
-                            f"{i+1}. {step.title}: {step.explanation}"
-                            for i, step in enumerate(learning_asset.lesson_plan.teaching_steps)
-                        ]
-                    ),
-                    styles["CustomStyle"],
+                list_cell(
+                    [
+                        f"{i+1}. {step.title}: {step.explanation}"
+                        for i, step in enumerate(learning_asset.lesson_plan.teaching_steps)
+                    ],
+                    "CustomStyle",
                 ),
             ],
             [
                 "評量方式",
-                Paragraph(
-                    "<br/><br/>".join(
-                        [
-                            f"{i+1}. {method.title}: {method.explanation}"
-                            for i, method in enumerate(
-                                learning_asset.lesson_plan.assessment_methods
-                            )
-                        ]
-                    ),
-                    styles["CustomStyle"],
+                list_cell(
+                    [
+                        f"{i+1}. {method.title}: {method.explanation}"
+                        for i, method in enumerate(learning_asset.lesson_plan.assessment_methods)
+                    ],
+                    "CustomStyle",
                 ),
             ],
         ]
 
-        lesson_plan_table = Table(lesson_plan_data, colWidths=[3 * cm, 15 * cm])
-        lesson_plan_table.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
-                    ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
-                    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                    ("FONTNAME", (0, 0), (-1, -1), "NotoSansTC"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 10),
-                    ("TOPPADDING", (0, 0), (-1, -1), 6),
-                    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-                    ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ]
-            )
+        # 清單很長時儲存格會拆成多列，表格可以跨頁
+        lesson_plan_table = long_table(
+            lesson_plan_data, [3 * cm, 15 * cm], LESSON_PLAN_TABLE_STYLE
         )
         elements.append(lesson_plan_table)
 
         # Add page break
         elements.append(PageBreak())
         # Worksheet
-        elements.append(Paragraph("學習單", styles["Title"]))
+        elements.append(fragment("學習單", "Title"))
 
-        elements.append(Paragraph("一、練習題", styles["Heading2"]))
+        elements.append(fragment("一、練習題", "Heading2"))
         for count, question in enumerate(learning_asset.worksheet.practice_questions):
             elements.append(Paragraph(f"{count+1}. {question.question}", styles["CustomStyle"]))
 
-        elements.append(Paragraph("二、活動指導", styles["Heading2"]))
+        elements.append(fragment("二、活動指導", "Heading2"))
         for count, guide in enumerate(learning_asset.worksheet.activity_guides):
             elements.append(Paragraph(f"{count+1}. {guide.description}", styles["CustomStyle"]))
 
-        elements.append(Paragraph("三、反思問題", styles["Heading2"]))
+        elements.append(fragment("三、反思問題", "Heading2"))
         for count, question in enumerate(learning_asset.worksheet.reflection_questions):
             elements.append(Paragraph(f"{count+1}. {question.question}", styles["CustomStyle"]))
 
-        elements.append(Paragraph("四、評量題", styles["Heading2"]))
+        elements.append(fragment("四、評量題", "Heading2"))
         for count, question in enumerate(learning_asset.worksheet.assessment_questions):
             elements.append(Paragraph(f"{count+1}. {question.question}", styles["CustomStyle"]))
 
         # Self-assessment table
-        elements.append(Paragraph("五、自我評估表", styles["Heading2"]))
-        assessment_data = [["評估項目", "滿意(V)", "需改進(X)", "反思與改進方法"]]
+        elements.append(fragment("五、自我評估表", "Heading2"))
+        assessment_data = [list(SELF_ASSESSMENT_HEADERS)]
         for item in learning_asset.worksheet.self_assessment_items:
             assessment_data.append([item.item, "", "", ""])
-        assessment_table = Table(assessment_data, colWidths=[8 * cm, 3 * cm, 3 * cm, 4 * cm])
-        assessment_table.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                    ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
-                    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                    ("FONTNAME", (0, 0), (-1, -1), "NotoSansTC"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 10),
-                    ("TOPPADDING", (0, 0), (-1, -1), 6),
-                    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-                    ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ]
-            )
+        assessment_table = long_table(
+            assessment_data,
+            [8 * cm, 3 * cm, 3 * cm, 4 * cm],
+            SELF_ASSESSMENT_TABLE_STYLE,
+            repeat_rows=1,
         )
         elements.append(assessment_table)
 
         # Collaborative learning activity
 
-        elements.append(Paragraph("六、合作學習活動", styles["Heading2"]))
+        elements.append(fragment("六、合作學習活動", "Heading2"))
         elements.append(
             Paragraph(
                 learning_asset.worksheet.collaborative_learning_activity, styles["CustomStyle"]
@@ -203,17 +206,23 @@ class LearningAssetGenerator:
 
     def render_at_streamlit(self, learning_asset, case_info):
         st.success("學習單已生成!")
-        st.header("教案")
-        st.subheader("個案基本資料")
+        st.markdown(
+            _cached_learning_asset_markdown(
+                content_hash(learning_asset, case_info), learning_asset, case_info
+            )
+        )
+
+    @staticmethod
+    def to_markdown(learning_asset: LearningAsset, case_info) -> str:
+        lines = ["## 教案", "### 個案基本資料"]
         # Split the case_info string by newlines and display each line
-        for line in case_info.split('\n'):
-            st.write(line.strip())
+        lines += [f"{line.strip()}  " for line in case_info.split("\n") if line.strip()]
         lesson_plan_data = [
             ["教案名稱", learning_asset.lesson_plan.title],
             ["教學目標", learning_asset.lesson_plan.objectives],
             [
                 "教學內容",
-                "\n".join(
+                "  \n".join(
                     [
                         f"{i+1}. {content}"
                         for i, content in enumerate(learning_asset.lesson_plan.content)
@@ -222,7 +231,7 @@ class LearningAssetGenerator:
             ],
             [
                 "教學方法",
-                "\n".join(
+                "  \n".join(
                     [
                         f"{i+1}. {method.title}: {method.explanation}"
                         for i, method in enumerate(learning_asset.lesson_plan.teaching_methods)
@@ -231,7 +240,7 @@ class LearningAssetGenerator:
             ],
             [
                 "教學步驟",
-                "\n".join(
+                "  \n".join(
                     [
                         f"{i+1}. {step.title}: {step.explanation}"
                         for i, step in enumerate(learning_asset.lesson_plan.teaching_steps)
@@ -240,7 +249,7 @@ class LearningAssetGenerator:
             ],
             [
                 "評量方式",
-                "\n".join(
+                "  \n".join(
                     [
                         f"{i+1}. {method.title}: {method.explanation}"
                         for i, method in enumerate(
@@ -251,35 +260,34 @@ class LearningAssetGenerator:
             ],
         ]
         for row in lesson_plan_data:
-            st.subheader(row[0])
-            st.write(row[1])
-            st.write("---")  # Add a separator line
+            lines += [f"### {row[0]}", row[1], "---"]  # Add a separator line
         # Display Worksheet
-        st.header("學習單")
-        st.subheader("一、練習題")
+        lines.append("## 學習單")
+        lines.append("### 一、練習題")
         for i, question in enumerate(learning_asset.worksheet.practice_questions, 1):
-            st.write(f"{i}. {question.question}")
-        st.write("---")
-        st.subheader("二、活動指導")
+            lines.append(f"{i}. {question.question}")
+        lines += ["---", "### 二、活動指導"]
         for i, guide in enumerate(learning_asset.worksheet.activity_guides, 1):
-            st.write(f"{i}. {guide.description}")
-        st.write("---")
-        st.subheader("三、反思問題")
+            lines.append(f"{i}. {guide.description}")
+        lines += ["---", "### 三、反思問題"]
         for i, question in enumerate(learning_asset.worksheet.reflection_questions, 1):
-            st.write(f"{i}. {question.question}")
-        st.write("---")
-        st.subheader("四、評量題")
+            lines.append(f"{i}. {question.question}")
+        lines += ["---", "### 四、評量題"]
         for i, question in enumerate(learning_asset.worksheet.assessment_questions, 1):
-            st.write(f"{i}. {question.question}")
-        st.write("---")
-        st.subheader("五、自我評估表")
+            lines.append(f"{i}. {question.question}")
+        lines += ["---", "### 五、自我評估表"]
         table_header = "| 評估項目 | 滿意(✓) | 需改進(✗) | 反思與改進方法 |"
         table_separator = "|------------|---------|------------|----------------|"
         table_rows = [
             f"| {item.item} | | | |" for item in learning_asset.worksheet.self_assessment_items
         ]
         table_markdown = "\n".join([table_header, table_separator] + table_rows)
-        st.markdown(table_markdown)
-        st.write("---")
-        st.subheader("六、合作學習活動")
-        st.write(learning_asset.worksheet.collaborative_learning_activity)
\ No newline at end of file
+        lines += [table_markdown, "---", "### 六、合作學習活動"]
+        lines.append(learning_asset.worksheet.collaborative_learning_activity)
+        return "\n\n".join(lines)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _cached_learning_asset_markdown(asset_hash, _learning_asset, _case_info):
+    # 以內容雜湊為快取鍵，底線開頭的參數不參與 Streamlit 的雜湊計算
+    return LearningAssetGenerator.to_markdown(_learning_asset, _case_info)
@@ -1,162 +1,157 @@
 import io
+from contextlib import nullcontext
 
 from loguru import logger
 from openai import AsyncOpenAI
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import cm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+from reportlab.platypus import Paragraph
 
+from aac_assets_generator.circuit_breaker import OPENAI, CircuitOpenError, get_breaker
+from aac_assets_generator.effort_controller import effort_kwargs, get_effort_controller
 from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+from aac_assets_generator.pdf_templates import (
+    EVALUATION_TABLE_STYLE,
+    ai_reminder,
+    cell,
+    evaluation_header_row,
+    fragment,
+    get_styles,
+    long_table,
+    scoring_criteria,
+)
+from aac_assets_generator.profiling import profiled
+from aac_assets_generator.prompt_builder import build_full_prompt
+from aac_assets_generator.salvage import parse_with_salvage
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.serialization import content_hash
+from aac_assets_generator.singleflight import flight_key, get_single_flight
+from aac_assets_generator.wire_models import from_wire, wire_format_for
 import streamlit as st
 
 class LearningEvaluateGenerator:
     """生成學習單/教案"""
 
-    def __init__(self, client):
+    def __init__(self, client, scheduler=None):
         self.client = client
+        self.scheduler = scheduler
+
+    def _slot(self, user_account, priority):
+        # 有設定排程器時，LLM 呼叫需先取得名額
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(user_account, priority)
+
+    async def _parse(self, full_prompt, model, user_account, priority, reasoning_effort=None):
+        async with self._slot(user_account, priority):
+            with get_effort_controller().observe("learning_evaluate", reasoning_effort):
+                # 輸出被截斷或格式有誤時先在本機修復，必要時只補缺少的部分
+                parsed = await parse_with_salvage(
+                    self.client,
+                    model,
+                    [{"role": "system", "content": full_prompt}],
+                    # 實際呼叫使用短鍵名的精簡格式以減少輸出 token，取回後轉回公開模型
+                    wire_format_for(EvaluationAssetTable),
+                    **effort_kwargs(reasoning_effort),
+                )
+        return from_wire(EvaluationAssetTable, parsed)
 
     async def generate_learning_evaluate_async(
-        self, case_info, learn_assets_contents, prompt, model="o3"
+        self,
+        case_info,
+        learn_assets_contents,
+        prompt,
+        model="o3",
+        user_account=None,
+        priority=Priority.INTERACTIVE,
     ):
         logger.info(f"use model:{model}")
-        full_prompt = prompt.replace("<case_info>", case_info)
-        full_prompt = full_prompt.replace("<learn_assets_contents>", learn_assets_contents)
+        full_prompt, _ = build_full_prompt(prompt, case_info, learn_assets_contents)
         logger.info(f"full_prompt:{full_prompt}")
+        reasoning_effort = get_effort_controller().choose(
+            "learning_evaluate", model, learn_assets_contents, priority
+        )
 
         try:
-            response = await self.client.beta.chat.completions.parse(
-                model=model,
-                messages=[
-                    {"role": "system", "content": full_prompt},
-                ],
-                response_format=EvaluationAssetTable,
+            # OpenAI 斷路中時直接失敗，不必排隊等名額
+            get_breaker(OPENAI).check()
+            # 相同提示詞的並行請求（重複點擊、同時開兩個分頁）只呼叫一次
+            parsed = await get_single_flight().do(
+                flight_key(model, EvaluationAssetTable, full_prompt),
+                lambda: self._parse(full_prompt, model, user_account, priority, reasoning_effort),
+                model_cls=EvaluationAssetTable,
+                priority=priority,
             )
-            logger.info(f"response:{response}")
-            return response.choices[0].message.parsed, case_info
+            return parsed, case_info
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"生成學習單時發生錯誤: {str(e)}")
             return None, case_info
         
+    @profiled("learning_evaluate.markdown_to_pdf")
     def markdown_to_pdf(self,learning_evaluate: EvaluationAssetTable):
-        pdfmetrics.registerFont(TTFont("NotoSansTC", "NotoSansTC-Regular.ttf"))
-        styles = getSampleStyleSheet()
-        styles.add(
-            ParagraphStyle(
-                name="CustomStyle",
-                fontName="NotoSansTC",
-                fontSize=12,
-                leading=14,
-                encoding="utf-8",
-                leftIndent=20,  # Add this line to create indentation
-            )
-        )
-        for style in styles.byName.values():
-            style.fontName = "NotoSansTC"
+        styles = get_styles()
         elements = []
         # Lesson evaluate Title
-        elements.append(Paragraph("評估表", styles["Title"]))
+        elements.append(fragment("評估表", "Title"))
         elements.append(Paragraph(f"{learning_evaluate.evaluation_asset_title}", styles["Heading1"]))
 
-
-        # Define a paragraph style for wrapping text
-        wrap_style = ParagraphStyle(
-            name='WrappedStyle',
-            fontName='NotoSansTC',
-            fontSize=10,
-            leading=12,
-            wordWrap='CJK'
-        )
-        
         # Lesson evaluate Table
-        lesson_evaluate_data = [
-            [
-                Paragraph("評量項目", wrap_style),
-                Paragraph("評量指標", wrap_style),
-                Paragraph("優良（4分）", wrap_style),
-                Paragraph("良好（3分）", wrap_style),
-                Paragraph("尚可（2分）", wrap_style),
-                Paragraph("待加強（1分）", wrap_style)
-            ]
-        ]
-        
+        lesson_evaluate_data = [evaluation_header_row()]
+
         for item in learning_evaluate.evaluation_items:
             lesson_evaluate_data.append([
-                Paragraph(f"{item.evaluation_item_title}", wrap_style),
-                Paragraph(f"{item.evaluation_metric}", wrap_style),
-                Paragraph(f"{item.score_descriptions.excellent_with_score_4}", wrap_style),
-                Paragraph(f"{item.score_descriptions.good_with_score_3}", wrap_style),
-                Paragraph(f"{item.score_descriptions.fair_with_score_2}", wrap_style),
-                Paragraph(f"{item.score_descriptions.needs_improvement_with_score_1}", wrap_style)
+                cell(f"{item.evaluation_item_title}"),
+                cell(f"{item.evaluation_metric}"),
+                cell(f"{item.score_descriptions.excellent_with_score_4}"),
+                cell(f"{item.score_descriptions.good_with_score_3}"),
+                cell(f"{item.score_descriptions.fair_with_score_2}"),
+                cell(f"{item.score_descriptions.needs_improvement_with_score_1}"),
             ])
-        
-        lesson_evaluate_table = Table(lesson_evaluate_data, colWidths=[3 * cm, 3 * cm, 3 * cm, 3 * cm, 3 * cm, 3 * cm])
-        lesson_evaluate_table.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
-                    ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
-                    ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("FONTNAME", (0, 0), (-1, -1), "NotoSansTC"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 10),
-                    ("TOPPADDING", (0, 0), (-1, -1), 6),
-                    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-                    ("LEFTPADDING", (0, 0), (-1, -1), 3),
-                    ("RIGHTPADDING", (0, 0), (-1, -1), 3),
-                    ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ]
-            )
-        )        
-        elements.append(lesson_evaluate_table)
-        elements.append(Paragraph("評分標準", styles["Heading1"]))
 
-        number_of_evaluation_items = len(learning_evaluate.evaluation_items)
-        
-        elements.append(Paragraph(f"- 優良: {3*(number_of_evaluation_items-1)}-{4*number_of_evaluation_items} 分,  表示學生能充分掌握技巧並理解其重要性。", styles["CustomStyle"]))
-        elements.append(Paragraph(f"- 良好: {2*(number_of_evaluation_items)}-{3*(number_of_evaluation_items-1)} 分,  表示學生能較好地完成步驟，但仍有待改進的部分。", styles["CustomStyle"]))
-        elements.append(Paragraph(f"- 尚可: {1*(number_of_evaluation_items)}-{2*(number_of_evaluation_items-1)} 分,  表示學生能完成部分步驟，但正確性和時間效率需加強。", styles["CustomStyle"]))
-        elements.append(Paragraph(f"- 待加強: {1*(number_of_evaluation_items-1)} 分,  表示學生需更多練習和輔助以掌握技巧。", styles["CustomStyle"]))
-        elements.append(Paragraph("AI生成內容使用提醒", styles["Heading2"]))
-        elements.append(
-            Paragraph(
-                "使用提醒：本教案、學習單與評估表皆由人工智慧輔助生成，內容僅供專業參考。請依據實際學生狀況、課程目標與場地條件進行調整，並與專業特教人員或治療師討論後使用。", 
-                style=ParagraphStyle(
-                    'RedStyle',
-                    parent=styles['CustomStyle'],
-                    textColor=colors.red
-                )
-            )
-        )          
+        # 表頭在每頁重複；儲存格斷行結果快取，換頁時不再重新量測
+        lesson_evaluate_table = long_table(
+            lesson_evaluate_data, [3 * cm] * 6, EVALUATION_TABLE_STYLE, repeat_rows=1
+        )
+        elements.append(lesson_evaluate_table)
+        # 評分標準與 AI 使用提醒為固定內容，重複使用預先排版的段落
+        elements.extend(scoring_criteria(len(learning_evaluate.evaluation_items)))
+        elements.extend(ai_reminder())
         return elements
 
     def render_at_streamlit(self, learning_evaluate):
         st.success("評估表已生成!")
-        st.header("評估表")
+        st.markdown(
+            _cached_learning_evaluate_markdown(content_hash(learning_evaluate), learning_evaluate)
+        )
+
+    @staticmethod
+    def to_markdown(learning_evaluate: EvaluationAssetTable) -> str:
+        lines = ["## 評估表"]
         lesson_plan_data = [
             ["評估主題", learning_evaluate.evaluation_asset_title],
         ]
         for row in lesson_plan_data:
-            st.subheader(row[0])
-            st.write(row[1])
-            st.write("---")  # Add a separator line
+            lines += [f"### {row[0]}", row[1], "---"]  # Add a separator line
 
-        st.subheader("評估表格")
+        lines.append("### 評估表格")
         table_header = "| 評量項目 | 評量指標 | 優良(4分) | 良好(3分) | 尚可(2分) | 待加強(1分) |"
         table_separator = "|------------|---------|------------|----------------|----------------|----------------|"
         table_rows = [
             f"| {item.evaluation_item_title} | {item.evaluation_metric}| {item.score_descriptions.excellent_with_score_4} | {item.score_descriptions.good_with_score_3} | {item.score_descriptions.fair_with_score_2}|  {item.score_descriptions.needs_improvement_with_score_1}|" for item in learning_evaluate.evaluation_items
         ]
         table_markdown = "\n".join([table_header, table_separator] + table_rows)
-        st.markdown(table_markdown)
-        st.write("---")
-        st.subheader("評估標準")
+        lines += [table_markdown, "---", "### 評估標準"]
 
         number_of_evaluation_items = len(learning_evaluate.evaluation_items)
-        st.write(f"⏹︎  優良: {3*(number_of_evaluation_items-1)}-{4*number_of_evaluation_items} 分,  表示學生能充分掌握技巧並理解其重要性。")
-        st.write(f"⏹︎  良好: {2*(number_of_evaluation_items)}-{3*(number_of_evaluation_items-1)} 分,  表示學生能較好地完成步驟，但仍有待改進的部分。")
-        st.write(f"⏹︎  尚可: {1*(number_of_evaluation_items)}-{2*(number_of_evaluation_items-1)} 分,  表示學生能完成部分步驟，但正確性和時間效率需加強。")
-        st.write(f"⏹︎  待加強: {1*(number_of_evaluation_items-1)} 分,  表示學生需更多練習和輔助以掌握技巧。")
+        lines.append(f"⏹︎  優良: {3*(number_of_evaluation_items-1)}-{4*number_of_evaluation_items} 分,  表示學生能充分掌握技巧並理解其重要性。")
+        lines.append(f"⏹︎  良好: {2*(number_of_evaluation_items)}-{3*(number_of_evaluation_items-1)} 分,  表示學生能較好地完成步驟，但仍有待改進的部分。")
+        lines.append(f"⏹︎  尚可: {1*(number_of_evaluation_items)}-{2*(number_of_evaluation_items-1)} 分,  表示學生能完成部分步驟，但正確性和時間效率需加強。")
+        lines.append(f"⏹︎  待加強: {1*(number_of_evaluation_items-1)} 分,  表示學生需更多練習和輔助以掌握技巧。")
+        return "\n\n".join(lines)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _cached_learning_evaluate_markdown(evaluate_hash, _learning_evaluate):
+    # 以內容雜湊為快取鍵，底線開頭的參數不參與 Streamlit 的雜湊計算
+    return LearningEvaluateGenerator.to_markdown(_learning_evaluate)
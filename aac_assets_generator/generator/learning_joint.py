@@ -0,0 +1,73 @@
+from contextlib import nullcontext
+
+from loguru import logger
+
+from aac_assets_generator.circuit_breaker import OPENAI, CircuitOpenError, get_breaker
+from aac_assets_generator.effort_controller import effort_kwargs, get_effort_controller
+from aac_assets_generator.learning_joint_models import LearningJointAssets
+from aac_assets_generator.prompt_builder import build_full_prompt
+from aac_assets_generator.salvage import parse_with_salvage
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.singleflight import flight_key, get_single_flight
+from aac_assets_generator.wire_models import from_wire, wire_format_for
+
+
+class LearningJointGenerator:
+    """一次呼叫同時生成教案/學習單與評估表，個案分析只需做一次"""
+
+    def __init__(self, client, scheduler=None):
+        self.client = client
+        self.scheduler = scheduler
+
+    def _slot(self, user_account, priority):
+        # 有設定排程器時，LLM 呼叫需先取得名額
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(user_account, priority)
+
+    async def _parse(self, full_prompt, model, user_account, priority, reasoning_effort=None):
+        async with self._slot(user_account, priority):
+            with get_effort_controller().observe("learning_joint", reasoning_effort):
+                parsed = await parse_with_salvage(
+                    self.client,
+                    model,
+                    [{"role": "system", "content": full_prompt}],
+                    wire_format_for(LearningJointAssets),
+                    **effort_kwargs(reasoning_effort),
+                )
+        return from_wire(LearningJointAssets, parsed)
+
+    async def generate_learning_joint_async(
+        self,
+        case_info,
+        learn_assets_contents,
+        prompt,
+        model="o3",
+        user_account=None,
+        priority=Priority.INTERACTIVE,
+    ):
+        """回傳 (learning_asset, learning_evaluate, case_info)，失敗時前兩者為 None"""
+        logger.info(f"use model:{model}")
+        full_prompt, _ = build_full_prompt(prompt, case_info, learn_assets_contents)
+        logger.info(f"full_prompt:{full_prompt}")
+        reasoning_effort = get_effort_controller().choose(
+            "learning_joint", model, learn_assets_contents, priority
+        )
+
+        try:
+            # OpenAI 斷路中時直接失敗，不必排隊等名額
+            get_breaker(OPENAI).check()
+            parsed = await get_single_flight().do(
+                flight_key(model, LearningJointAssets, full_prompt),
+                lambda: self._parse(full_prompt, model, user_account, priority, reasoning_effort),
+                model_cls=LearningJointAssets,
+                priority=priority,
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"合併生成教案與評估表時發生錯誤: {str(e)}")
+            return None, None, case_info
+        if parsed is None:
+            return None, None, case_info
+        return parsed.learning_asset, parsed.learning_evaluate, case_info
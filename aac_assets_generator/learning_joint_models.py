@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+from aac_assets_generator.learning_asset_models import LearningAsset
+from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+
+
+class LearningJointAssets(BaseModel):
+    learning_asset: LearningAsset
+    learning_evaluate: EvaluationAssetTable
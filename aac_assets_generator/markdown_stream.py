@@ -0,0 +1,223 @@
+"""把模型輸出的 Markdown 逐段轉成 ReportLab flowable
+
+只走一次：以行為單位辨識區塊（標題、清單、表格、段落），區塊結束時立即產生 flowable，
+不經過 HTML 與 BeautifulSoup。可在模型串流回應時邊收邊轉。
+"""
+import functools
+import re
+from typing import Iterable, List
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer, TableStyle
+from reportlab.platypus.flowables import HRFlowable
+
+from aac_assets_generator.pdf_templates import FONT_NAME, cell, get_styles, long_table
+
+# SimpleDocTemplate 預設左右邊界各 1 inch
+CONTENT_WIDTH = letter[0] - 2 * inch
+_LIST_INDENT = 18
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_LIST_ITEM = re.compile(r"^(\s*)([-*+]|\d+[.)])\s+(.*)$")
+_TABLE_ROW = re.compile(r"^\s*\|.*\|?\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_BOLD = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+_ITALIC = re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])")
+_CODE = re.compile(r"`([^`]+)`")
+
+MARKDOWN_TABLE_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("FONTNAME", (0, 0), (-1, -1), FONT_NAME),
+        ("GRID", (0, 0), (-1, -1), 1, colors.black),
+    ]
+)
+
+
+@functools.lru_cache(maxsize=1)
+def markdown_styles():
+    """自由格式內容沒有固定欄寬，所有樣式都需以 CJK 規則斷行"""
+    styles = get_styles()
+    body = ParagraphStyle(
+        "MarkdownBody", fontName=FONT_NAME, fontSize=12, leading=16, wordWrap="CJK", spaceAfter=4
+    )
+    return {
+        1: ParagraphStyle("MarkdownH1", parent=styles["Heading1"], wordWrap="CJK"),
+        2: ParagraphStyle("MarkdownH2", parent=styles["Heading2"], wordWrap="CJK"),
+        3: ParagraphStyle("MarkdownH3", parent=styles["Heading3"], wordWrap="CJK"),
+        "body": body,
+        "code": ParagraphStyle("MarkdownCode", parent=body, textColor=colors.darkslategray),
+    }
+
+
+def escape_xml(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def inline_markup(text: str) -> str:
+    """跳脫 XML 特殊字元後，把粗體、斜體與行內程式碼轉成 ReportLab 標記"""
+    text = escape_xml(text)
+    text = _CODE.sub(r"<font color='darkslategray'>\1</font>", text)
+    text = _BOLD.sub(lambda m: f"<b>{m.group(1) or m.group(2)}</b>", text)
+    return _ITALIC.sub(r"<i>\1</i>", text)
+
+
+def _code_line(line: str) -> str:
+    # code fence 內的文字原樣顯示：只跳脫 XML，不轉換粗體／斜體；保留行首縮排
+    stripped = line.lstrip(" ")
+    return "&nbsp;" * (len(line) - len(stripped)) + escape_xml(stripped) or "&nbsp;"
+
+
+def _join_lines(lines: List[str]) -> str:
+    # 中文換行不需補空白；英文單字之間保留一個空白
+    text = ""
+    for line in lines:
+        if text and text[-1].isascii() and line[:1].isascii():
+            text += " "
+        text += line
+    return text
+
+
+def _split_cells(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [part.strip().replace("\\|", "|") for part in re.split(r"(?<!\\)\|", line)]
+
+
+class MarkdownStreamConverter:
+    """逐塊餵入 Markdown 文字，回傳已完成區塊的 flowable
+
+    converter = MarkdownStreamConverter()
+    for chunk in stream:
+        elements.extend(converter.feed(chunk))
+    elements.extend(converter.close())
+    """
+
+    def __init__(self, width: float = CONTENT_WIDTH):
+        self.width = width
+        self.styles = markdown_styles()
+        self._pending = ""
+        self._paragraph: List[str] = []
+        # 目前的清單項目 (縮排, 標記, 各行文字)；下一行可能是同一項目的接續
+        self._item = None
+        self._table: List[List[str]] = []
+        self._in_fence = False
+        self._out: List = []
+        self._list_styles = {}
+
+    def feed(self, chunk: str) -> List:
+        """處理 chunk 中所有完整的行；最後一行可能還沒收完，留到下一次"""
+        self._pending += chunk
+        *lines, self._pending = self._pending.split("\n")
+        for line in lines:
+            self._line(line.rstrip("\r"))
+        return self._drain()
+
+    def close(self) -> List:
+        if self._pending:
+            self._line(self._pending.rstrip("\r"))
+            self._pending = ""
+        self._flush()
+        return self._drain()
+
+    def _drain(self) -> List:
+        out, self._out = self._out, []
+        return out
+
+    def _line(self, line: str):
+        if self._in_fence:
+            if _FENCE.match(line):
+                self._in_fence = False
+            else:
+                self._out.append(Paragraph(_code_line(line), self.styles["code"]))
+            return
+        if self._table and not _TABLE_ROW.match(line):
+            self._flush_table()
+        if _FENCE.match(line):
+            self._flush()
+            self._in_fence = True
+        elif not line.strip():
+            self._flush()
+        elif _TABLE_ROW.match(line):
+            self._flush_paragraph()
+            if not _TABLE_SEPARATOR.match(line):
+                self._table.append(_split_cells(line))
+        elif _RULE.match(line):
+            self._flush()
+            self._out.append(HRFlowable(width="100%", color=colors.lightgrey, spaceAfter=6))
+        elif _HEADING.match(line):
+            self._flush()
+            level, text = _HEADING.match(line).groups()
+            style = self.styles[min(len(level), 3)]
+            self._out.append(Paragraph(inline_markup(text), style))
+        elif _LIST_ITEM.match(line):
+            self._flush_paragraph()
+            indent, marker, text = _LIST_ITEM.match(line).groups()
+            self._item = (indent, marker, [text])
+        elif self._item is not None:
+            self._item[2].append(line.strip())
+        else:
+            self._paragraph.append(line.strip())
+
+    def _flush_paragraph(self):
+        if self._item is not None:
+            self._list_item(*self._item)
+            self._item = None
+        if self._paragraph:
+            text = inline_markup(_join_lines(self._paragraph))
+            self._out.append(Paragraph(text, self.styles["body"]))
+            self._paragraph = []
+
+    def _list_item(self, indent: str, marker: str, lines: List[str]):
+        # 有序清單保留原本的編號，巢狀層級依縮排決定
+        level = len(indent.expandtabs(4)) // 2
+        bullet = "•" if marker in "-*+" else marker
+        style = self._list_styles.get(level)
+        if style is None:
+            style = self._list_styles[level] = ParagraphStyle(
+                f"MarkdownList{level}",
+                parent=self.styles["body"],
+                leftIndent=_LIST_INDENT * (level + 1),
+                bulletIndent=_LIST_INDENT * level,
+                spaceAfter=2,
+            )
+        text = inline_markup(_join_lines(lines))
+        self._out.append(Paragraph(text, style, bulletText=bullet))
+
+    def _flush_table(self):
+        rows, self._table = self._table, []
+        columns = max(len(row) for row in rows)
+        data = [
+            [cell(inline_markup(value)) for value in row + [""] * (columns - len(row))]
+            for row in rows
+        ]
+        self._out.append(
+            long_table(data, [self.width / columns] * columns, MARKDOWN_TABLE_STYLE, repeat_rows=1)
+        )
+        self._out.append(Spacer(1, 8))
+
+    def _flush(self):
+        self._flush_paragraph()
+        if self._table:
+            self._flush_table()
+
+
+def markdown_to_flowables(chunks: Iterable[str]) -> List:
+    """把整份 Markdown 字串或串流的 chunk 轉成 flowable 清單"""
+    if isinstance(chunks, str):
+        chunks = [chunks]
+    converter = MarkdownStreamConverter()
+    elements = []
+    for chunk in chunks:
+        elements.extend(converter.feed(chunk))
+    elements.extend(converter.close())
+    return elements
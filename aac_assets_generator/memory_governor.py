@@ -0,0 +1,251 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Set
+
+from loguru import logger
+
+from aac_assets_generator.state_backend import CLUSTER, StateBackend, get_state_backend
+
+ARTIFACT_DIR = os.getenv("AAC_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "aac_artifacts"))
+# 所有 session 留在記憶體中的 PDF/DOCX 總量上限，超過時先釋放閒置 session 的檔案
+ARTIFACT_MEMORY_CAP = int(float(os.getenv("AAC_ARTIFACT_MEMORY_CAP_MB", "128")) * 1024 * 1024)
+SESSION_IDLE_SECONDS = float(os.getenv("AAC_SESSION_IDLE_SECONDS", "300"))
+# 磁碟上的檔案超過此時間未被存取即刪除
+ARTIFACT_DISK_TTL = float(os.getenv("AAC_ARTIFACT_DISK_TTL", "86400"))
+_SWEEP_INTERVAL = 300.0
+
+
+def current_session_id() -> Optional[str]:
+    """目前 Streamlit session 的 ID；在背景執行緒或非 Streamlit 環境中為 None"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+@dataclass
+class SessionFootprint:
+    last_active: float
+    handles: Set[str] = field(default_factory=set)
+    object_bytes: int = 0
+
+
+class ArtifactStore:
+    """以內容雜湊為 handle 的 PDF/DOCX 儲存區
+
+    檔案一律寫入磁碟，記憶體只保留近期使用的複本；session 只持有 handle。
+    同一主機的程序共用磁碟目錄；跨主機（redis）時檔案另存一份在共享狀態，
+    本機磁碟沒有時從共享狀態取回。
+    """
+
+    def __init__(
+        self,
+        directory: str = ARTIFACT_DIR,
+        memory_cap: int = ARTIFACT_MEMORY_CAP,
+        idle_seconds: float = SESSION_IDLE_SECONDS,
+        disk_ttl: float = ARTIFACT_DISK_TTL,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.directory = directory
+        self.backend = backend if backend is not None and backend.scope == CLUSTER else None
+        self.memory_cap = memory_cap
+        self.idle_seconds = idle_seconds
+        self.disk_ttl = disk_ttl
+        self._hot: "OrderedDict[str, bytes]" = OrderedDict()
+        self._hot_bytes = 0
+        self._sessions: Dict[str, SessionFootprint] = {}
+        self._spilled = 0
+        self._disk_reads = 0
+        self._shared_reads = 0
+        self._last_sweep = time.monotonic()
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, handle: str) -> str:
+        return os.path.join(self.directory, handle)
+
+    def _write_disk(self, handle: str, data: bytes):
+        path = self._path(handle)
+        if not os.path.exists(path):
+            # 先寫暫存檔再改名，避免其他執行緒或程序讀到寫到一半的檔案
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as artifact_file:
+                artifact_file.write(data)
+            os.replace(tmp_path, path)
+
+    def _load_shared(self, handle: str) -> Optional[bytes]:
+        if self.backend is None:
+            return None
+        try:
+            data = self.backend.get(f"artifact:{handle}")
+        except Exception as e:
+            logger.warning(f"讀取共享的檔案失敗: {str(e)}")
+            return None
+        if data is not None:
+            self._write_disk(handle, data)
+            with self._lock:
+                self._shared_reads += 1
+        return data
+
+    def put(self, data: bytes) -> str:
+        handle = hashlib.sha256(data).hexdigest()
+        self._write_disk(handle, data)
+        if self.backend is not None:
+            try:
+                # 以內容雜湊為鍵，其他副本已寫入時不必覆寫
+                self.backend.set(f"artifact:{handle}", data, ttl=self.disk_ttl, nx=True)
+            except Exception as e:
+                logger.warning(f"寫入共享的檔案失敗: {str(e)}")
+        with self._lock:
+            self._remember(handle, data)
+            self._enforce_cap(keep=handle)
+        self._maybe_sweep()
+        return handle
+
+    def get(self, handle: Optional[str]) -> Optional[bytes]:
+        if not handle:
+            return None
+        with self._lock:
+            data = self._hot.get(handle)
+            if data is not None:
+                self._hot.move_to_end(handle)
+                return data
+        try:
+            with open(self._path(handle), "rb") as artifact_file:
+                data = artifact_file.read()
+            os.utime(self._path(handle))
+        except FileNotFoundError:
+            data = self._load_shared(handle)
+            if data is None:
+                return None
+        with self._lock:
+            self._disk_reads += 1
+            self._remember(handle, data)
+            self._enforce_cap(keep=handle)
+        return data
+
+    def contains(self, handle: Optional[str]) -> bool:
+        if not handle:
+            return False
+        with self._lock:
+            if handle in self._hot:
+                return True
+        if os.path.exists(self._path(handle)) or self.backend is None:
+            return os.path.exists(self._path(handle))
+        try:
+            return self.backend.exists(f"artifact:{handle}")
+        except Exception as e:
+            logger.warning(f"查詢共享的檔案失敗: {str(e)}")
+            return False
+
+    def _remember(self, handle: str, data: bytes):
+        if handle not in self._hot:
+            self._hot_bytes += len(data)
+        self._hot[handle] = data
+        self._hot.move_to_end(handle)
+
+    def _release(self, handle: str) -> bool:
+        data = self._hot.pop(handle, None)
+        if data is None:
+            return False
+        self._hot_bytes -= len(data)
+        self._spilled += 1
+        return True
+
+    def touch_session(self, session_id: Optional[str], handles: Iterable[str], object_bytes=0):
+        """記錄 session 仍在使用中，以及它引用的 handle 與結果物件的估計大小"""
+        if session_id is None:
+            return
+        with self._lock:
+            footprint = self._sessions.get(session_id)
+            if footprint is None:
+                footprint = self._sessions[session_id] = SessionFootprint(time.monotonic())
+            footprint.last_active = time.monotonic()
+            footprint.handles = {handle for handle in handles if handle}
+            footprint.object_bytes = object_bytes
+
+    def _enforce_cap(self, keep: Optional[str] = None):
+        if self._hot_bytes <= self.memory_cap:
+            return
+        now = time.monotonic()
+        # 剛存取的檔案馬上就會用到，不在這一輪釋放
+        active_handles = {keep}
+        idle_sessions = []
+        for session_id, footprint in self._sessions.items():
+            if now - footprint.last_active > self.idle_seconds:
+                idle_sessions.append((footprint.last_active, session_id))
+            else:
+                active_handles |= footprint.handles
+        # 先釋放最久未活動 session 的檔案（仍被活躍 session 引用的保留）
+        released = 0
+        for _, session_id in sorted(idle_sessions):
+            for handle in self._sessions[session_id].handles - active_handles:
+                released += self._release(handle)
+            if self._hot_bytes <= self.memory_cap:
+                break
+        # 仍超過上限時依最近使用順序釋放
+        while self._hot_bytes > self.memory_cap and len(self._hot) > 1:
+            released += self._release(next(iter(self._hot)))
+        # 長時間閒置的 session 多半已關閉分頁，不再追蹤
+        for last_active, session_id in idle_sessions:
+            if now - last_active > self.idle_seconds * 12:
+                del self._sessions[session_id]
+        if released:
+            logger.info(
+                f"記憶體中的檔案超過上限，已釋放 {released} 個（目前 {self._hot_bytes} bytes）"
+            )
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < _SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+        cutoff = time.time() - self.disk_ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            hot_sizes = {handle: len(data) for handle, data in self._hot.items()}
+            sessions = {
+                session_id: {
+                    "idle_seconds": round(now - footprint.last_active, 1),
+                    "object_bytes": footprint.object_bytes,
+                    "artifact_bytes": sum(hot_sizes.get(h, 0) for h in footprint.handles),
+                }
+                for session_id, footprint in self._sessions.items()
+            }
+            return {
+                "memory_cap_bytes": self.memory_cap,
+                "resident_artifact_bytes": self._hot_bytes,
+                "resident_artifacts": len(self._hot),
+                "sessions": len(self._sessions),
+                "idle_sessions": sum(
+                    1 for s in sessions.values() if s["idle_seconds"] > self.idle_seconds
+                ),
+                "session_object_bytes": sum(s["object_bytes"] for s in sessions.values()),
+                "spilled_total": self._spilled,
+                "disk_reads_total": self._disk_reads,
+                "shared_reads_total": self._shared_reads,
+                "per_session": sessions,
+            }
+
+
+_artifact_store = ArtifactStore(backend=get_state_backend())
+
+
+def get_artifact_store() -> ArtifactStore:
+    return _artifact_store
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(int(len(ordered) * q), len(ordered) - 1)
+    return ordered[index]
+
+
+class StageStats:
+    """記錄各階段（後端取資料、LLM 生成、PDF/DOCX 排版）最近的耗時"""
+
+    def __init__(self, max_samples: int = 2000):
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, ok: bool = True):
+        with self._lock:
+            self._samples[stage].append(seconds)
+            if not ok:
+                self._errors[stage] += 1
+
+    def samples(self, stage: str):
+        with self._lock:
+            return list(self._samples[stage])
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._errors.clear()
+
+    def summary(self) -> dict:
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self._samples.items()}
+            errors = dict(self._errors)
+        return {
+            stage: {
+                "count": len(samples),
+                "errors": errors.get(stage, 0),
+                "p50": percentile(samples, 0.50),
+                "p95": percentile(samples, 0.95),
+                "p99": percentile(samples, 0.99),
+            }
+            for stage, samples in stages.items()
+        }
+
+
+stage_stats = StageStats()
+# 各 response_format 每次呼叫的輸出 token 數
+token_stats = StageStats()
+# 各 response_format 收到回應後解析與驗證的耗時
+parse_stats = StageStats()
+
+
+@contextmanager
+def stage_timer(stage: str):
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        stage_stats.record(stage, time.perf_counter() - start, ok=ok)
@@ -0,0 +1,252 @@
+import copy
+import functools
+import io
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, TableStyle
+
+FONT_NAME = "NotoSansTC"
+FONT_PATH = "NotoSansTC-Regular.ttf"
+
+AI_REMINDER = (
+    "使用提醒：本教案、學習單與評估表皆由人工智慧輔助生成，內容僅供專業參考。"
+    "請依據實際學生狀況、課程目標與場地條件進行調整，並與專業特教人員或治療師討論後使用。"
+)
+FOOTER_DISCLAIMER = "本文件由人工智慧輔助生成，內容僅供專業參考"
+SELF_ASSESSMENT_HEADERS = ["評估項目", "滿意(V)", "需改進(X)", "反思與改進方法"]
+EVALUATION_HEADERS = ["評量項目", "評量指標", "優良（4分）", "良好（3分）", "尚可（2分）", "待加強（1分）"]
+# 單一表格列的高度上限（點），超過時拆成多列，讓表格能在任意列之間換頁
+MAX_ROW_HEIGHT = 400
+_CELL_PADDING = 12
+
+_GRID_TABLE_COMMANDS = [
+    ("TEXTCOLOR", (0, 0), (-1, -1), colors.black),
+    ("FONTNAME", (0, 0), (-1, -1), FONT_NAME),
+    ("FONTSIZE", (0, 0), (-1, -1), 10),
+    ("TOPPADDING", (0, 0), (-1, -1), 6),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ("GRID", (0, 0), (-1, -1), 1, colors.black),
+]
+LESSON_PLAN_TABLE_STYLE = TableStyle(
+    [("BACKGROUND", (0, 0), (0, -1), colors.lightgrey), ("ALIGN", (0, 0), (-1, -1), "LEFT")]
+    + _GRID_TABLE_COMMANDS
+)
+SELF_ASSESSMENT_TABLE_STYLE = TableStyle(
+    [("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey), ("ALIGN", (0, 0), (-1, -1), "CENTER")]
+    + _GRID_TABLE_COMMANDS
+)
+EVALUATION_TABLE_STYLE = TableStyle(
+    [
+        ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
+        ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LEFTPADDING", (0, 0), (-1, -1), 3),
+        ("RIGHTPADDING", (0, 0), (-1, -1), 3),
+    ]
+    + _GRID_TABLE_COMMANDS
+)
+
+
+@functools.lru_cache(maxsize=1)
+def get_styles():
+    """字型註冊與樣式表每個行程只建立一次（TTF 解析相當耗時）"""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    styles = getSampleStyleSheet()
+    styles.add(
+        ParagraphStyle(
+            name="CustomStyle",
+            fontName=FONT_NAME,
+            fontSize=12,
+            leading=14,
+            encoding="utf-8",
+            leftIndent=20,
+        )
+    )
+    for style in styles.byName.values():
+        style.fontName = FONT_NAME
+    # 表格內自動換行用
+    styles.add(
+        ParagraphStyle(
+            name="WrappedStyle", fontName=FONT_NAME, fontSize=10, leading=12, wordWrap="CJK"
+        )
+    )
+    styles.add(ParagraphStyle("RedStyle", parent=styles["CustomStyle"], textColor=colors.red))
+    return styles
+
+
+class StaticParagraph(Paragraph):
+    """斷行結果依寬度快取的段落：表格計算列高、換頁與繪製時不再重複斷行
+
+    固定內容的段落透過 fragment() 共用，快取也由所有複本共用。
+    """
+
+    def __init__(self, text, style, *args, **kwargs):
+        # 換頁切段時 ReportLab 會以同一類別與額外參數建立後半段
+        super().__init__(text, style, *args, **kwargs)
+        self._wrap_cache = {}
+
+    def wrap(self, availWidth, availHeight):
+        cached = self._wrap_cache.get(availWidth)
+        if cached is None:
+            width, height = super().wrap(availWidth, availHeight)
+            self._wrap_cache[availWidth] = (self.blPara, self._wrapWidths, height)
+            return width, height
+        self.width = availWidth
+        self.blPara, self._wrapWidths, self.height = cached
+        return availWidth, self.height
+
+
+@functools.lru_cache(maxsize=512)
+def _prototype(text: str, style_name: str) -> StaticParagraph:
+    return StaticParagraph(text, get_styles()[style_name])
+
+
+def fragment(text: str, style_name: str) -> StaticParagraph:
+    """取得固定內容段落的淺複本；wrap 狀態寫在複本上，可安全放進多份文件"""
+    return copy.copy(_prototype(text, style_name))
+
+
+def cell(text: str, style_name: str = "WrappedStyle") -> StaticParagraph:
+    return StaticParagraph(text, get_styles()[style_name])
+
+
+class ListCell(StaticParagraph):
+    """以空行分隔的清單儲存格；保留各項內容，過高時可在項目之間拆列"""
+
+    SEPARATOR = "<br/><br/>"
+
+    def __init__(self, items, style, *args, **kwargs):
+        super().__init__(self.SEPARATOR.join(items), style, *args, **kwargs)
+        self.items = list(items)
+
+    def chunks(self, width: float, max_height: float) -> list:
+        """依項目高度分組，每組合併成一個段落；每個項目只量測一次"""
+        gap = self.style.leading
+        groups, current, height = [], [], 0.0
+        for item in self.items:
+            _, item_height = StaticParagraph(item, self.style).wrap(width, max_height)
+            needed = item_height + (gap if current else 0)
+            if current and height + needed > max_height:
+                groups.append(current)
+                current, needed = [], item_height
+            current.append(item)
+            height = height + needed if len(current) > 1 else item_height
+        if current:
+            groups.append(current)
+        if len(groups) == 1:
+            return [self]
+        return [StaticParagraph(self.SEPARATOR.join(group), self.style) for group in groups]
+
+
+def list_cell(items, style_name: str = "WrappedStyle") -> ListCell:
+    return ListCell(items, get_styles()[style_name])
+
+
+def _split_to_height(paragraph, width: float, max_height: float) -> list:
+    """把過高的段落切成多段，每段高度不超過 max_height"""
+    parts = []
+    while True:
+        _, height = paragraph.wrap(width, max_height)
+        if height <= max_height:
+            parts.append(paragraph)
+            return parts
+        pieces = paragraph.split(width, max_height)
+        if len(pieces) < 2:
+            # 無法再切（例如單行就超過高度），保留原段落
+            parts.append(paragraph)
+            return parts
+        parts.append(pieces[0])
+        paragraph = pieces[1]
+
+
+def _split_row(row, col_widths, max_height):
+    """把含有過高段落的列拆成多個接續列，其他欄位在接續列中留白"""
+    columns = []
+    for value, width in zip(row, col_widths):
+        if isinstance(value, ListCell):
+            # 先在項目之間分組，避免長段落反覆切段時每次都重新斷行剩餘內容
+            columns.append([
+                part
+                for chunk in value.chunks(width - _CELL_PADDING, max_height)
+                for part in _split_to_height(chunk, width - _CELL_PADDING, max_height)
+            ])
+        elif isinstance(value, Paragraph):
+            columns.append(_split_to_height(value, width - _CELL_PADDING, max_height))
+        else:
+            columns.append([value])
+    if all(len(parts) == 1 for parts in columns):
+        return [row]
+    depth = max(len(parts) for parts in columns)
+    return [
+        [parts[i] if i < len(parts) else "" for parts in columns] for i in range(depth)
+    ]
+
+
+def long_table(rows, col_widths, style, repeat_rows=0, max_row_height=MAX_ROW_HEIGHT):
+    """可在任意列之間換頁的表格：表頭在每頁重複，過高的儲存格拆成多列
+
+    一般大小的內容輸出與原本的 Table 相同。
+    """
+    data = list(rows[:repeat_rows])
+    for row in rows[repeat_rows:]:
+        data.extend(_split_row(row, col_widths, max_row_height))
+    table = LongTable(data, colWidths=col_widths, repeatRows=repeat_rows)
+    table.setStyle(style)
+    return table
+
+
+def evaluation_header_row():
+    return [fragment(header, "WrappedStyle") for header in EVALUATION_HEADERS]
+
+
+def scoring_criteria(number_of_items: int):
+    """評分標準只依評量項目數量變化，相同數量的文字與排版可重複使用"""
+    n = number_of_items
+    criteria = [
+        f"- 優良: {3*(n-1)}-{4*n} 分,  表示學生能充分掌握技巧並理解其重要性。",
+        f"- 良好: {2*(n)}-{3*(n-1)} 分,  表示學生能較好地完成步驟，但仍有待改進的部分。",
+        f"- 尚可: {1*(n)}-{2*(n-1)} 分,  表示學生能完成部分步驟，但正確性和時間效率需加強。",
+        f"- 待加強: {1*(n-1)} 分,  表示學生需更多練習和輔助以掌握技巧。",
+    ]
+    return [fragment("評分標準", "Heading1")] + [
+        fragment(criterion, "CustomStyle") for criterion in criteria
+    ]
+
+
+def ai_reminder():
+    return [fragment("AI生成內容使用提醒", "Heading2"), fragment(AI_REMINDER, "RedStyle")]
+
+
+def _draw_page_decorations(canvas, doc):
+    """頁首標題、頁尾免責聲明與頁碼；頁尾固定內容在每份文件中只繪製一次再重複引用"""
+    width, height = doc.pagesize
+    canvas.saveState()
+    if not getattr(canvas, "_aac_footer_form", False):
+        canvas.beginForm("aac_footer")
+        canvas.setFont(FONT_NAME, 8)
+        canvas.setFillColor(colors.grey)
+        canvas.drawString(doc.leftMargin, 30, FOOTER_DISCLAIMER)
+        canvas.setStrokeColor(colors.lightgrey)
+        canvas.line(doc.leftMargin, 42, width - doc.rightMargin, 42)
+        canvas.endForm()
+        canvas._aac_footer_form = True
+    canvas.doForm("aac_footer")
+    canvas.setFont(FONT_NAME, 8)
+    canvas.setFillColor(colors.grey)
+    if doc.title:
+        canvas.drawString(doc.leftMargin, height - 40, doc.title)
+    canvas.drawRightString(width - doc.rightMargin, 30, str(doc.page))
+    canvas.restoreState()
+
+
+def build_pdf(elements, title: str = "", output=None) -> io.BytesIO:
+    """output 可為檔案路徑或檔案物件（例如直接寫入磁碟）；未指定時寫入新的 BytesIO"""
+    get_styles()
+    buffer = output if output is not None else io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, title=title)
+    doc.build(elements, onFirstPage=_draw_page_decorations, onLaterPages=_draw_page_decorations)
+    return buffer
@@ -0,0 +1,193 @@
+import asyncio
+import os
+
+from loguru import logger
+
+from aac_assets_generator.circuit_breaker import OPENAI, CircuitOpenError, get_breaker
+from aac_assets_generator.deadline import deadline_scope
+from aac_assets_generator.generator.learning_joint import LearningJointGenerator
+from aac_assets_generator.metrics import stage_timer
+from aac_assets_generator.prompts import (
+    AAC_EVALUATION_PROMPT,
+    AAC_JOINT_PROMPT,
+    AAC_TUTORIAL_PROMPT,
+)
+from aac_assets_generator.roster import Roster
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.two_tier import TwoTierGenerator
+from aac_assets_generator.utils import (
+    create_backend_session,
+    extract_main_title,
+    get_board_prompt_word_data_async,
+    get_user_study_sheet_data_async,
+    parse_user_data,
+)
+
+# separate：教案與評估表分兩次呼叫；joint：一次呼叫同時生成，總 token 較少但單次較久；
+# two_tier：每個版面只生成一次通用教材（快取），再以輕量模型依個別學生調整
+GENERATION_MODE = os.getenv("AAC_GENERATION_MODE", "separate")
+# 批次生成名單時同時進行的 (個案特徵, 版面) 數；實際的 LLM 並行數仍由排程器控制
+ROSTER_CONCURRENCY = int(os.getenv("AAC_ROSTER_CONCURRENCY", "4"))
+
+
+async def fetch_board_context(api_key, board_id):
+    """同時取得使用者資料與版面提示詞"""
+    with stage_timer("backend_fetch"):
+        async with create_backend_session() as session:
+            user_data_task = asyncio.create_task(get_user_study_sheet_data_async(session, api_key))
+            prompt_data_task = asyncio.create_task(
+                get_board_prompt_word_data_async(session, api_key, board_id)
+            )
+            return await asyncio.gather(user_data_task, prompt_data_task)
+
+
+async def generate_board_assets(
+    user_data,
+    prompt_data,
+    learningasset_generator,
+    learningevaluate_generator,
+    priority=Priority.INTERACTIVE,
+    case_info=None,
+):
+    """case_info 已由批次匯入（roster）組好時不再從 user_data 解析"""
+    info = case_info if case_info is not None else parse_user_data(user_data)
+    user_account = user_data.get("userAccount")
+    main_title = extract_main_title(prompt_data["promptContent"])
+    sub_title = prompt_data["promptTitle"]
+
+    if GENERATION_MODE == "joint":
+        # 共用兩個產生器的 client 與排程器
+        joint_generator = LearningJointGenerator(
+            learningasset_generator.client, learningasset_generator.scheduler
+        )
+        with stage_timer("learning_joint"):
+            learning_asset, learning_evaluate, case_info = (
+                await joint_generator.generate_learning_joint_async(
+                    info,
+                    prompt_data["promptContent"],
+                    prompt=AAC_JOINT_PROMPT,
+                    user_account=user_account,
+                    priority=priority,
+                )
+            )
+        return learning_asset, learning_evaluate, main_title, sub_title, case_info
+
+    if GENERATION_MODE == "two_tier":
+        two_tier_generator = TwoTierGenerator(
+            learningasset_generator.client, learningasset_generator.scheduler
+        )
+        learning_asset, learning_evaluate, case_info = (
+            await two_tier_generator.generate_two_tier_async(
+                info, prompt_data["promptContent"], user_account=user_account, priority=priority
+            )
+        )
+        return learning_asset, learning_evaluate, main_title, sub_title, case_info
+
+    prompt = AAC_TUTORIAL_PROMPT  # + prompt_data['promptContent']
+    with stage_timer("learning_asset"):
+        learning_asset, case_info = await learningasset_generator.generate_learning_asset_async(
+            info,
+            prompt_data["promptContent"],
+            prompt=prompt,
+            user_account=user_account,
+            priority=priority,
+        )
+
+    prompt = AAC_EVALUATION_PROMPT
+    with stage_timer("learning_evaluate"):
+        learning_evaluate, case_info = (
+            await learningevaluate_generator.generate_learning_evaluate_async(
+                info,
+                prompt_data["promptContent"],
+                prompt=prompt,
+                user_account=user_account,
+                priority=priority,
+            )
+        )
+    return learning_asset, learning_evaluate, main_title, sub_title, case_info
+
+
+async def process_request(
+    api_key,
+    board_id,
+    learningasset_generator,
+    learningevaluate_generator,
+    prefetcher=None,
+    deadline=None,
+):
+    """deadline 為頁面請求的截止時間（time.monotonic()），後端請求與各 LLM 階段依剩餘時間調整"""
+    try:
+        with deadline_scope(deadline):
+            # 生成無法進行時不必先向後端取資料
+            get_breaker(OPENAI).check()
+            user_data, prompt_data = await fetch_board_context(api_key, board_id)
+            result = await generate_board_assets(
+                user_data, prompt_data, learningasset_generator, learningevaluate_generator
+            )
+        if prefetcher is not None:
+            # 目前請求完成後，才在背景預先生成同系列的其他版面
+            prefetcher.schedule(api_key, board_id, user_data, prompt_data)
+        return result
+    except CircuitOpenError:
+        # 交給介面顯示上游異常或改用快取內容
+        raise
+    except Exception as e:
+        logger.error(f"處理請求時發生錯誤: {str(e)}")
+        return None, None, None, None, None
+
+
+async def generate_roster_assets(
+    roster: Roster,
+    boards,
+    learningasset_generator,
+    learningevaluate_generator,
+    user_account="roster",
+    concurrency=ROSTER_CONCURRENCY,
+):
+    """每個 (個案特徵, 版面) 只生成一次，再分送給特徵相同的每位學生
+
+    boards 為 [(board_id, prompt_data)]；回傳 {(學生列號, board_id): SessionResult 的欄位}，
+    case_info 換成各學生自己的資料。生成失敗的組合不會出現在結果中。
+    整份名單都以 user_account 排程，與其他使用者公平分享名額；批次工作的每位使用者上限
+    見 AAC_LLM_BATCH_PER_USER_LIMIT，整體並行數由 concurrency 控制。
+    """
+    groups = roster.groups()
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    logger.info(
+        f"批次生成：{len(roster)} 位學生、{len(groups)} 種個案特徵 × {len(boards)} 個版面，"
+        f"共 {len(groups) * len(boards)} 次生成（逐一生成需 {len(roster) * len(boards)} 次）"
+    )
+
+    async def generate(profile_key, board_id, prompt_data):
+        async with semaphore:
+            try:
+                return await generate_board_assets(
+                    {"userAccount": user_account},
+                    prompt_data,
+                    learningasset_generator,
+                    learningevaluate_generator,
+                    priority=Priority.BATCH,
+                    case_info=roster.generation_info(profile_key),
+                )
+            except Exception as e:
+                logger.error(f"批次生成版面 {board_id} 時發生錯誤: {str(e)}")
+                return None
+
+    pairs = [(key, board_id, prompt_data) for key in groups for board_id, prompt_data in boards]
+    generated = await asyncio.gather(*(generate(*pair) for pair in pairs))
+
+    case_infos = roster.frame["case_info"]
+    results = {}
+    for (profile_key, board_id, _), result in zip(pairs, generated):
+        if result is None or result[0] is None or result[1] is None:
+            continue
+        learning_asset, learning_evaluate, main_title, sub_title, _ = result
+        for row in groups[profile_key]:
+            results[(row, board_id)] = (
+                learning_asset,
+                learning_evaluate,
+                main_title,
+                sub_title,
+                case_infos.iloc[row],
+            )
+    return results
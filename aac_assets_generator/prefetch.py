@@ -0,0 +1,200 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from loguru import logger
+
+from aac_assets_generator.pipeline import generate_board_assets
+from aac_assets_generator.result_cache import get_result_cache
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.session_cache import SessionResult, result_key
+from aac_assets_generator.utils import (
+    create_backend_session,
+    extract_main_title,
+    get_board_prompt_word_data_async,
+)
+
+PREFETCH_ENABLED = os.getenv("AAC_PREFETCH", "0") == "1"
+# 以目前版面 ID 往前、往後各最多探查幾個 ID 搜尋同系列的版面（遇到第一個缺口即停止）
+PREFETCH_WINDOW = int(os.getenv("AAC_PREFETCH_WINDOW", "3"))
+# 每位使用者在 PREFETCH_BUDGET_PERIOD 秒內最多預先生成幾個版面
+PREFETCH_BUDGET_PER_USER = int(os.getenv("AAC_PREFETCH_BUDGET_PER_USER", "5"))
+PREFETCH_BUDGET_PERIOD = float(os.getenv("AAC_PREFETCH_BUDGET_PERIOD", "3600"))
+
+
+class InteractiveActivity:
+    """追蹤進行中的互動請求數，讓背景預取在有人等待時暫停"""
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self._count += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._count -= 1
+
+    @property
+    def idle(self) -> bool:
+        return self._count == 0
+
+
+interactive_activity = InteractiveActivity()
+
+
+def _owned_by(prompt_data, user_account) -> bool:
+    # 後端回傳版面擁有者時，只接受同一個帳號的版面
+    owner = prompt_data.get("userAccount")
+    return not owner or not user_account or owner == user_account
+
+
+async def _probe_direction(session, api_key, start, step, window, main_title, user_account):
+    """從 start 往 step 方向逐一探查，遇到不存在、不同系列或不同擁有者的版面即停止"""
+    siblings = []
+    for distance in range(1, window + 1):
+        candidate = start + step * distance
+        if candidate <= 0:
+            break
+        try:
+            prompt_data = await get_board_prompt_word_data_async(session, api_key, str(candidate))
+        except Exception:
+            break
+        prompt_content = (prompt_data or {}).get("promptContent")
+        if not prompt_content or extract_main_title(prompt_content) != main_title:
+            break
+        if not _owned_by(prompt_data, user_account):
+            break
+        siblings.append((str(candidate), prompt_data))
+    return siblings
+
+
+async def find_sibling_boards(
+    session, api_key, board_id, main_title, window=PREFETCH_WINDOW, user_account=None
+):
+    """在相鄰的版面 ID 中找出同一系列（extract_main_title 相同）的版面
+
+    後端沒有依使用者或系列列出版面的 API，只能逐一探查相鄰 ID：兩個方向各自依序
+    探查，遇到第一個缺口就停止，呼叫數約為系列內的版面數 + 2，而不是固定 2 × window。
+    """
+    if main_title == "AAC系列":
+        # 無法辨識系列名稱時不猜測
+        return []
+    try:
+        current = int(board_id)
+    except (TypeError, ValueError):
+        return []
+
+    before, after = await asyncio.gather(
+        _probe_direction(session, api_key, current, -1, window, main_title, user_account),
+        _probe_direction(session, api_key, current, 1, window, main_title, user_account),
+    )
+    return list(reversed(before)) + after
+
+
+class BoardPrefetcher:
+    """在背景以低優先權預先生成同系列其他版面，結果寫入跨 session 的結果快取"""
+
+    def __init__(
+        self,
+        learningasset_generator,
+        learningevaluate_generator,
+        result_cache=None,
+        window=PREFETCH_WINDOW,
+        budget_per_user=PREFETCH_BUDGET_PER_USER,
+        budget_period=PREFETCH_BUDGET_PERIOD,
+        idle_poll_interval=0.5,
+    ):
+        self.learningasset_generator = learningasset_generator
+        self.learningevaluate_generator = learningevaluate_generator
+        self.result_cache = result_cache or get_result_cache()
+        self.window = window
+        self.budget_per_user = budget_per_user
+        self.budget_period = budget_period
+        self.idle_poll_interval = idle_poll_interval
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._spent = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def schedule(self, api_key, board_id, user_data, prompt_data):
+        key = result_key(api_key, board_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="aac-board-prefetcher", daemon=True
+                )
+                self._worker.start()
+        self._queue.put((key, api_key, board_id, user_data, prompt_data))
+
+    def _run(self):
+        while True:
+            key, api_key, board_id, user_data, prompt_data = self._queue.get()
+            try:
+                asyncio.run(self._prefetch_series(api_key, board_id, user_data, prompt_data))
+            except Exception as e:
+                logger.error(f"預先生成同系列版面時發生錯誤: {str(e)}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def _take_budget(self, user_account) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            spent = self._spent[user_account]
+            while spent and now - spent[0] > self.budget_period:
+                spent.popleft()
+            if len(spent) >= self.budget_per_user:
+                return False
+            spent.append(now)
+            return True
+
+    async def _wait_for_idle(self):
+        # 有互動請求進行中時讓出資源
+        while not interactive_activity.idle:
+            await asyncio.sleep(self.idle_poll_interval)
+
+    async def _prefetch_series(self, api_key, board_id, user_data, prompt_data):
+        main_title = extract_main_title(prompt_data["promptContent"])
+        async with create_backend_session() as session:
+            siblings = await find_sibling_boards(
+                session,
+                api_key,
+                board_id,
+                main_title,
+                window=self.window,
+                user_account=user_data.get("userAccount"),
+            )
+        user_account = user_data.get("userAccount") or result_key(api_key, "")
+
+        for sibling_id, sibling_prompt_data in siblings:
+            key = result_key(api_key, sibling_id)
+            if key in self.result_cache:
+                continue
+            if not self._take_budget(user_account):
+                logger.info(f"使用者 {user_account} 的預取額度已用完")
+                return
+            await self._wait_for_idle()
+            logger.info(f"預先生成版面 {sibling_id}（{main_title}系列）")
+            result = SessionResult(
+                *await generate_board_assets(
+                    user_data,
+                    sibling_prompt_data,
+                    self.learningasset_generator,
+                    self.learningevaluate_generator,
+                    priority=Priority.PREFETCH,
+                )
+            )
+            self.result_cache.put(key, result)
@@ -0,0 +1,220 @@
+import contextvars
+import functools
+import hmac
+import inspect
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+from loguru import logger
+
+PROFILE_DIR = os.getenv("AAC_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "aac_profiles"))
+# 設為 1 時每個請求都剖析（只建議在測試環境使用）
+PROFILE_ALL = os.getenv("AAC_PROFILE", "0") == "1"
+# 正式環境以低比例隨機抽樣，例如 0.01
+PROFILE_SAMPLE_RATE = float(os.getenv("AAC_PROFILE_SAMPLE_RATE", "0"))
+# 網址帶 ?profile=<token> 時剖析該請求；未設定 token 時停用此方式
+PROFILE_ADMIN_TOKEN = os.getenv("AAC_PROFILE_ADMIN_TOKEN", "")
+PROFILE_INTERVAL = float(os.getenv("AAC_PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_MAX_FILES = int(os.getenv("AAC_PROFILE_MAX_FILES", "200"))
+PROFILE_MAX_AGE = float(os.getenv("AAC_PROFILE_MAX_AGE", str(7 * 86400)))
+PROFILE_TOP_ALLOCATIONS = 30
+_TRACEMALLOC_FRAMES = 10
+
+# 目前請求是否要剖析（由 request_profiling 設定）與正在進行中的剖析名稱
+_profile_label: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "aac_profile_label", default=None
+)
+_active_profile: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "aac_active_profile", default=None
+)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """網址參數中的 token 是否為管理者 token（未設定 AAC_PROFILE_ADMIN_TOKEN 時一律否）"""
+    # 以 bytes 比較：compare_digest 遇到含非 ASCII 字元的 str 會拋出 TypeError
+    return bool(token and PROFILE_ADMIN_TOKEN) and hmac.compare_digest(
+        token.encode("utf-8"), PROFILE_ADMIN_TOKEN.encode("utf-8")
+    )
+
+
+def should_profile(token: Optional[str] = None) -> bool:
+    """依環境變數、管理者 token 或抽樣比例決定這個請求是否剖析"""
+    if PROFILE_ALL or is_admin_token(token):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def request_profiling(enabled: bool, label: str = "request"):
+    """在此範圍內呼叫的 @profiled 函式會寫出剖析結果"""
+    if not enabled:
+        yield
+        return
+    label = re.sub(r"[^\w.-]+", "_", label)[:40] or "request"
+    token = _profile_label.set(f"{time.strftime('%Y%m%d-%H%M%S')}-{label}")
+    try:
+        yield
+    finally:
+        _profile_label.reset(token)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """定期擷取指定執行緒的呼叫堆疊，輸出 flame graph 使用的 folded stacks 格式
+
+    協程在背景 event loop 執行時取樣的是整個 loop 執行緒，同一時間其他請求的工作也會出現。
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="aac-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracemalloc(before):
+    global _tracemalloc_users
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    # 排除剖析器本身的配置
+    filters = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+    after, before = after.filter_traces(filters), before.filter_traces(filters)
+    return after.compare_to(before, "lineno")[:PROFILE_TOP_ALLOCATIONS], peak
+
+
+def _prune(directory: str):
+    """只保留最近的剖析檔案"""
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_file()),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    cutoff = time.time() - PROFILE_MAX_AGE
+    for index, entry in enumerate(entries):
+        if index >= PROFILE_MAX_FILES or entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def _write_profile(name, stacks, allocations, peak, elapsed):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+    with open(f"{base}.folded", "w", encoding="utf-8") as folded_file:
+        for stack, count in stacks.most_common():
+            folded_file.write(f"{stack} {count}\n")
+    with open(f"{base}.alloc.txt", "w", encoding="utf-8") as alloc_file:
+        alloc_file.write(f"elapsed: {elapsed:.3f}s  traced peak: {peak / 1024:.1f} KiB\n")
+        for stat in allocations:
+            alloc_file.write(f"{stat}\n")
+    _prune(PROFILE_DIR)
+    logger.info(f"已寫出剖析結果 {base}.folded（{sum(stacks.values())} 個樣本）")
+
+
+@contextmanager
+def _profile_block(name: str):
+    label = _profile_label.get()
+    if label is None or _active_profile.get() is not None:
+        # 未要求剖析，或已在外層的剖析範圍內
+        yield
+        return
+    token = _active_profile.set(name)
+    profiler = SamplingProfiler(threading.get_ident())
+    before = _start_tracemalloc()
+    profiler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stacks = profiler.stop()
+        allocations, peak = _stop_tracemalloc(before)
+        _active_profile.reset(token)
+        try:
+            _write_profile(f"{label}-{name}", stacks, allocations, peak, elapsed)
+        except OSError as e:
+            logger.warning(f"寫出剖析結果失敗: {str(e)}")
+
+
+async def _profile_coroutine(name, coro, context):
+    # 協程可能在其他執行緒的 event loop 上執行，沿用呼叫當下的剖析設定
+    _profile_label.set(context)
+    with _profile_block(name):
+        return await coro
+
+
+def profiled(name: str):
+    """剖析函式的 CPU 時間分布與記憶體配置；只在 request_profiling 啟用的範圍內生效
+
+    用於 async 函式時，是否剖析在建立協程的當下決定。
+    """
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            def async_wrapper(*args, **kwargs):
+                coro = fn(*args, **kwargs)
+                label = _profile_label.get()
+                if label is None:
+                    return coro
+                return _profile_coroutine(name, coro, label)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _profile_block(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,100 @@
+import os
+import re
+from typing import List, NamedTuple, Tuple
+
+from loguru import logger
+
+from aac_assets_generator.prompts import AAC_TUTORIAL_PROMPT
+
+# 是否依個案溝通方式裁剪提示詞中的「溝通方式」參考表
+PRUNE_COMMUNICATION_TABLE = os.getenv("AAC_PRUNE_COMMUNICATION_TABLE", "1") != "0"
+
+_TABLE_HEADING = "# 溝通方式"
+_CJK_PATTERN = re.compile(r"[　-〿一-鿿＀-￯]")
+_CASE_METHODS_PATTERN = re.compile(r"溝通方式:\s*(.*)")
+
+
+class CommunicationMethodRow(NamedTuple):
+    number: str
+    name: str
+    line: str
+
+    @property
+    def keywords(self) -> List[str]:
+        # 「書寫／打字」之類的複合名稱，拆開後任一個詞出現即視為相關
+        return [self.name] + [part for part in re.split(r"[／/]", self.name) if part]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數：中日韓字元約一字一 token，其餘約四字元一 token"""
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def parse_communication_table(prompt: str) -> Tuple[List[str], List[CommunicationMethodRow]]:
+    """把提示詞中的溝通方式表格解析成表頭與逐列資料"""
+    lines = prompt.split("\n")
+    start = lines.index(_TABLE_HEADING) + 1
+    table_lines = []
+    for line in lines[start:]:
+        if not line.startswith("|"):
+            break
+        table_lines.append(line)
+
+    header, rows = table_lines[:2], []
+    for line in table_lines[2:]:
+        cells = [cell.strip() for cell in line.strip("|").split("|")]
+        rows.append(CommunicationMethodRow(cells[0], cells[1].strip("*"), line))
+    return header, rows
+
+
+COMMUNICATION_TABLE_HEADER, COMMUNICATION_METHOD_ROWS = parse_communication_table(
+    AAC_TUTORIAL_PROMPT
+)
+_FULL_TABLE = "\n".join(COMMUNICATION_TABLE_HEADER + [row.line for row in COMMUNICATION_METHOD_ROWS])
+
+
+def extract_communication_methods(case_info: str) -> str:
+    match = _CASE_METHODS_PATTERN.search(case_info)
+    return match.group(1).strip() if match else ""
+
+
+def select_communication_rows(communication_methods: str) -> List[CommunicationMethodRow]:
+    if not communication_methods or communication_methods == "未提供":
+        return []
+    return [
+        row
+        for row in COMMUNICATION_METHOD_ROWS
+        if any(keyword in communication_methods for keyword in row.keywords)
+    ]
+
+
+def build_communication_table(communication_methods: str) -> str:
+    """只保留個案使用的溝通方式列，其餘以一行名稱摘要帶過"""
+    selected = select_communication_rows(communication_methods)
+    if not selected:
+        return _FULL_TABLE
+
+    others = [row.name for row in COMMUNICATION_METHOD_ROWS if row not in selected]
+    table = "\n".join(COMMUNICATION_TABLE_HEADER + [row.line for row in selected])
+    if others:
+        table += f"\n\n其他溝通方式（個案未使用，僅列名稱）：{'、'.join(others)}"
+    return table
+
+
+def build_full_prompt(prompt: str, case_info: str, learn_assets_contents: str) -> Tuple[str, int]:
+    """填入個案資料與學習單內容，並依個案溝通方式裁剪參考表
+
+    回傳組好的提示詞，以及裁剪後估計省下的 token 數。
+    """
+    full_prompt = prompt.replace("<case_info>", case_info)
+    full_prompt = full_prompt.replace("<learn_assets_contents>", learn_assets_contents)
+    if not PRUNE_COMMUNICATION_TABLE or _FULL_TABLE not in full_prompt:
+        return full_prompt, 0
+
+    pruned_table = build_communication_table(extract_communication_methods(case_info))
+    tokens_saved = estimate_tokens(_FULL_TABLE) - estimate_tokens(pruned_table)
+    if tokens_saved > 0:
+        full_prompt = full_prompt.replace(_FULL_TABLE, pruned_table, 1)
+        logger.info(f"溝通方式表已裁剪，估計節省 {tokens_saved} tokens")
+    return full_prompt, max(tokens_saved, 0)
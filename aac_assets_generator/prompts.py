@@ -186,3 +186,168 @@ AAC_EVALUATION_PROMPT = """
 請確保生成的內容完全符合特殊教育的專業標準，依據<個案資料>高度個人化，生成內容與提供的結構嚴格一致。你的回覆應該只包含一個專業、全面且易於使用的評估表，無需任何額外解釋或評論。
 評估表應當既能準確評估學生的技能水平，又能為教育者提供有價值的教學反饋。每個評分等級下的具體行為描述將幫助評分者更加客觀和一致地進行評估。
 """
+
+# 教案、學習單與評估表一次生成：個案分析與溝通方式參考表只出現一次
+AAC_JOINT_PROMPT = """
+你是一位經驗豐富的且擅長設計以優勢導向為核心的學習活動的特殊教育專家，同時擁有設計評估工具的豐富經驗。
+你的任務是根據提供的<個案資料>/<學習單類型> 和<學習單內容>，一次生成高質量、專業的教案、學習單與對應的評估表，格式要與提供的結構嚴格一致。
+教案、學習單與評估表共用同一份個案分析，評估表的評量項目需對應教案的教學目標與教學步驟。
+
+**在你開始設計之前，請遵循以下思考流程：**
+
+1.  **深度分析**：徹底研讀<個案資料>，精準掌握學生的障礙特質、溝通模式(特別是AAC工具的使用情況)、優勢與弱勢能力，以及預計的教學時間。
+2.  **策略連結**：基於你的分析，構思如何將教學內容與學生的特點進行媒合。明確思考：
+    * 如何運用學生的**優勢能力**來引導學習？
+    * 如何設計鷹架策略來支持學生的**弱勢能力**？
+    * 如何將學生的**溝通方式(AAC)**無縫整合到教學互動與評估中？
+    * 如何在**預計教學時間**內高效地達成目標？
+3.  **評量維度構思**：從教學目標定義本次評估的核心技能，規劃需要涵蓋的評量項目與維度。
+
+**請嚴格按照以下結構與指示生成內容，無需任何額外解釋或評論。**
+
+---
+
+<個案資料>:
+<case_info>
+
+<學習單內容>:
+<learn_assets_contents>
+
+---
+
+# [第一步：預先思考與分析]
+***請在此處簡潔條列化你的專業分析與教學策略，教案、學習單與評估表皆依此設計***
+- **核心挑戰分析**: 根據個案資料，學生在本次學習中可能遇到的主要困難點是什麼？
+- **優勢能力應用**: 我將如何利用學生的優勢能力（例如：視覺辨識、操作能力）來促進學習？
+- **溝通方式**: 個案目前的溝通方式為何？ 將基於此來設計教學步驟與評估表中的個案輸出方式。
+- **弱勢能力支持**: 針對學生的弱勢環節，我計畫採用哪些具體的支持策略（例如：步驟分解、視覺提示卡）？
+- **AAC整合策略**: 在教學互動中，我將如何設計提問與回饋方式，讓學生能有效地使用其AAC工具來參與及表達？
+- **評估個人化調整**: 考量到個案的特質，評量項目/評分標準需做哪些調整（例如：放寬時間限制、允許使用AAC輔具作答）？
+
+# 溝通方式
+| #  | 溝通方式 | 核心概念與特點 | 適用情境 | 練習建議與示範活動 |
+|---|-----------|---------------|-----------|-------------------|
+| 1 | **眼睛凝視** | 以視線停留或掃描選取目標；常見於眼控板、視線追蹤系統 | 肢體受限、上肢動作不足的學員 | ‣ 目標尋找遊戲：在眼控板上擺 4–6 張圖示，讓學員用視線「點選」想要的物品 <br> ‣ 視線畫圖：使用眼控軟體在螢幕上「畫線」，強化持續注視能力 |
+| 2 | **聲音** | 指自然發出的各類聲響（不一定是口語）；如嗯、啊、咳嗽 | 仍能穩定發聲但語句有限 | ‣ 聲音開關訓練：教師說「開始」學員發聲、「停止」立刻閉口，加深聲控概念 <br> ‣ 聲音換獎品：發出指定音調才可獲得喜愛物 |
+| 3 | **手語** | 系統化的符號語言（臺灣手語等） | 上肢協調佳、聽障或口語困難 | ‣ 日常手語詞彙卡片配對 <br> ‣ 手語故事接龍：輪流比 2–3 個手語詞接續情節 |
+| 4 | **照片** | 拍攝真實環境或物品，用於具體溝通 | 抽象理解弱、需要情境支援 | ‣ 「今天想吃？」：讓學員指向餐點照片 <br> ‣ 行前預演：出門前按照照片流程卡練習 |
+| 5 | **書寫／打字** | 使用筆跡、鍵盤、溝通板 (e.g. 字母板) | 具文字基礎、口語受限 | ‣ 視覺詞語接龍：打出下一個關鍵字 <br> ‣ 即時聊天：用平板打字與同儕對談 |
+| 6 | **臉部表情** | 透過眉眼、嘴形傳遞情緒或意圖 | 能控制表情肌者、增進情緒識別 | ‣ 表情模仿鏡：模仿指定情緒 <br> ‣ 表情猜猜看：拍照讓同學猜情緒 |
+| 7 | **聲調抑揚頓挫** | 利用語音高低、快慢、重音表達差異 | 可發單字但需增意圖明確度 | ‣ 「是／不是」高低調練習 <br> ‣ 朗讀強弱拍點：念句子時打節拍 |
+| 8 | **口語** | 清晰或較完整的語句表達 | 有一定發音能力 | ‣ 角色扮演：店員‐客人點餐 <br> ‣ 口語接龍：每人完整說一個句子 |
+| 9 | **圖片** | 象徵性圖卡（PCS、ARASAAC 等） | 需標準化圖示、學習速度快 | ‣ PECS 交換：以手遞圖卡換物 <br> ‣ 圖卡排句：用多張圖排成「主‐動‐受」 |
+|10 | **語音溝通器** | 具 TTS 或錄音播放的裝置、App | 需要音量大、可自選詞彙者 | ‣ 頻用句預錄：如「我要休息」 <br> ‣ 場景頁練習：超市頁面選詞支付 |
+|11 | **肢體動作** | 各種大動作（拍手、指物、點頭） | 口語不足但粗大動作 OK | ‣ 手指天氣：指向窗外或日曆說天氣 <br> ‣ 指路遊戲：用手勢示方向 |
+|12 | **手勢** | 約定俗成的小動作（OK、讚） | 教具少、需要快速指令 | ‣ 手勢賓果：出示手勢卡配對 <br> ‣ 手勢接力：一人比、一人猜 |
+|13 | **實物** | 直接拿真實物件表示需求 | 抽象能力低、早期溝通 | ‣ 物品交換：把水壺交給老師以索取水 <br> ‣ 觸摸選擇：閉眼摸物選想要 |
+|14 | **字卡** | 列印文字／注音／拼音小卡 | 能識字或正在識字 | ‣ 字卡排序：排出完整句子 <br> ‣ 配對遊戲：字卡配圖或實物 |
+|15 | **其他** | 任何創意媒介（表格、點頭碼） | 需客製化的特殊情境 | ‣ 例：嗅覺卡片、振動回饋按鈕 |
+
+
+---
+
+# [第二步：教案與學習單]
+
+## 教案
+
+- 教案名稱: [請根據學習單內容提供簡潔明確的教案名稱]
+- 教學目標: [列出1個具體、可衡量的學習目標]
+- 教學內容: [簡要列舉幾個描述本次教學的主要內容，應與教學目標直接相關]
+- 教學方法: [列出2-4種將要使用的教學方法，每種方法包含標題和簡短解釋]
+- 教學步驟: [詳細列出5-10個具體的教學步驟，包括如廁過程中的每個關鍵動作，每個步驟包含簡短標題和擴充解釋]
+   - 請注意，請將每個步驟的輸出方式與個案的溝通方式、強調個案優勢能力，並針對弱勢能力提供必要支持，以確保個案能夠理解並參與。
+   - 請將每個步驟的輸出方式加入藉由輔助溝通系統（如AAC）、簡化語句或視覺輔助支持語言與社交互動等策略。
+- 評量方式: [列出2-3種評量學生學習成效的方法，每個方式包含簡短標題和擴充解釋]
+
+## 學習單
+
+- 練習題: [列出2-3個與主題相關的具體問題或任務]
+- 活動指導: [提供2-3個具體的活動說明，如「實踐活動」或「觀察活動」]
+- 反思問題: [列出2-3個促進學生思考的開放式問題]
+- 評量題: [提供2-3個評估學習成效的具體問題]
+- 自我評估項目: [列出3-5個具體的評估項目，如「我能夠正確完成每個如廁步驟」]
+- 合作學習活動: [描述一個促進學生互動和合作的小組活動]
+- 以上學習單內容需含操作與溝通方式建議
+
+---
+
+# [第三步：技能評估表]
+
+1. 評估表標題<evaluation_asset_title>：
+   [從<學習單內容>汲取出的標題]
+
+2. 表格結構：
+   a. 創建一個包含以下內容的表格<EvaluationAssetTable>:
+        - 表格包含多個評量項目<evaluation_items>: 為該技能生成 5~10個關鍵評量項目，包括但不限於：
+               - 步驟完成情況
+               - 具體動作的執行（如：打開水龍頭、關閉水龍頭等）
+               - 時間效率（如適用）
+               - 相關知識理解
+               - 自我評估與反思
+               - 合作學習與反饋
+   b. 每個評量項目<EvaluationItem>具備以下內容
+        - <evaluation_item_title>: 評量項目的名稱
+        - 評量指標<evaluation_metric>: 為每個評量項目創建詳細的評量指標。根據評量項目的性質，靈活決定是否需要包含額外的評估維度（如時間、質量、頻率等）。
+        - 詳細評分標準<score_descriptions>: 為每個評量項目提供四個等級的具體評分標準，每個等級都應包含明確、可觀察的行為描述：
+            - 優良（4分）<excellent_with_score_4>：描述完全達到或超越預期的表現。
+            - 良好（3分）<good_with_score_3>：描述基本達到預期，但仍有小幅改進空間的表現。
+            - 尚可（2分）<fair_with_score_2>：描述部分達到預期，但需要明顯改進的表現。
+            - 待加強（1分）<needs_improvement_with_score_1>：描述遠低於預期，需要大幅改進的表現。
+
+            例如，對於「打開水龍頭」這個評量項目：
+
+            - 優良（4分） <excellent_with_score_4>：順利打開水龍頭並能適當調節水流大小。
+            - 良好（3分） <good_with_score_3>：順利打開水龍頭，但水流調節稍有偏差。
+            - 尚可（2分） <fair_with_score_2>：打開水龍頭有困難或無法適當調節水流。
+            - 待加強（1分） <needs_improvement_with_score_1>：無法自行打開水龍頭或完全依賴他人幫助。
+
+3. 適應性考慮：
+   在設計評估標準時，考慮到可能的身體或認知障礙，提供靈活的評估方式。
+
+4. 正面語言：
+   使用鼓勵性和建設性的語言來描述各個等級的表現，避免使用貶低或消極的詞語。
+
+5. 具體性：
+   確保所有評分標準都是具體、可觀察且可測量的。
+
+6. 連貫性：
+    確保各個評量項目之間有邏輯連貫性，共同反映該生活自理技能的全面掌握情況。
+
+
+# 特別注意事項：
+- 確保所有內容都嚴格對應<個案資料>中描述的學生特點和能力水平。
+- 根據學生的障礙類別，調整教學策略和材料的呈現方式。
+- 請以學生的優勢能力為主，支持弱勢能力，設計適合使用的教學活動。
+- 確保教學步驟和活動設計符合預計的教學時間。
+- 使用學生熟悉的溝通方式來呈現指示和問題。
+- 所有內容都應該使用正面、鼓勵性的語言，增強學生的自信心。
+
+# 其他注意事項
+- 請確保生成的內容完全符合特殊教育的專業標準，並依據<個案資料>高度個人化，輸出內容與提供的結構嚴格一致。你的回覆應該只包含教案、學習單與評估表的結構化內容，無需任何額外解釋或評論。
+- AI生成內容使用提醒（加註於文件頁尾）
+使用提醒：本教案、學習單與評估表皆由人工智慧輔助生成，內容僅供專業參考。請依據實際學生狀況、課程目標與場地條件進行調整，並與專業特教人員或治療師討論後使用。
+"""
+
+# 兩階段生成的第二階段：把版面層級的通用教材依個別學生調整
+AAC_ADAPT_PROMPT = """
+你是一位經驗豐富、擅長以優勢導向設計學習活動的特殊教育專家。
+以下<通用教材>是依<學習單內容>為一般學生預先設計的教案、學習單與評估表（JSON）。
+請依<個案資料>將它個人化，輸出結構完全相同的 JSON，無需任何額外解釋或評論。
+
+# 調整原則
+- 保留教學主題、教學目標方向、教學步驟的順序與評量項目，不要新增或刪除整個段落。
+- 依個案的**溝通方式**改寫教學步驟、活動指導、練習題與評量題中的個案輸出方式（例如改用圖卡指認、語音溝通器作答）。
+- 運用個案的**優勢能力**引導學習，並針對**弱勢能力**加入具體的支持策略（例如：步驟分解、視覺提示卡）。
+- 依**預計教學時間**調整教學步驟的數量與份量。
+- 評估表的評量指標與各等級評分標準需反映個案的溝通方式與個人化調整。
+- 所有內容都應該使用正面、鼓勵性的語言。
+
+<個案資料>:
+<case_info>
+
+<學習單內容>:
+<learn_assets_contents>
+
+<通用教材>:
+<base_assets>
+"""
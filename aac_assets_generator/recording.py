@@ -0,0 +1,303 @@
+import asyncio
+import atexit
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+import aiohttp
+import httpx
+from loguru import logger
+
+from aac_assets_generator import utils
+
+# AAC_TRANSPORT_MODE=record|replay 搭配 AAC_CASSETTE 指定錄製檔
+TRANSPORT_MODE = os.getenv("AAC_TRANSPORT_MODE", "")
+CASSETTE_PATH = os.getenv("AAC_CASSETTE", "fixtures/cassette.json")
+# 重播時的延遲倍率：1 為原始時間，0 為不等待
+REPLAY_TIME_SCALE = float(os.getenv("AAC_REPLAY_TIME_SCALE", "1.0"))
+
+REDACTED_NAME = "學生"
+_DROPPED_HEADERS = {"authorization", "content-encoding", "content-length", "transfer-encoding"}
+
+
+class Cassette:
+    """錄製的請求/回應配對（已遮蔽個資），以 JSON 檔保存"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.interactions = []
+        self._sensitive = {}
+        self._replay_index = defaultdict(int)
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as cassette_file:
+                self.interactions = json.load(cassette_file)
+
+    def redact(self, text: str) -> str:
+        for value, placeholder in self._sensitive.items():
+            text = text.replace(value, placeholder)
+        return text
+
+    def redact_user_data(self, user_data):
+        """遮蔽學生姓名與帳號，並記住原值以便後續遮蔽送往 OpenAI 的提示詞"""
+        if not isinstance(user_data, dict):
+            return user_data
+        user_data = dict(user_data)
+        try:
+            names = json.loads(user_data.get("name") or "[]")
+        except json.JSONDecodeError:
+            names = [user_data["name"]]
+        with self._lock:
+            for name in names if isinstance(names, list) else [names]:
+                if name:
+                    self._sensitive[str(name)] = REDACTED_NAME
+        if user_data.get("name"):
+            user_data["name"] = json.dumps([REDACTED_NAME], ensure_ascii=False)
+        if user_data.get("userAccount"):
+            digest = hashlib.sha256(str(user_data["userAccount"]).encode("utf-8")).hexdigest()
+            user_data["userAccount"] = f"user-{digest[:8]}"
+        return user_data
+
+    @staticmethod
+    def request_key(method: str, url: str, body: str) -> str:
+        path = httpx.URL(url).raw_path.decode("ascii")
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False)
+        except (TypeError, ValueError):
+            pass
+        return hashlib.sha256(f"{method.upper()} {path}\n{body}".encode("utf-8")).hexdigest()
+
+    def record(self, kind, method, url, request_body, status, headers, body, elapsed, identity=""):
+        request_body = self.redact(request_body or "")
+        interaction = {
+            "kind": kind,
+            "key": self.request_key(method, url, request_body),
+            "identity": identity,
+            "method": method.upper(),
+            "path": httpx.URL(url).path,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS},
+            "body": self.redact(body),
+            "elapsed": elapsed,
+        }
+        if kind == "backend":
+            # 後端請求只含版面 ID，保留下來讓基準測試知道要重播哪些版面
+            interaction["request"] = request_body
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def lookup(self, method, url, request_body, identity="") -> Optional[dict]:
+        key = self.request_key(method, url, request_body or "")
+        with self._lock:
+            matches = [i for i in self.interactions if i["key"] == key]
+            if not matches:
+                return None
+            # 優先使用同一使用者錄到的回應，找不到時退回任一筆
+            matches = [i for i in matches if i.get("identity") == identity] or matches
+            key = f"{identity}:{key}"
+            # 同一請求錄到多次時依序回放，用完後循環
+            index = self._replay_index[key]
+            self._replay_index[key] = index + 1
+            return matches[index % len(matches)]
+
+    def board_ids(self):
+        ids = []
+        for interaction in self.interactions:
+            if interaction["path"].endswith("GetBoardPromptWordData") and interaction.get("request"):
+                board_id = str(json.loads(interaction["request"]).get("ID"))
+                if board_id not in ids:
+                    ids.append(board_id)
+        return ids
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as cassette_file:
+                json.dump(self.interactions, cassette_file, ensure_ascii=False, indent=1)
+        logger.info(f"已儲存 {len(self.interactions)} 筆錄製紀錄至 {self.path}")
+
+
+def _identity(headers) -> str:
+    # 以 API 密鑰的雜湊區分不同使用者，錄製檔中不保存密鑰本身
+    authorization = (headers or {}).get("Authorization", "")
+    return hashlib.sha256(authorization.encode("utf-8")).hexdigest()[:16] if authorization else ""
+
+
+class _RecordedResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self._body = body
+
+    async def json(self):
+        return json.loads(self._body)
+
+    async def text(self):
+        return self._body
+
+
+class _ResponseContext:
+    def __init__(self, coro):
+        self._coro = coro
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class RecordingSession:
+    """包裝 aiohttp.ClientSession，錄下後端呼叫（介面與 utils 中的用法相同）"""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self._session = aiohttp.ClientSession()
+
+    def get(self, url, headers=None, data=None):
+        return _ResponseContext(self._get(url, headers, data))
+
+    async def _get(self, url, headers, data):
+        start = time.perf_counter()
+        async with self._session.get(url, headers=headers, data=data) as response:
+            body = await response.text()
+            status = response.status
+        elapsed = time.perf_counter() - start
+        if status == 200 and url.endswith("GetUserStudySheetData"):
+            body = json.dumps(self.cassette.redact_user_data(json.loads(body)), ensure_ascii=False)
+        self.cassette.record(
+            "backend", "GET", url, data, status, {}, body, elapsed, identity=_identity(headers)
+        )
+        return _RecordedResponse(status, body)
+
+    async def close(self):
+        await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+        return False
+
+
+class ReplaySession:
+    """以錄製檔回放後端回應，可依倍率重現原始延遲"""
+
+    def __init__(self, cassette: Cassette, time_scale: float = REPLAY_TIME_SCALE):
+        self.cassette = cassette
+        self.time_scale = time_scale
+
+    def get(self, url, headers=None, data=None):
+        return _ResponseContext(self._get(url, headers, data))
+
+    async def _get(self, url, headers, data):
+        interaction = self.cassette.lookup("GET", url, data, identity=_identity(headers))
+        if interaction is None:
+            raise Exception(f"錄製檔中找不到對應的後端請求: {url}")
+        if self.time_scale > 0:
+            await asyncio.sleep(interaction["elapsed"] * self.time_scale)
+        return _RecordedResponse(interaction["status"], interaction["body"])
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """錄下 AsyncOpenAI 的 HTTP 請求與回應"""
+
+    def __init__(self, cassette: Cassette, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request_body = (await request.aread()).decode("utf-8")
+        start = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        elapsed = time.perf_counter() - start
+        headers = dict(response.headers)
+        self.cassette.record(
+            "openai",
+            request.method,
+            str(request.url),
+            request_body,
+            response.status_code,
+            headers,
+            content.decode("utf-8"),
+            elapsed,
+        )
+        headers = {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=content)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """以錄製檔回放 OpenAI 回應"""
+
+    def __init__(self, cassette: Cassette, time_scale: float = REPLAY_TIME_SCALE):
+        self.cassette = cassette
+        self.time_scale = time_scale
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request_body = (await request.aread()).decode("utf-8")
+        interaction = self.cassette.lookup(request.method, str(request.url), request_body)
+        if interaction is None:
+            return httpx.Response(
+                404, json={"error": {"message": "錄製檔中找不到對應的 OpenAI 請求"}}
+            )
+        if self.time_scale > 0:
+            await asyncio.sleep(interaction["elapsed"] * self.time_scale)
+        return httpx.Response(
+            interaction["status"],
+            headers=interaction["headers"],
+            content=interaction["body"].encode("utf-8"),
+        )
+
+
+def install(mode: str, cassette_path: str = CASSETTE_PATH, time_scale: float = REPLAY_TIME_SCALE):
+    """設定後端與 OpenAI 的錄製/重播，回傳 (cassette, 給 AsyncOpenAI 使用的 http_client)"""
+    cassette = Cassette(cassette_path)
+    if mode == "record":
+        utils.set_backend_session_factory(lambda: RecordingSession(cassette))
+        http_client = httpx.AsyncClient(transport=RecordingTransport(cassette), timeout=None)
+    elif mode == "replay":
+        if not cassette.interactions:
+            raise FileNotFoundError(f"找不到錄製檔或內容為空: {cassette_path}")
+        utils.set_backend_session_factory(lambda: ReplaySession(cassette, time_scale))
+        http_client = httpx.AsyncClient(
+            transport=ReplayTransport(cassette, time_scale), timeout=None
+        )
+    else:
+        raise ValueError(f"不支援的模式: {mode}")
+    logger.info(f"已啟用 {mode} 模式，錄製檔 {cassette_path}")
+    return cassette, http_client
+
+
+@functools.lru_cache(maxsize=None)
+def http_client_from_env():
+    """依環境變數啟用錄製/重播；未設定時回傳 None（使用 SDK 預設的 http client）
+
+    Streamlit 每次重跑都會執行 app.py，這裡只在第一次呼叫時安裝。
+    """
+    if not TRANSPORT_MODE:
+        return None
+    cassette, http_client = install(TRANSPORT_MODE)
+    if TRANSPORT_MODE == "record":
+        atexit.register(cassette.save)
+    return http_client
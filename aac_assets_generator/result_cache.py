@@ -0,0 +1,106 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+from aac_assets_generator.session_cache import SessionResult, result_from_json, result_to_json
+from aac_assets_generator.state_backend import StateBackend, get_state_backend
+
+RESULT_CACHE_TTL = float(os.getenv("AAC_RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("AAC_RESULT_CACHE_MAX_ENTRIES", "512"))
+# 共享狀態中保留過期結果的時間（秒），供上游異常或逾時時顯示舊版本
+RESULT_CACHE_STALE_TTL = float(os.getenv("AAC_RESULT_CACHE_STALE_TTL", "86400"))
+
+
+class ResultCache:
+    """跨 session 共用的生成結果快取（以 result_key 為鍵，具存活時間）
+
+    共享狀態（sqlite/redis）啟用時，本程序的項目作為第一層，找不到或已過期時
+    再向共享狀態查詢，其他副本生成的結果也能命中。
+    """
+
+    def __init__(
+        self,
+        ttl: float = RESULT_CACHE_TTL,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        backend: Optional[StateBackend] = None,
+        stale_ttl: float = RESULT_CACHE_STALE_TTL,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend if backend is not None and backend.shared else None
+        self.stale_ttl = max(stale_ttl, ttl)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _expired(self, entry) -> bool:
+        return time.monotonic() - entry[0] > self.ttl
+
+    def _remember(self, key: str, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_shared(self, key: str) -> Optional[tuple]:
+        try:
+            payload = self.backend.get(f"result:{key}")
+            if payload is None:
+                return None
+            data = json.loads(payload)
+            result = result_from_json(data["result"])
+        except Exception as e:
+            logger.warning(f"讀取共享的生成結果失敗: {str(e)}")
+            return None
+        # 共享狀態以牆上時間記錄，換算成本程序的 monotonic 時間
+        return time.monotonic() - (time.time() - data["stored_at"]), result
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[SessionResult]:
+        """allow_stale 時也回傳已過期的結果（上游異常時的備用內容）"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if self.backend is not None and (entry is None or self._expired(entry)):
+            shared = self._load_shared(key)
+            if shared is not None and (entry is None or shared[0] > entry[0]):
+                entry = shared
+                with self._lock:
+                    self._remember(key, entry)
+        if entry is None:
+            return None
+        if self._expired(entry) and not allow_stale:
+            # 過期的結果保留到被 LRU 淘汰，上游異常時仍可使用
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry[1]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def put(self, key: str, result: SessionResult) -> None:
+        if not self.enabled or not result.is_complete:
+            return
+        with self._lock:
+            self._remember(key, (time.monotonic(), result))
+        if self.backend is not None:
+            payload = json.dumps({"stored_at": time.time(), "result": result_to_json(result)})
+            try:
+                self.backend.set(f"result:{key}", payload, ttl=self.stale_ttl)
+            except Exception as e:
+                logger.warning(f"寫入共享的生成結果失敗: {str(e)}")
+
+
+_result_cache = ResultCache(backend=get_state_backend())
+
+
+def get_result_cache() -> ResultCache:
+    return _result_cache
@@ -0,0 +1,172 @@
+"""批次匯入學生資料並依個案特徵分組
+
+後端每個欄位是 JSON 字串（多半是清單，偶爾是數字或一般字串）。這裡把整份名單放進
+DataFrame，每個欄位只對不重複的值解析一次，再以向量化的字串運算組出 case_info。
+個案特徵相同（忽略姓名等身分欄位）的學生共用一份生成結果。
+"""
+import json
+import math
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+
+from aac_assets_generator.serialization import content_hash
+
+MISSING = "未提供"
+# (後端欄位, case_info 中的標籤)；順序即 case_info 的行序
+CASE_FIELDS = [
+    ("name", "姓名"),
+    ("gender", "性別"),
+    ("disability", "障礙類別"),
+    ("communication_Issues", "溝通問題"),
+    ("communication_Methods", "溝通方式"),
+    ("strengths", "優勢能力"),
+    ("weaknesses", "弱勢能力"),
+    ("teaching_Time", "預計教學時間"),
+]
+# 不影響教材內容的身分欄位：分組時忽略，生成時以 MISSING 代替
+IDENTITY_FIELDS = ("name",)
+
+
+def _join(values) -> str:
+    text = ", ".join(str(value).strip() for value in values if value is not None)
+    return text or MISSING
+
+
+def normalize_field(value) -> str:
+    """把後端欄位值轉成 case_info 中的文字
+
+    JSON 清單以「, 」串接；JSON 數字或字串（例如 teaching_Time 的 "40"）直接取值；
+    無法解析的內容原樣保留；空值為「未提供」。
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return MISSING
+    if isinstance(value, (list, tuple)):
+        return _join(value)
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if not isinstance(value, str):
+        return str(value)
+    value = value.strip()
+    if not value:
+        return MISSING
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return value
+    if isinstance(parsed, str):
+        return parsed.strip() or MISSING
+    return normalize_field(parsed)
+
+
+def format_case_info(fields: Dict[str, str]) -> str:
+    """case_info 的唯一格式；所有呼叫端共用，快取鍵才會一致"""
+    lines = "".join(f"\n    {label}: {fields[field]}" for field, label in CASE_FIELDS[:-1])
+    return f"{lines}\n    預計教學時間: {fields['teaching_Time']} 分鐘\n    "
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _normalize_column(column: pd.Series) -> np.ndarray:
+    """每個不重複的值只解析一次，再以索引展開回整欄"""
+    try:
+        codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    except TypeError:
+        # 直接傳入 dict 時欄位可能是 list（不可雜湊）
+        codes, uniques = pd.factorize(column.map(_hashable), use_na_sentinel=True)
+    normalized = np.array([normalize_field(value) for value in uniques] + [MISSING], dtype=object)
+    # 缺值的 code 為 -1，對應到最後一個元素 MISSING
+    return normalized[codes]
+
+
+def _hash_column(column: pd.Series) -> np.ndarray:
+    codes, uniques = pd.factorize(column)
+    return np.array([content_hash(value) for value in uniques], dtype=object)[codes]
+
+
+def _case_info_column(frame: pd.DataFrame, anonymous: bool = False) -> pd.Series:
+    # 與 format_case_info 相同的格式，以整欄字串串接組成
+    text = pd.Series("", index=frame.index, dtype=object)
+    for field, label in CASE_FIELDS[:-1]:
+        value = MISSING if anonymous and field in IDENTITY_FIELDS else frame[field]
+        text = text + f"\n    {label}: " + value
+    return text + "\n    預計教學時間: " + frame["teaching_Time"] + " 分鐘\n    "
+
+
+class Roster:
+    """正規化後的學生名單
+
+    frame 每列一位學生，包含正規化後的 CASE_FIELDS、userAccount，以及：
+    case_info（完整個案資料）、generation_info（去除身分欄位，實際送去生成的內容）、
+    case_key（case_info 的雜湊）、profile_key（generation_info 的雜湊，用於分組）。
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+
+    @classmethod
+    def from_frame(cls, raw: pd.DataFrame, drop_duplicates: bool = True) -> "Roster":
+        frame = pd.DataFrame(index=raw.index)
+        for field, _ in CASE_FIELDS:
+            if field in raw:
+                frame[field] = _normalize_column(raw[field])
+            else:
+                frame[field] = MISSING
+        account = raw["userAccount"] if "userAccount" in raw else pd.Series(None, index=raw.index)
+        frame["userAccount"] = account.astype(object).where(account.notna(), None)
+        frame["case_info"] = _case_info_column(frame)
+        frame["generation_info"] = _case_info_column(frame, anonymous=True)
+        frame["case_key"] = _hash_column(frame["case_info"])
+        frame["profile_key"] = _hash_column(frame["generation_info"])
+        if drop_duplicates:
+            # 同一位學生重複出現（帳號與個案資料都相同）只保留一筆
+            frame = frame.drop_duplicates(subset=["userAccount", "case_key"])
+        return cls(frame.reset_index(drop=True))
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict], drop_duplicates: bool = True) -> "Roster":
+        return cls.from_frame(pd.DataFrame.from_records(list(records)), drop_duplicates)
+
+    @classmethod
+    def from_file(cls, path: str, drop_duplicates: bool = True) -> "Roster":
+        """讀取 CSV、JSON（物件陣列）或 JSON Lines"""
+        if path.endswith(".csv"):
+            # 所有欄位以字串讀入，避免 "40" 之類的值被轉成數字
+            raw = pd.read_csv(path, dtype=str)
+        else:
+            raw = pd.read_json(
+                path, lines=path.endswith(".jsonl"), dtype=False, convert_dates=False
+            )
+        return cls.from_frame(raw, drop_duplicates)
+
+    @classmethod
+    def load(cls, source: Union[str, pd.DataFrame, Iterable[dict]]) -> "Roster":
+        if isinstance(source, str):
+            return cls.from_file(source)
+        if isinstance(source, pd.DataFrame):
+            return cls.from_frame(source)
+        return cls.from_records(source)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def groups(self) -> Dict[str, List[int]]:
+        """profile_key -> 該特徵的學生列號"""
+        return {
+            key: list(positions)
+            for key, positions in self.frame.groupby("profile_key", sort=False).indices.items()
+        }
+
+    def generation_info(self, profile_key: str) -> str:
+        rows = self.frame.loc[self.frame["profile_key"] == profile_key, "generation_info"]
+        return rows.iloc[0]
+
+    def metrics(self) -> dict:
+        return {
+            "students": len(self.frame),
+            "unique_cases": int(self.frame["case_key"].nunique()),
+            "unique_profiles": int(self.frame["profile_key"].nunique()),
+        }
@@ -0,0 +1,311 @@
+import functools
+import json
+import re
+import typing
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import pydantic
+from loguru import logger
+from openai import ContentFilterFinishReasonError, LengthFinishReasonError
+from pydantic import BaseModel
+
+from aac_assets_generator.circuit_breaker import OPENAI, get_breaker
+from aac_assets_generator.effort_controller import effort_kwargs, get_effort_controller
+from aac_assets_generator.metrics import token_stats
+from aac_assets_generator.serialization import model_to_json
+from aac_assets_generator.structured_output import STRUCTURED_FAST_PATH, create_structured
+
+# 修復時最多往回裁掉幾段不完整的內容
+_MAX_TRIM_ATTEMPTS = 50
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class SalvageFailed(Exception):
+    """結構化輸出無法在本機修復，也無法以補件呼叫補齊"""
+
+
+def _close_json(text: str) -> str:
+    """補上截斷 JSON 未關閉的字串、陣列與物件"""
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append("]" if char == "[" else "}")
+        elif char in "]}" and stack:
+            stack.pop()
+    if in_string:
+        text = (text[:-1] if escaped else text) + '"'
+    text = re.sub(r"[,:\s]+$", "", text)
+    if stack and stack[-1] == "}":
+        # 物件最後只剩鍵名（還沒有值）時一併移除
+        text = re.sub(r'([{,])\s*"[^"]*"$', r"\1", text).rstrip(",")
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: Optional[str]) -> Optional[Any]:
+    """盡量把模型輸出修成可解析的 JSON：去除 code fence、關閉截斷處，必要時往回裁掉殘缺的尾端"""
+    if not text:
+        return None
+    text = _CODE_FENCE.sub("", text.strip())
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    candidate = text
+    for _ in range(_MAX_TRIM_ATTEMPTS):
+        try:
+            return json.loads(_close_json(candidate))
+        except json.JSONDecodeError:
+            pass
+        # 裁到上一個逗號或開括號之前，丟掉最後一個不完整的元素
+        cut = max(candidate.rfind(","), candidate.rfind("["), candidate.rfind("{"))
+        if cut <= 0:
+            return None
+        candidate = candidate[: cut + 1] if candidate[cut] in "[{" else candidate[:cut]
+    return None
+
+
+def _field_types(model_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """pydantic v1/v2 相容的欄位型別"""
+    if hasattr(model_cls, "model_fields"):
+        return {name: field.annotation for name, field in model_cls.model_fields.items()}
+    return {name: field.outer_type_ for name, field in model_cls.__fields__.items()}
+
+
+def _is_model(annotation) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _coerce(value, annotation):
+    origin = typing.get_origin(annotation)
+    if origin in (list, List):
+        (item_type,) = typing.get_args(annotation) or (Any,)
+        if value is None:
+            return value
+        if not isinstance(value, list):
+            value = [value]
+        return [_coerce(item, item_type) for item in value]
+    if _is_model(annotation):
+        fields = _field_types(annotation)
+        if isinstance(value, str) and len(fields) == 1:
+            # 模型把 {"question": "..."} 簡化成字串時包回去
+            return {next(iter(fields)): value}
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        if isinstance(value, dict):
+            return {
+                name: _coerce(value[name], fields[name]) if name in fields else value[name]
+                for name in value
+            }
+        return value
+    if annotation is str:
+        if isinstance(value, list):
+            return "\n".join(str(item) for item in value)
+        if isinstance(value, (int, float, bool)):
+            return str(value)
+        if isinstance(value, dict) and len(value) == 1:
+            return str(next(iter(value.values())))
+    return value
+
+
+def _validate(model_cls: Type[BaseModel], data):
+    if hasattr(model_cls, "model_validate"):
+        return model_cls.model_validate(data)
+    return model_cls.parse_obj(data)
+
+
+def _drop_invalid_items(data, errors) -> bool:
+    """截斷時最後一個清單元素常不完整；若同一清單還有其他元素，丟掉錯誤的元素"""
+    dropped = False
+    for loc in sorted({tuple(e["loc"]) for e in errors}, reverse=True):
+        for depth in range(len(loc) - 1, 0, -1):
+            if not isinstance(loc[depth], int):
+                continue
+            container = data
+            try:
+                for part in loc[:depth]:
+                    container = container[part]
+            except (KeyError, IndexError, TypeError):
+                break
+            if isinstance(container, list) and len(container) > 1 and loc[depth] < len(container):
+                del container[loc[depth]]
+                dropped = True
+            break
+    return dropped
+
+
+def _section_type(model_cls, path):
+    annotation = model_cls
+    for part in path:
+        annotation = _field_types(annotation)[part]
+    return annotation
+
+
+def _missing_sections(data, errors, model_cls) -> List[Tuple[str, ...]]:
+    """把驗證錯誤歸納成需要重新請求的子物件路徑（最多兩層，例如 worksheet.activity_guides）"""
+    sections = []
+    for error in errors:
+        path = []
+        annotation = model_cls
+        for part in error["loc"]:
+            if isinstance(part, int) or not _is_model(annotation):
+                break
+            path.append(part)
+            annotation = _field_types(annotation).get(part)
+            if len(path) == 2:
+                break
+        if path and tuple(path) not in sections:
+            sections.append(tuple(path))
+    # 同一子物件的欄位全部缺漏時，直接請求整個子物件
+    for parent in {s[:-1] for s in sections if len(s) > 1}:
+        children = [s for s in sections if s[:-1] == parent]
+        if len(children) == len(_field_types(_section_type(model_cls, parent))):
+            sections = [s for s in sections if s not in children] + [parent]
+    # 父層缺漏時不需要再個別請求子層
+    return [s for s in sections if not any(s[: len(o)] == o and s != o for o in sections)]
+
+
+def salvage_locally(content: Optional[str], model_cls: Type[BaseModel]):
+    """回傳 (模型或 None, 修復後的資料, 仍缺少的子物件路徑)"""
+    data = repair_json(content)
+    if not isinstance(data, dict):
+        return None, {}, [()]
+    data = _coerce(data, model_cls)
+    for _ in range(5):
+        try:
+            return _validate(model_cls, data), data, []
+        except pydantic.ValidationError as e:
+            errors = e.errors()
+            if not _drop_invalid_items(data, errors):
+                return None, data, _missing_sections(data, errors, model_cls)
+    return None, data, [()]
+
+
+@functools.lru_cache(maxsize=64)
+def _patch_model(model_cls: Type[BaseModel], sections: Tuple[Tuple[str, ...], ...]):
+    # 相同的缺漏組合共用同一個模型，strict schema 的快取才不會每次重建
+    fields = {"__".join(path): (_section_type(model_cls, path), ...) for path in sections}
+    return pydantic.create_model(f"{model_cls.__name__}Patch", **fields)
+
+
+async def request_missing_sections(client, model, messages, model_cls, data, sections):
+    """只請模型補上缺少的子物件，一次呼叫完成"""
+    patch_model = _patch_model(model_cls, tuple(sections))
+    partial = json.dumps(data, ensure_ascii=False)
+    names = "、".join(".".join(path) for path in sections)
+    # 補件內容很短，推理強度同樣依剩餘時間與負載決定（基準為 low）
+    reasoning_effort = get_effort_controller().choose("salvage", model)
+    patch, failure, _, _ = await _call_structured(
+        client,
+        model,
+        messages
+        + [
+            {"role": "assistant", "content": partial},
+            {
+                "role": "user",
+                "content": f"上面的 JSON 不完整。只需依原本的要求補上這些欄位：{names}。",
+            },
+        ],
+        patch_model,
+        **effort_kwargs(reasoning_effort),
+    )
+    if patch is None:
+        raise SalvageFailed(f"補件呼叫未回傳內容: {failure}")
+    patch_data = json.loads(model_to_json(patch))
+    for path in sections:
+        target = data
+        for part in path[:-1]:
+            target = target.setdefault(part, {})
+        target[path[-1]] = patch_data["__".join(path)]
+    return _validate(model_cls, data)
+
+
+def _record_usage(response_format: Type[BaseModel], payload: dict, reasoning_effort=None):
+    usage = payload.get("usage") or {}
+    if usage.get("completion_tokens") is not None:
+        token_stats.record(response_format.__name__, usage["completion_tokens"])
+    if usage.get("prompt_tokens") is not None:
+        token_stats.record(f"{response_format.__name__}:prompt", usage["prompt_tokens"])
+    # 推理 token 依推理強度分開記錄，方便比較延遲與品質的取捨
+    reasoning_tokens = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+    if reasoning_tokens is not None:
+        effort = reasoning_effort or "default"
+        token_stats.record(f"{response_format.__name__}:reasoning:{effort}", reasoning_tokens)
+
+
+def _raw_content(raw_response) -> Tuple[Optional[str], Optional[str]]:
+    payload = raw_response.http_response.json()
+    choice = (payload.get("choices") or [{}])[0]
+    message = choice.get("message") or {}
+    return message.get("content"), message.get("refusal")
+
+
+async def _parse_with_sdk(client, model, messages, response_format, **kwargs):
+    """回傳 (模型或 None, 失敗原因, 原始內容, refusal)"""
+    raw_response = await client.beta.chat.completions.with_raw_response.parse(
+        model=model, messages=messages, response_format=response_format, **kwargs
+    )
+    _record_usage(
+        response_format, raw_response.http_response.json(), kwargs.get("reasoning_effort")
+    )
+    try:
+        completion = raw_response.parse()
+        message = completion.choices[0].message
+        if message.parsed is not None:
+            logger.info(f"response:{completion.id} finish={completion.choices[0].finish_reason}")
+            return message.parsed, None, None, None
+        failure = f"模型拒絕回應: {message.refusal}"
+    except ContentFilterFinishReasonError as e:
+        # 被過濾的輸出不送去修復
+        return None, f"{type(e).__name__}: {str(e)[:200]}", None, None
+    except (LengthFinishReasonError, pydantic.ValidationError, ValueError) as e:
+        failure = f"{type(e).__name__}: {str(e)[:200]}"
+    content, refusal = _raw_content(raw_response)
+    return None, failure, content, refusal
+
+
+async def _call_structured(client, model, messages, response_format, **kwargs):
+    """所有 structured output 呼叫的共同入口：經過斷路器並記錄 token 用量
+
+    回傳 (模型或 None, 失敗原因, 可修復的原始內容, refusal)。
+    """
+    # 斷路器只看呼叫本身是否成功；輸出格式錯誤由呼叫端的修復流程處理
+    async with get_breaker(OPENAI).guard():
+        if not STRUCTURED_FAST_PATH:
+            return await _parse_with_sdk(client, model, messages, response_format, **kwargs)
+        result = await create_structured(client, model, messages, response_format, **kwargs)
+    _record_usage(response_format, result.payload, kwargs.get("reasoning_effort"))
+    # 被內容過濾器中斷的輸出與 SDK 路徑相同，不送去修復
+    content = None if result.finish_reason == "content_filter" else result.content
+    return result.parsed, result.failure, content, result.refusal
+
+
+async def parse_with_salvage(client, model, messages, response_format, **kwargs):
+    """呼叫 structured output；解析失敗或被截斷時保留原始內容在本機修復，必要時只補缺少的部分"""
+    parsed, failure, content, refusal = await _call_structured(
+        client, model, messages, response_format, **kwargs
+    )
+    if parsed is not None:
+        return parsed
+    if content is None:
+        raise SalvageFailed(f"沒有可修復的內容（{refusal or failure}）")
+    logger.warning(f"結構化輸出解析失敗，嘗試本機修復（{failure}）")
+    parsed, data, sections = salvage_locally(content, response_format)
+    if parsed is not None:
+        logger.info("已在本機修復結構化輸出")
+        return parsed
+    if sections == [()]:
+        raise SalvageFailed(f"無法修復模型輸出（{failure}）")
+    logger.info(f"本機修復後仍缺少 {sections}，發出補件呼叫")
+    return await request_missing_sections(
+        client, model, messages, response_format, data, sections
+    )
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+from loguru import logger
+
+LLM_MAX_CONCURRENCY = int(os.getenv("AAC_LLM_MAX_CONCURRENCY", "8"))
+LLM_PER_USER_LIMIT = int(os.getenv("AAC_LLM_PER_USER_LIMIT", "2"))
+# 批次工作（例如整份名單）每位使用者可同時執行的數量；仍受保留名額與公平排隊限制
+LLM_BATCH_PER_USER_LIMIT = int(os.getenv("AAC_LLM_BATCH_PER_USER_LIMIT", "4"))
+# 保留給互動請求的名額，預取與批次工作不能佔用
+LLM_INTERACTIVE_RESERVE = int(os.getenv("AAC_LLM_INTERACTIVE_RESERVE", "2"))
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    PREFETCH = 1
+    BATCH = 2
+
+
+class _Waiter:
+    __slots__ = ("user", "priority", "loop", "future", "enqueued_at", "granted")
+
+    def __init__(self, user, priority, loop):
+        self.user = user
+        self.priority = priority
+        self.loop = loop
+        self.future = loop.create_future()
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class FairScheduler:
+    """LLM 呼叫的排程器：優先權分級、使用者間加權公平排隊、每位使用者的並行上限
+
+    可跨執行緒與 event loop 使用（Streamlit 每個 session 各自 asyncio.run）。
+    """
+
+    def __init__(
+        self,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        per_user_limit=LLM_PER_USER_LIMIT,
+        interactive_reserve=LLM_INTERACTIVE_RESERVE,
+        batch_per_user_limit=LLM_BATCH_PER_USER_LIMIT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_user_limit = per_user_limit
+        self.batch_per_user_limit = max(batch_per_user_limit, per_user_limit)
+        self.interactive_reserve = min(interactive_reserve, max_concurrency - 1)
+        self._lock = threading.Lock()
+        self._queues = {priority: defaultdict(deque) for priority in Priority}
+        self._running_by_user = defaultdict(int)
+        self._running_by_priority = defaultdict(int)
+        self._running_total = 0
+        self._weights = {}
+        self._virtual_finish = defaultdict(float)
+        self._virtual_now = 0.0
+        self._waits = {priority: deque(maxlen=500) for priority in Priority}
+
+    def set_weight(self, user, weight: float):
+        """權重越高，排隊時分到的份額越多（例如付費學校）"""
+        with self._lock:
+            self._weights[user] = max(weight, 0.01)
+
+    @asynccontextmanager
+    async def slot(self, user, priority=Priority.INTERACTIVE):
+        waiter = await self._acquire(user or "anonymous", Priority(priority))
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._release_locked(waiter)
+
+    async def _acquire(self, user, priority):
+        waiter = _Waiter(user, priority, asyncio.get_running_loop())
+        with self._lock:
+            self._queues[priority][user].append(waiter)
+            self._dispatch_locked()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_locked(waiter)
+                else:
+                    self._queues[priority][user].remove(waiter)
+            raise
+        waited = time.monotonic() - waiter.enqueued_at
+        if waited > 1.0:
+            logger.info(
+                f"LLM 排程等待 {waited:.1f} 秒（{priority.name.lower()}，使用者 {user}），"
+                f"目前排隊 {self.queue_depth()} 筆"
+            )
+        return waiter
+
+    def _release_locked(self, waiter):
+        self._running_total -= 1
+        self._running_by_user[waiter.user] -= 1
+        self._running_by_priority[waiter.priority] -= 1
+        self._dispatch_locked()
+
+    def _next_waiter_locked(self):
+        for priority in Priority:
+            if (
+                priority != Priority.INTERACTIVE
+                and self._running_total >= self.max_concurrency - self.interactive_reserve
+            ):
+                return None
+            limit = self.batch_per_user_limit if priority == Priority.BATCH else self.per_user_limit
+            candidates = [
+                user
+                for user, waiters in self._queues[priority].items()
+                if waiters and self._running_by_user[user] < limit
+            ]
+            if not candidates:
+                continue
+            # 加權公平排隊：選虛擬完成時間最早的使用者
+            user = min(
+                candidates, key=lambda u: max(self._virtual_finish[u], self._virtual_now)
+            )
+            start = max(self._virtual_finish[user], self._virtual_now)
+            self._virtual_now = start
+            self._virtual_finish[user] = start + 1.0 / self._weights.get(user, 1.0)
+            waiters = self._queues[priority][user]
+            waiter = waiters.popleft()
+            if not waiters:
+                del self._queues[priority][user]
+            return waiter
+        return None
+
+    def _dispatch_locked(self):
+        while self._running_total < self.max_concurrency:
+            waiter = self._next_waiter_locked()
+            if waiter is None:
+                return
+            waiter.granted = True
+            self._running_total += 1
+            self._running_by_user[waiter.user] += 1
+            self._running_by_priority[waiter.priority] += 1
+            self._waits[waiter.priority].append(time.monotonic() - waiter.enqueued_at)
+            try:
+                waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+            except RuntimeError:
+                # 等待者所在的 event loop 已關閉，名額直接歸還
+                logger.warning("排程等待者的 event loop 已關閉，釋放名額")
+                self._running_total -= 1
+                self._running_by_user[waiter.user] -= 1
+                self._running_by_priority[waiter.priority] -= 1
+
+    def queue_depth(self, priority=None) -> int:
+        with self._lock:
+            priorities = Priority if priority is None else [Priority(priority)]
+            return sum(
+                len(waiters)
+                for p in priorities
+                for waiters in self._queues[p].values()
+            )
+
+    def metrics(self) -> dict:
+        """各優先權的排隊深度、執行數與等待時間百分位數（秒）"""
+        with self._lock:
+            result = {"running_total": self._running_total, "classes": {}}
+            for priority in Priority:
+                waits = sorted(self._waits[priority])
+                result["classes"][priority.name.lower()] = {
+                    "queued": sum(len(w) for w in self._queues[priority].values()),
+                    "running": self._running_by_priority[priority],
+                    "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                    "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                }
+            result["running_by_user"] = {
+                user: count for user, count in self._running_by_user.items() if count
+            }
+            return result
+
+
+_scheduler = FairScheduler()
+
+
+def get_scheduler() -> FairScheduler:
+    return _scheduler
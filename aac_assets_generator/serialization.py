@@ -0,0 +1,31 @@
+import hashlib
+from typing import Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def model_to_json(model: BaseModel) -> str:
+    """pydantic v1/v2 相容的 JSON 序列化"""
+    if hasattr(model, "model_dump_json"):
+        return model.model_dump_json()
+    return model.json(ensure_ascii=False)
+
+
+def model_from_json(model_cls: Type[ModelT], data) -> ModelT:
+    """pydantic v1/v2 相容的 JSON 反序列化"""
+    if hasattr(model_cls, "model_validate_json"):
+        return model_cls.model_validate_json(data)
+    return model_cls.parse_raw(data)
+
+
+def content_hash(*parts: Optional[object]) -> str:
+    """以模型 JSON 或字串內容計算穩定的雜湊值"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, BaseModel):
+            part = model_to_json(part)
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
@@ -0,0 +1,77 @@
+"""執行中服務的即時指標
+
+定期把各項 gauge 摘要寫入 log；管理者也可以用 ?admin=<token> 在頁面上查看完整內容。
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+from aac_assets_generator.memory_governor import get_artifact_store
+from aac_assets_generator.scheduler import get_scheduler
+
+# 寫入 log 的間隔（秒），0 為不寫
+METRICS_LOG_INTERVAL = float(os.getenv("AAC_METRICS_LOG_INTERVAL", "60"))
+
+_logger_thread: Optional[threading.Thread] = None
+_logger_lock = threading.Lock()
+
+
+def service_metrics() -> dict:
+    return {"scheduler": get_scheduler().metrics(), "artifacts": get_artifact_store().metrics()}
+
+
+def summary_line(metrics: dict) -> str:
+    scheduler = metrics["scheduler"]
+    classes = scheduler["classes"]
+    queued = " ".join(f"{name}={c['queued']}" for name, c in classes.items())
+    waits = " ".join(f"{name}={c['wait_p95']:.1f}s" for name, c in classes.items())
+    line = f"LLM 排程：執行中 {scheduler['running_total']}，排隊 {queued}，等待 p95 {waits}"
+    artifacts = metrics.get("artifacts")
+    if artifacts is not None:
+        line += (
+            f"；檔案記憶體 {artifacts['resident_artifact_bytes'] / 1024 / 1024:.1f}"
+            f"/{artifacts['memory_cap_bytes'] / 1024 / 1024:.0f} MB"
+            f"（{artifacts['resident_artifacts']} 個，session {artifacts['sessions']}，"
+            f"閒置 {artifacts['idle_sessions']}，累計釋放 {artifacts['spilled_total']}、"
+            f"磁碟讀回 {artifacts['disk_reads_total']}）"
+        )
+    return line
+
+
+def _idle(metrics: dict) -> bool:
+    scheduler = metrics["scheduler"]
+    return not scheduler["running_total"] and not any(
+        c["queued"] for c in scheduler["classes"].values()
+    )
+
+
+def _log_forever(interval: float):
+    last_line = None
+    while True:
+        time.sleep(interval)
+        try:
+            metrics = service_metrics()
+            line = summary_line(metrics)
+            # 閒置且與上次相同時不重複寫入
+            if not (_idle(metrics) and line == last_line):
+                logger.info(line)
+                last_line = line
+        except Exception as e:
+            logger.warning(f"收集服務指標時發生錯誤: {str(e)}")
+
+
+def start_metrics_logger(interval: float = METRICS_LOG_INTERVAL):
+    """每個程序只啟動一次；Streamlit 每次重跑都呼叫也不會重複"""
+    global _logger_thread
+    if interval <= 0:
+        return
+    with _logger_lock:
+        if _logger_thread is not None and _logger_thread.is_alive():
+            return
+        _logger_thread = threading.Thread(
+            target=_log_forever, args=(interval,), name="aac-metrics-logger", daemon=True
+        )
+        _logger_thread.start()
@@ -0,0 +1,153 @@
+import dataclasses
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import streamlit as st
+
+from aac_assets_generator.learning_asset_models import LearningAsset
+from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+from aac_assets_generator.memory_governor import current_session_id, get_artifact_store
+from aac_assets_generator.serialization import content_hash, model_from_json, model_to_json
+
+SESSION_CACHE_KEY = "aac_result_cache"
+
+
+def result_key(api_key: str, board_id: str) -> str:
+    """同一使用者、同一版面的結果共用一個快取鍵（不直接保存 API 密鑰）"""
+    return content_hash(api_key, board_id)
+
+
+@dataclass
+class SessionResult:
+    learning_asset: Optional[LearningAsset]
+    learning_evaluate: Optional[EvaluationAssetTable]
+    main_title: Optional[str]
+    sub_title: Optional[str]
+    case_info: Optional[str]
+    # PDF/DOCX 本體放在 ArtifactStore，這裡只保存 handle
+    pdf_handle: Optional[str] = None
+    docx_handle: Optional[str] = None
+    content_hash: str = ""
+    object_bytes: int = 0
+    # 生成完成的時間（time.time()），顯示舊結果時標示用
+    generated_at: float = 0.0
+    # 時限內來不及生成新版本時顯示的舊結果（只標在 session 自己的複本上）
+    stale: bool = False
+
+    def __post_init__(self):
+        if not self.generated_at:
+            self.generated_at = time.time()
+        if not self.content_hash:
+            self.content_hash = content_hash(
+                self.learning_asset,
+                self.learning_evaluate,
+                self.main_title,
+                self.sub_title,
+                self.case_info,
+            )
+        if not self.object_bytes:
+            # 估計結果物件在記憶體中的大小（以 JSON 長度近似）
+            self.object_bytes = sum(
+                len(model_to_json(part).encode("utf-8"))
+                for part in (self.learning_asset, self.learning_evaluate)
+                if part is not None
+            ) + len((self.case_info or "").encode("utf-8"))
+
+    @property
+    def pdf_bytes(self) -> Optional[bytes]:
+        return get_artifact_store().get(self.pdf_handle)
+
+    @pdf_bytes.setter
+    def pdf_bytes(self, data: bytes):
+        self.pdf_handle = get_artifact_store().put(data)
+
+    @property
+    def docx_bytes(self) -> Optional[bytes]:
+        return get_artifact_store().get(self.docx_handle)
+
+    @docx_bytes.setter
+    def docx_bytes(self, data: bytes):
+        self.docx_handle = get_artifact_store().put(data)
+
+    @property
+    def has_artifacts(self) -> bool:
+        store = get_artifact_store()
+        return store.contains(self.pdf_handle) and store.contains(self.docx_handle)
+
+    @property
+    def is_complete(self) -> bool:
+        return (
+            isinstance(self.learning_asset, LearningAsset)
+            and isinstance(self.learning_evaluate, EvaluationAssetTable)
+            and isinstance(self.main_title, str)
+            and isinstance(self.sub_title, str)
+        )
+
+
+_MODEL_FIELDS = {"learning_asset": LearningAsset, "learning_evaluate": EvaluationAssetTable}
+
+
+def result_to_json(result: SessionResult) -> str:
+    """存入共享狀態用；PDF/DOCX 只保存 handle，stale 只屬於 session 自己的複本"""
+    data = {
+        field.name: getattr(result, field.name)
+        for field in dataclasses.fields(result)
+        if field.name != "stale"
+    }
+    for name in _MODEL_FIELDS:
+        if data[name] is not None:
+            data[name] = model_to_json(data[name])
+    return json.dumps(data, ensure_ascii=False)
+
+
+def result_from_json(payload) -> SessionResult:
+    data = json.loads(payload)
+    for name, model_cls in _MODEL_FIELDS.items():
+        if data.get(name) is not None:
+            data[name] = model_from_json(model_cls, data[name])
+    return SessionResult(**data)
+
+
+class SessionResultCache:
+    """每個 Streamlit session 的結果快取，取代零散的 session_state 旗標"""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, SessionResult]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[SessionResult]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, result: SessionResult) -> SessionResult:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def __len__(self):
+        return len(self._entries)
+
+    def handles(self):
+        for result in self._entries.values():
+            yield result.pdf_handle
+            yield result.docx_handle
+
+    @property
+    def object_bytes(self) -> int:
+        return sum(result.object_bytes for result in self._entries.values())
+
+
+def get_session_cache() -> SessionResultCache:
+    if SESSION_CACHE_KEY not in st.session_state:
+        st.session_state[SESSION_CACHE_KEY] = SessionResultCache()
+    cache = st.session_state[SESSION_CACHE_KEY]
+    # 每次重跑都回報此 session 仍在使用，閒置 session 的檔案會先被移出記憶體
+    get_artifact_store().touch_session(current_session_id(), cache.handles(), cache.object_bytes)
+    return cache
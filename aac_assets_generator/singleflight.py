@@ -0,0 +1,277 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Type
+
+from loguru import logger
+from pydantic import BaseModel
+
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.serialization import content_hash, model_from_json, model_to_json
+from aac_assets_generator.state_backend import (
+    REPLICA_ID,
+    RedisStateBackend,
+    StateBackend,
+    get_state_backend,
+)
+
+# 設定後，多個副本之間也會合併相同的生成請求（未設定時使用共享狀態 AAC_STATE_BACKEND）
+SINGLEFLIGHT_REDIS_URL = os.getenv("AAC_SINGLEFLIGHT_REDIS_URL", "")
+# 領頭者的租約長度，需涵蓋一次 o3 呼叫的最長時間
+SINGLEFLIGHT_LEASE_SECONDS = float(os.getenv("AAC_SINGLEFLIGHT_LEASE_SECONDS", "600"))
+# 結果在共享儲存區保留的時間，只需讓等待中的副本取到即可
+SINGLEFLIGHT_RESULT_TTL = float(os.getenv("AAC_SINGLEFLIGHT_RESULT_TTL", "120"))
+SINGLEFLIGHT_POLL_INTERVAL = 1.0
+
+
+def flight_key(model: str, response_format: Type[BaseModel], full_prompt: str) -> str:
+    return content_hash(model, response_format.__name__, full_prompt)
+
+
+class FlightStore:
+    """跨副本 single-flight 的共享儲存介面（租約 + 短暫保存結果）"""
+
+    def try_acquire(self, key: str, ttl: float) -> Optional[str]:
+        """取得租約時回傳持有者 token，租約被其他人持有時回傳 None"""
+        raise NotImplementedError
+
+    def release(self, key: str, token: str):
+        """只在租約仍由 token 持有時釋放"""
+        raise NotImplementedError
+
+    def publish(self, key: str, payload: str, ttl: float):
+        raise NotImplementedError
+
+    def result(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+
+class StateFlightStore(FlightStore):
+    """以共享狀態（sqlite/redis）實作租約與結果"""
+
+    def __init__(self, backend: StateBackend, prefix: str = "flight:"):
+        self.backend = backend
+        self.prefix = prefix
+
+    def try_acquire(self, key, ttl):
+        token = f"{REPLICA_ID}:{uuid.uuid4().hex}"
+        acquired = self.backend.set(f"{self.prefix}lease:{key}", token, ttl=ttl, nx=True)
+        return token if acquired else None
+
+    def release(self, key, token):
+        # 租約過期後可能已被其他副本取得，不能刪掉別人的租約
+        if not self.backend.delete_if(f"{self.prefix}lease:{key}", token):
+            logger.warning(f"single-flight 租約已過期或改由其他副本持有 {key[:12]}")
+
+    def publish(self, key, payload, ttl):
+        self.backend.set(f"{self.prefix}result:{key}", payload, ttl=ttl)
+
+    def result(self, key):
+        value = self.backend.get(f"{self.prefix}result:{key}")
+        return value.decode("utf-8") if value is not None else None
+
+
+class _FlightAborted(Exception):
+    """領頭的工作被取消（所有等待者都離開或 event loop 關閉），仍在等待者需重試"""
+
+
+class _Flight:
+    def __init__(self, priority: Priority):
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.priority = priority
+        self.waiters = 0
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        # 被較高優先權的請求取代；實際呼叫取消後，等待者改加入新的領頭者
+        self.superseded = False
+
+
+def _copy_outcome(source: concurrent.futures.Future, target: asyncio.Future):
+    if target.done():
+        return
+    if source.cancelled():
+        target.set_exception(_FlightAborted())
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+def _notify(loop: asyncio.AbstractEventLoop, waiter: asyncio.Future):
+    def callback(source):
+        try:
+            loop.call_soon_threadsafe(_copy_outcome, source, waiter)
+        except RuntimeError:
+            # 等待者所在的 event loop 已關閉
+            pass
+
+    return callback
+
+
+class SingleFlight:
+    """相同 key 的並行呼叫只執行一次，其餘等待同一個結果
+
+    可跨執行緒與 event loop 使用。每個等待者各自取消，不影響其他人；
+    所有等待者都離開後才取消實際的呼叫。錯誤會傳給當下所有等待者，但不保留。
+    進行中的是預取或批次呼叫時，互動請求不加入它（會排在保留名額之後、使用較低的
+    推理強度），而是自行領頭並取消原本的呼叫，原本的等待者改等互動請求的結果。
+    """
+
+    def __init__(self, store: Optional[FlightStore] = None):
+        self.store = store
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "leaders": 0,
+            "coalesced": 0,
+            "remote_coalesced": 0,
+            "aborted": 0,
+            "promoted": 0,
+        }
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable],
+        model_cls: Optional[Type[BaseModel]] = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ):
+        loop = asyncio.get_running_loop()
+        while True:
+            superseded = None
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is not None and priority < flight.priority:
+                    superseded = flight
+                    superseded.superseded = True
+                    self._stats["promoted"] += 1
+                    flight = None
+                is_leader = flight is None
+                if is_leader:
+                    flight = self._flights[key] = _Flight(priority)
+                    flight.loop = loop
+                    self._stats["leaders"] += 1
+                else:
+                    self._stats["coalesced"] += 1
+                flight.waiters += 1
+            if superseded is not None:
+                logger.info(f"以較高優先權重新生成 {key[:12]}，取消進行中的背景呼叫")
+                self._cancel(superseded)
+            if is_leader:
+                # 實際呼叫是獨立的 task，領頭者被取消時不會連帶中斷其他等待者
+                task = loop.create_task(self._lead(key, flight, fn, model_cls))
+                with self._lock:
+                    flight.task = task
+                    cancel = flight.superseded
+                if cancel:
+                    # 建立 task 前已被取代
+                    task.cancel()
+            else:
+                logger.info(f"相同的生成請求進行中，合併等待 {key[:12]}")
+
+            waiter = loop.create_future()
+            flight.future.add_done_callback(_notify(loop, waiter))
+            try:
+                return await waiter
+            except _FlightAborted:
+                with self._lock:
+                    self._stats["aborted"] += 1
+                continue
+            finally:
+                self._leave(flight)
+
+    def _leave(self, flight: _Flight):
+        with self._lock:
+            flight.waiters -= 1
+            abandoned = flight.waiters == 0 and not flight.future.done()
+        if abandoned:
+            # 所有等待者都已離開（取消），才中斷實際的 LLM 呼叫
+            self._cancel(flight)
+
+    def _cancel(self, flight: _Flight):
+        with self._lock:
+            task = flight.task
+        if task is None:
+            return
+        try:
+            flight.loop.call_soon_threadsafe(task.cancel)
+        except RuntimeError:
+            pass
+
+    async def _lead(self, key, flight: _Flight, fn, model_cls):
+        try:
+            result = await self._run(key, fn, model_cls)
+        except asyncio.CancelledError:
+            flight.future.cancel()
+            raise
+        except Exception as e:
+            flight.future.set_exception(e)
+        else:
+            flight.future.set_result(result)
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def _run(self, key, fn, model_cls):
+        if self.store is None or model_cls is None:
+            return await fn()
+
+        deadline = time.monotonic() + SINGLEFLIGHT_LEASE_SECONDS
+        while True:
+            token = await asyncio.to_thread(
+                self.store.try_acquire, key, SINGLEFLIGHT_LEASE_SECONDS
+            )
+            # 其他副本正在生成，等待它發布結果；租約過期仍無結果時自行生成。
+            # 取得租約後也要再查一次：前一位領頭者可能剛發布結果並釋放租約
+            payload = await asyncio.to_thread(self.store.result, key)
+            if payload is not None:
+                if token is not None:
+                    await asyncio.to_thread(self.store.release, key, token)
+                with self._lock:
+                    self._stats["remote_coalesced"] += 1
+                logger.info(f"使用其他副本生成的結果 {key[:12]}")
+                return model_from_json(model_cls, payload)
+            if token is not None or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+
+        try:
+            result = await fn()
+            if result is not None:
+                await asyncio.to_thread(
+                    self.store.publish, key, model_to_json(result), SINGLEFLIGHT_RESULT_TTL
+                )
+            return result
+        finally:
+            if token is not None:
+                await asyncio.to_thread(self.store.release, key, token)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
+
+
+def _create_store() -> Optional[FlightStore]:
+    if SINGLEFLIGHT_REDIS_URL:
+        try:
+            return StateFlightStore(RedisStateBackend(SINGLEFLIGHT_REDIS_URL))
+        except ImportError:
+            logger.warning("未安裝 redis 套件，single-flight 只在本程序內合併請求")
+            return None
+    backend = get_state_backend()
+    return StateFlightStore(backend) if backend.shared else None
+
+
+_single_flight = SingleFlight(_create_store())
+
+
+def get_single_flight() -> SingleFlight:
+    return _single_flight
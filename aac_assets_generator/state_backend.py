@@ -0,0 +1,274 @@
+"""跨程序／跨副本共享的狀態儲存
+
+介面只用到 Redis 指令的一小部分（GET、SET NX/PX、DEL、EXISTS，以及比對後刪除的 Lua 腳本），
+值一律為 bytes：
+- memory：程序內，各快取維持原本的行為（預設）
+- sqlite：同一主機上的多個 Streamlit 程序共用一個 SQLite 檔
+- redis：多台主機共用；任何相容 Redis 協定的服務皆可
+
+結果快取、通用教材快取、PDF/DOCX、single-flight 租約與生成工作狀態都經由這裡共享。
+"""
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from loguru import logger
+
+STATE_BACKEND = os.getenv("AAC_STATE_BACKEND", "memory")
+STATE_PATH = os.getenv("AAC_STATE_PATH", os.path.join(tempfile.gettempdir(), "aac_state.sqlite3"))
+STATE_REDIS_URL = os.getenv("AAC_STATE_REDIS_URL", "")
+# 生成工作狀態的存活時間（秒）；程序異常結束時，其他副本最多等這麼久就不再視為進行中
+JOB_STATUS_TTL = float(os.getenv("AAC_JOB_STATUS_TTL", "900"))
+_PURGE_INTERVAL = 60.0
+
+# 共享範圍：程序內、同一主機、多台主機
+PROCESS, HOST, CLUSTER = "process", "host", "cluster"
+
+# 目前程序的識別，用來分辨工作是否由其他副本執行
+REPLICA_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+Value = Union[bytes, str]
+
+
+def _encode(value: Value) -> bytes:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class StateBackend:
+    """共享狀態的最小介面；ttl 為秒數，None 表示不過期"""
+
+    scope = PROCESS
+
+    @property
+    def shared(self) -> bool:
+        return self.scope != PROCESS
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Value, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        """nx 時只在 key 不存在（或已過期）時寫入；回傳是否寫入"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_if(self, key: str, value: Value) -> bool:
+        """只在目前的值等於 value 時刪除（例如只釋放自己持有的租約）；回傳是否刪除"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class MemoryStateBackend(StateBackend):
+    scope = PROCESS
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return entry[0]
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ttl=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return False
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (_encode(value), expires_at)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_if(self, key, value):
+        with self._lock:
+            if self._live(key) != _encode(value):
+                return False
+            del self._entries[key]
+            return True
+
+
+class SQLiteStateBackend(StateBackend):
+    """同一主機的多個程序共用；每個執行緒各自一條連線，WAL 模式讓讀寫不互相阻擋"""
+
+    scope = HOST
+
+    def __init__(self, path: str = STATE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS aac_state "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # isolation_level=None：每個陳述式自動提交，單一 UPSERT 即為原子操作
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = (
+            self._connection()
+            .execute(
+                "SELECT value FROM aac_state WHERE key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return bytes(row[0]) if row is not None else None
+
+    def set(self, key, value, ttl=None, nx=False):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        sql = (
+            "INSERT INTO aac_state (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = excluded.value, expires_at = excluded.expires_at"
+        )
+        params = (key, _encode(value), expires_at)
+        if nx:
+            # 已存在且未過期時不覆寫
+            sql += " WHERE aac_state.expires_at IS NOT NULL AND aac_state.expires_at <= ?"
+            params += (now,)
+        written = self._connection().execute(sql, params).rowcount > 0
+        self._maybe_purge(now)
+        return written
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM aac_state WHERE key = ?", (key,))
+
+    def delete_if(self, key, value):
+        cursor = self._connection().execute(
+            "DELETE FROM aac_state WHERE key = ? AND value = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (key, _encode(value), time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def _maybe_purge(self, now: float):
+        if now - self._last_purge < _PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self._connection().execute(
+            "DELETE FROM aac_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        )
+
+
+# 比對後刪除需在 Redis 端以單一腳本完成，GET 與 DEL 之間值才不會被其他副本換掉
+_DELETE_IF_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisStateBackend(StateBackend):
+    """client 可傳入任何提供 redis-py get/set/delete/exists/eval 介面的物件"""
+
+    scope = CLUSTER
+
+    def __init__(self, url: str = STATE_REDIS_URL, client=None, prefix: str = "aac:"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self._client.get(f"{self.prefix}{key}")
+
+    def set(self, key, value, ttl=None, nx=False):
+        px = int(ttl * 1000) if ttl else None
+        return bool(self._client.set(f"{self.prefix}{key}", _encode(value), px=px, nx=nx))
+
+    def delete(self, key):
+        self._client.delete(f"{self.prefix}{key}")
+
+    def delete_if(self, key, value):
+        return bool(self._client.eval(_DELETE_IF_SCRIPT, 1, f"{self.prefix}{key}", _encode(value)))
+
+    def exists(self, key):
+        return bool(self._client.exists(f"{self.prefix}{key}"))
+
+
+def _create_backend() -> StateBackend:
+    try:
+        if STATE_BACKEND == "sqlite":
+            return SQLiteStateBackend(STATE_PATH)
+        if STATE_BACKEND == "redis":
+            return RedisStateBackend(STATE_REDIS_URL)
+    except ImportError:
+        logger.warning("未安裝 redis 套件，共享狀態改為只在本程序內保存")
+    except sqlite3.Error as e:
+        logger.warning(f"無法開啟共享狀態資料庫 {STATE_PATH}（{e}），改為只在本程序內保存")
+    return MemoryStateBackend()
+
+
+_state_backend = _create_backend()
+
+
+def get_state_backend() -> StateBackend:
+    return _state_backend
+
+
+def publish_job(key: str, job_id: int, ttl: float = JOB_STATUS_TTL):
+    """記錄本程序正在為 key 生成；其他副本據此避免重複生成"""
+    backend = get_state_backend()
+    if not key or not backend.shared:
+        return
+    status = {"replica": REPLICA_ID, "job_id": job_id, "started_at": time.time()}
+    backend.set(f"job:{key}", json.dumps(status), ttl=ttl)
+
+
+def finish_job(key: str, job_id: int):
+    backend = get_state_backend()
+    if not key or not backend.shared:
+        return
+    payload = backend.get(f"job:{key}")
+    if payload is None:
+        return
+    status = json.loads(payload)
+    # 其他副本之後為同一個 key 開始的工作不受影響；比對後刪除，讀取後才被覆寫也不會誤刪
+    if (status["replica"], status["job_id"]) == (REPLICA_ID, job_id):
+        backend.delete_if(f"job:{key}", payload)
+
+
+def job_status(key: str) -> Optional[dict]:
+    backend = get_state_backend()
+    if not key or not backend.shared:
+        return None
+    payload = backend.get(f"job:{key}")
+    return json.loads(payload) if payload is not None else None
+
+
+def running_elsewhere(key: str) -> bool:
+    """其他副本是否正在為 key 生成"""
+    status = job_status(key)
+    return status is not None and status["replica"] != REPLICA_ID
@@ -0,0 +1,123 @@
+import os
+
+import streamlit as st
+
+from aac_assets_generator.bundle_export import build_series_bundle
+from aac_assets_generator.learning_asset_models import LearningAsset
+from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+from aac_assets_generator.service_metrics import service_metrics, summary_line
+from aac_assets_generator.session_cache import get_session_cache, result_key
+from aac_assets_generator.utils import export_asset_docx, export_assets_pdf
+
+
+def _set_download_ready(state_key, ready):
+    st.session_state[state_key] = ready
+
+
+def _lazy_download(state_key, label, load, export, main_title, sub_title):
+    """按下「準備」後才從 ArtifactStore 取出檔案，下載後即不再交給 download_button
+
+    download_button 每次重跑都會把完整的 bytes 複製進 Streamlit 的媒體儲存區（每個
+    session 一份），而目前版本不接受 callable；只在準備與下載之間渲染按鈕，其餘時間
+    媒體儲存區不保留檔案。
+    """
+    if not st.session_state.get(state_key):
+        # 以 callback 設定狀態，點擊後的這次重跑就直接換成下載按鈕
+        st.button(
+            label, key=f"{state_key}_prepare", on_click=_set_download_ready, args=(state_key, True)
+        )
+        return
+    # 閒置後被移出記憶體的檔案會從磁碟讀回
+    data = load()
+    if data is None:
+        st.session_state[state_key] = False
+        st.warning("檔案已過期，請重新整理頁面後再下載。")
+        return
+    export(data, main_title, sub_title, on_click=_set_download_ready, args=(state_key, False))
+
+
+@st.fragment
+def render_downloads(cache_key):
+    """下載按鈕獨立成 fragment，點擊時只重跑這一區塊而非整頁"""
+    result = get_session_cache().get(cache_key)
+    if result is None or not result.is_complete:
+        return
+    _lazy_download(
+        f"aac_pdf_{cache_key}",
+        "準備 PDF",
+        lambda: result.pdf_bytes,
+        export_assets_pdf,
+        result.main_title,
+        result.sub_title,
+    )
+    _lazy_download(
+        f"aac_docx_{cache_key}",
+        "準備 Word 文件",
+        lambda: result.docx_bytes,
+        export_asset_docx,
+        result.main_title,
+        result.sub_title,
+    )
+
+
+@st.fragment
+def render_series_bundle(api_key, board_id, learningasset_generator, learningevaluate_generator):
+    """把同系列的版面打包成一個 ZIP；ZIP 寫在磁碟上，session 只保存路徑"""
+    state_key = f"aac_bundle_{result_key(api_key, board_id)}"
+    with st.expander("打包整個系列"):
+        booklet = st.checkbox("附上合併的 PDF 手冊", key=f"{state_key}_booklet")
+        generate_missing = st.checkbox(
+            "同時生成尚未生成的版面（需要較久時間）", key=f"{state_key}_generate"
+        )
+        if st.button("開始打包", key=f"{state_key}_build"):
+            with st.spinner("正在打包同系列的教材..."):
+                path, manifest = build_series_bundle(
+                    api_key,
+                    board_id,
+                    learningasset_generator,
+                    learningevaluate_generator,
+                    booklet=booklet,
+                    generate_missing=generate_missing,
+                )
+            st.session_state[state_key] = (path, manifest["title"])
+            missing = len(manifest["documents"]) - manifest["ok"]
+            if missing:
+                st.info(f"有 {missing} 個版面尚未生成或生成失敗，詳見 ZIP 內的 manifest.json。")
+        bundle = st.session_state.get(state_key)
+        if bundle is not None and os.path.exists(bundle[0]):
+            with open(bundle[0], "rb") as bundle_file:
+                st.download_button(
+                    label="下載 ZIP",
+                    data=bundle_file,
+                    file_name=f"{bundle[1]}.zip",
+                    mime="application/zip",
+                    key=f"{state_key}_download",
+                )
+
+
+@st.fragment
+def render_result_view(cache_key, learningasset_generator, learningevaluate_generator):
+    """結果頁面；Markdown 內容已依內容雜湊快取，重跑時不需重新組表格"""
+    result = get_session_cache().get(cache_key)
+    if result is None:
+        return
+
+    if isinstance(result.learning_asset, LearningAsset):
+        learningasset_generator.render_at_streamlit(result.learning_asset, result.case_info)
+    else:
+        st.error("生成學習單時發生錯誤，請檢查API密鑰和版面提示詞ID是否正確。")
+
+    if isinstance(result.learning_evaluate, EvaluationAssetTable):
+        learningevaluate_generator.render_at_streamlit(result.learning_evaluate)
+    else:
+        st.error("生成評估表時發生錯誤，請檢查API密鑰和版面提示詞ID是否正確。")
+
+
+@st.fragment
+def render_service_metrics():
+    """管理者用的服務狀態（排程佇列深度等）；按下重新整理只重跑這一區塊"""
+    with st.expander("服務狀態", expanded=True):
+        st.button("重新整理", key="aac_service_metrics_refresh")
+        metrics = service_metrics()
+        st.caption(summary_line(metrics))
+        st.json(metrics)
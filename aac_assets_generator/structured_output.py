@@ -0,0 +1,100 @@
+"""structured output 的快速路徑
+
+strict JSON schema 在匯入時預先產生並快取，以一般的 chat.completions.create 傳送；
+回應只解析一次外層 JSON，內容交給 pydantic 預先建好的驗證器一次完成解析與驗證。
+送出的 response_format 與 SDK 的 parse() 相同，錄製檔與模型行為不受影響。
+"""
+import functools
+import json
+import os
+import time
+from typing import Optional, Type
+
+import pydantic
+from loguru import logger
+from openai.lib._parsing._completions import type_to_response_format_param
+from pydantic import BaseModel
+
+from aac_assets_generator.learning_asset_models import LearningAsset
+from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+from aac_assets_generator.learning_joint_models import LearningJointAssets
+from aac_assets_generator.metrics import parse_stats
+from aac_assets_generator.serialization import model_from_json
+from aac_assets_generator.wire_models import WIRE_FORMATS
+
+# 設為 0 時改用 SDK 的 beta.chat.completions.parse
+STRUCTURED_FAST_PATH = os.getenv("AAC_STRUCTURED_FAST_PATH", "1") == "1"
+
+
+@functools.lru_cache(maxsize=None)
+def response_format_param(model_cls: Type[BaseModel]) -> dict:
+    """模型對應的 strict response_format（與 SDK parse() 送出的內容相同）"""
+    return type_to_response_format_param(model_cls)
+
+
+class StructuredResult:
+    """一次呼叫的結果；parsed 為 None 時 failure 說明原因，content 留給修復流程使用"""
+
+    def __init__(self, payload: dict, parsed=None, failure: Optional[str] = None):
+        choice = (payload.get("choices") or [{}])[0]
+        message = choice.get("message") or {}
+        self.payload = payload
+        self.content: Optional[str] = message.get("content")
+        self.refusal: Optional[str] = message.get("refusal")
+        self.finish_reason: Optional[str] = choice.get("finish_reason")
+        self.parsed = parsed
+        self.failure = failure
+
+
+def _validate_content(response_format, result: StructuredResult) -> StructuredResult:
+    if result.finish_reason == "length":
+        result.failure = "LengthFinishReasonError: 輸出達到長度上限而被截斷"
+    elif result.finish_reason == "content_filter":
+        result.failure = "ContentFilterFinishReasonError: 輸出被內容過濾器中斷"
+    elif result.content is None:
+        result.failure = f"模型拒絕回應: {result.refusal}"
+    else:
+        try:
+            result.parsed = model_from_json(response_format, result.content)
+        except (pydantic.ValidationError, ValueError) as e:
+            result.failure = f"{type(e).__name__}: {str(e)[:200]}"
+    return result
+
+
+def _log_summary(response_format, result: StructuredResult, parse_seconds: float):
+    """只記錄摘要，不把整個回應物件轉成字串"""
+    usage = result.payload.get("usage") or {}
+    logger.info(
+        f"response:{result.payload.get('id')} model={result.payload.get('model')} "
+        f"format={response_format.__name__} finish={result.finish_reason} "
+        f"tokens={usage.get('prompt_tokens')}/{usage.get('completion_tokens')} "
+        f"content={len(result.content or '')} chars parse={parse_seconds * 1000:.1f}ms"
+    )
+
+
+async def create_structured(
+    client, model, messages, response_format: Type[BaseModel], **kwargs
+) -> StructuredResult:
+    """送出 structured output 請求並解析；解析失敗時不拋例外，由呼叫端決定是否修復"""
+    raw_response = await client.chat.completions.with_raw_response.create(
+        model=model,
+        messages=messages,
+        response_format=response_format_param(response_format),
+        **kwargs,
+    )
+    start = time.perf_counter()
+    result = StructuredResult(json.loads(raw_response.http_response.content))
+    _validate_content(response_format, result)
+    parse_seconds = time.perf_counter() - start
+    parse_stats.record(response_format.__name__, parse_seconds, ok=result.parsed is not None)
+    _log_summary(response_format, result, parse_seconds)
+    return result
+
+
+def _warm_schemas():
+    for model_cls in (LearningAsset, EvaluationAssetTable, LearningJointAssets):
+        response_format_param(model_cls)
+        response_format_param(WIRE_FORMATS[model_cls][0])
+
+
+_warm_schemas()
@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Optional
+
+from loguru import logger
+
+from aac_assets_generator.circuit_breaker import CircuitOpenError
+from aac_assets_generator.effort_controller import effort_kwargs, get_effort_controller
+from aac_assets_generator.generator.learning_joint import LearningJointGenerator
+from aac_assets_generator.learning_joint_models import LearningJointAssets
+from aac_assets_generator.metrics import stage_timer
+from aac_assets_generator.prompt_builder import build_full_prompt
+from aac_assets_generator.prompts import AAC_ADAPT_PROMPT, AAC_JOINT_PROMPT
+from aac_assets_generator.salvage import parse_with_salvage
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.serialization import content_hash, model_from_json, model_to_json
+from aac_assets_generator.singleflight import flight_key, get_single_flight
+from aac_assets_generator.state_backend import StateBackend, get_state_backend
+from aac_assets_generator.wire_models import from_wire, to_wire, wire_format_for
+
+# 版面層級的通用教材只依版面內容而定，可以保留較久
+BASE_ASSET_TTL = float(os.getenv("AAC_BASE_ASSET_TTL", "86400"))
+BASE_ASSET_MAX_ENTRIES = int(os.getenv("AAC_BASE_ASSET_MAX_ENTRIES", "256"))
+BASE_MODEL = os.getenv("AAC_BASE_MODEL", "o3")
+# 個人化調整只需改寫既有內容，使用較快、較便宜的模型
+ADAPT_MODEL = os.getenv("AAC_ADAPT_MODEL", "gpt-4.1-mini")
+
+# 生成通用教材時使用的個案資料：不含任何個別學生的特質
+BASE_CASE_INFO = """
+    個案: 通用版本（之後會依個別學生的溝通方式與能力調整）
+    溝通方式: 未提供
+    預計教學時間: 40 分鐘
+    """
+
+
+def base_asset_key(model: str, learn_assets_contents: str) -> str:
+    return content_hash(model, AAC_JOINT_PROMPT, learn_assets_contents)
+
+
+class BaseAssetCache:
+    """以版面內容雜湊為鍵的通用教材快取（具存活時間）；共享狀態啟用時各副本共用"""
+
+    def __init__(
+        self,
+        ttl: float = BASE_ASSET_TTL,
+        max_entries: int = BASE_ASSET_MAX_ENTRIES,
+        backend: Optional[StateBackend] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend if backend is not None and backend.shared else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # shared_hits：本程序沒有、由其他副本生成並從共享狀態取回的次數
+        self._stats = {"hits": 0, "misses": 0, "shared_hits": 0}
+
+    def get(self, key: str) -> Optional[LearningJointAssets]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._stats["hits"] += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+        base = self._load_shared(key)
+        with self._lock:
+            if base is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["shared_hits"] += 1
+            self._remember(key, base)
+        return base
+
+    def _load_shared(self, key: str) -> Optional[LearningJointAssets]:
+        if self.backend is None:
+            return None
+        try:
+            payload = self.backend.get(f"base_asset:{key}")
+            return model_from_json(LearningJointAssets, payload) if payload is not None else None
+        except Exception as e:
+            logger.warning(f"讀取共享的通用教材失敗: {str(e)}")
+            return None
+
+    def _remember(self, key: str, base: LearningJointAssets):
+        # 從共享狀態取回的項目以取回的時間起算，最多比實際多保留一個 ttl
+        self._entries[key] = (time.monotonic(), base)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key: str, base: LearningJointAssets) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._remember(key, base)
+        if self.backend is not None:
+            try:
+                self.backend.set(f"base_asset:{key}", model_to_json(base), ttl=self.ttl)
+            except Exception as e:
+                logger.warning(f"寫入共享的通用教材失敗: {str(e)}")
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
+
+
+_base_asset_cache = BaseAssetCache(backend=get_state_backend())
+
+
+def get_base_asset_cache() -> BaseAssetCache:
+    return _base_asset_cache
+
+
+class TwoTierGenerator:
+    """兩階段生成：每個版面只用 o3 生成一次通用教材，再以輕量模型依個別學生調整
+
+    班級規模使用時，昂貴的呼叫次數與版面數成正比，而不是學生數 × 版面數。
+    """
+
+    def __init__(self, client, scheduler=None, base_model=BASE_MODEL, adapt_model=ADAPT_MODEL):
+        self.client = client
+        self.scheduler = scheduler
+        self.base_model = base_model
+        self.adapt_model = adapt_model
+        self.joint_generator = LearningJointGenerator(client, scheduler)
+
+    def _slot(self, user_account, priority):
+        # 有設定排程器時，LLM 呼叫需先取得名額
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(user_account, priority)
+
+    async def get_base(
+        self, learn_assets_contents, user_account=None, priority=Priority.INTERACTIVE
+    ) -> Optional[LearningJointAssets]:
+        cache = get_base_asset_cache()
+        key = base_asset_key(self.base_model, learn_assets_contents)
+        base = cache.get(key)
+        if base is not None:
+            return base
+        # 同一版面的多位學生同時請求時，single-flight 會合併成一次呼叫（提示詞相同）
+        with stage_timer("base_asset"):
+            learning_asset, learning_evaluate, _ = (
+                await self.joint_generator.generate_learning_joint_async(
+                    BASE_CASE_INFO,
+                    learn_assets_contents,
+                    prompt=AAC_JOINT_PROMPT,
+                    model=self.base_model,
+                    user_account=user_account,
+                    priority=priority,
+                )
+            )
+        if learning_asset is None or learning_evaluate is None:
+            return None
+        base = LearningJointAssets(
+            learning_asset=learning_asset, learning_evaluate=learning_evaluate
+        )
+        cache.put(key, base)
+        return base
+
+    async def _adapt(self, full_prompt, user_account, priority, reasoning_effort=None):
+        async with self._slot(user_account, priority):
+            with get_effort_controller().observe("learning_adapt", reasoning_effort):
+                parsed = await parse_with_salvage(
+                    self.client,
+                    self.adapt_model,
+                    [{"role": "system", "content": full_prompt}],
+                    wire_format_for(LearningJointAssets),
+                    **effort_kwargs(reasoning_effort),
+                )
+        return from_wire(LearningJointAssets, parsed)
+
+    async def generate_two_tier_async(
+        self,
+        case_info,
+        learn_assets_contents,
+        user_account=None,
+        priority=Priority.INTERACTIVE,
+    ):
+        """回傳 (learning_asset, learning_evaluate, case_info)；任一階段失敗時前兩者為 None"""
+        base = await self.get_base(learn_assets_contents, user_account, priority)
+        if base is None:
+            return None, None, case_info
+
+        full_prompt, _ = build_full_prompt(AAC_ADAPT_PROMPT, case_info, learn_assets_contents)
+        base_json = model_to_json(to_wire(LearningJointAssets, base))
+        full_prompt = full_prompt.replace("<base_assets>", base_json)
+        logger.info(f"use model:{self.adapt_model}")
+        reasoning_effort = get_effort_controller().choose(
+            "learning_adapt", self.adapt_model, learn_assets_contents, priority
+        )
+        try:
+            with stage_timer("learning_adapt"):
+                adapted = await get_single_flight().do(
+                    flight_key(self.adapt_model, LearningJointAssets, full_prompt),
+                    lambda: self._adapt(full_prompt, user_account, priority, reasoning_effort),
+                    model_cls=LearningJointAssets,
+                    priority=priority,
+                )
+        except CircuitOpenError:
+            # 交給介面顯示上游異常或改用快取內容
+            raise
+        except Exception as e:
+            logger.error(f"依個案調整通用教材時發生錯誤: {str(e)}")
+            adapted = None
+        if adapted is None:
+            # 未調整的通用教材不是這位學生的學習單，不能當成個人化結果顯示或快取
+            logger.warning("個人化調整失敗，視為生成失敗")
+            return None, None, case_info
+        return adapted.learning_asset, adapted.learning_evaluate, case_info
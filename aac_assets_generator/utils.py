@@ -1,8 +1,8 @@
 import json
 import io
+import os
+import aiohttp
 import streamlit as st
-from reportlab.platypus import SimpleDocTemplate
-from reportlab.lib.pagesizes import letter
 from reportlab.platypus import PageBreak
 from aac_assets_generator.learning_asset_models import LearningAsset
 from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
@@ -10,6 +10,39 @@ from docx import Document
 from docx.shared import Pt, Cm
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import re
+from aac_assets_generator import docx_template, pdf_templates
+from aac_assets_generator.circuit_breaker import BACKEND, BACKEND_TIMEOUT, protected
+from aac_assets_generator.profiling import profiled
+from aac_assets_generator.roster import CASE_FIELDS, format_case_info, normalize_field
+
+# 可指向本機的模擬後端（壓力測試、離線重播）
+AAC_BACKEND_URL = os.getenv("AAC_BACKEND_URL", "https://aaclearningbackend.azurewebsites.net")
+# template：直接輸出 XML 的快速版本；python-docx：原本逐格建立的版本
+DOCX_ENGINE = os.getenv("AAC_DOCX_ENGINE", "template")
+
+
+_backend_session_factory = None
+
+
+class BackendError(Exception):
+    """後端回應非 200；status 供斷路器區分使用者錯誤（4xx）與後端故障"""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def set_backend_session_factory(factory):
+    """替換呼叫後端時使用的 session（例如錄製/重播），傳入 None 恢復 aiohttp 預設"""
+    global _backend_session_factory
+    _backend_session_factory = factory
+
+
+def create_backend_session():
+    if _backend_session_factory is not None:
+        return _backend_session_factory()
+    return aiohttp.ClientSession()
+
 
 def extract_main_title(prompt_content):
     pattern = r'([\u4e00-\u9fff]+系列)(?=的)'
@@ -18,77 +51,68 @@ def extract_main_title(prompt_content):
         return match.group(1)[2:]
     return "AAC系列"
 
+@protected(BACKEND, timeout=BACKEND_TIMEOUT)
 async def get_user_study_sheet_data_async(session, api_key):
-    url = "https://aaclearningbackend.azurewebsites.net/api/WebAAC/GetUserStudySheetData"
+    url = f"{AAC_BACKEND_URL}/api/WebAAC/GetUserStudySheetData"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     async with session.get(url, headers=headers) as response:
         if response.status == 200:
             return await response.json()
         else:
-            raise Exception(f"GetUserStudySheetData API 調用失敗，狀態碼 {response.status}")
+            raise BackendError(
+                f"GetUserStudySheetData API 調用失敗，狀態碼 {response.status}", response.status
+            )
 
 
+@protected(BACKEND, timeout=BACKEND_TIMEOUT)
 async def get_board_prompt_word_data_async(session, api_key, board_id):
-    url = "https://aaclearningbackend.azurewebsites.net/api/WebAAC/GetBoardPromptWordData"
+    url = f"{AAC_BACKEND_URL}/api/WebAAC/GetBoardPromptWordData"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     data = {"ID": board_id}
     async with session.get(url, headers=headers, data=json.dumps(data)) as response:
         if response.status == 200:
             return await response.json()
         else:
-            raise Exception(f"GetBoardPromptWordData API 調用失敗，狀態碼 {response.status}")
+            raise BackendError(
+                f"GetBoardPromptWordData API 調用失敗，狀態碼 {response.status}", response.status
+            )
 
 
 def parse_user_data(user_data):
-    def parse_json_field(field):
-        if field:
-            try:
-                return ", ".join(json.loads(field))
-            except json.JSONDecodeError:
-                return field
-        return "未提供"
-
-    name = parse_json_field(user_data.get("name", "未提供"))
-    gender = parse_json_field(user_data.get("gender", "未提供"))
-    disability = parse_json_field(user_data.get("disability", "未提供"))
-    communication_issues = parse_json_field(user_data.get("communication_Issues", "未提供"))
-    communication_methods = parse_json_field(user_data.get("communication_Methods", "未提供"))
-    strengths = parse_json_field(user_data.get("strengths", "未提供"))
-    weaknesses = parse_json_field(user_data.get("weaknesses", "未提供"))
-    teaching_time = parse_json_field(user_data.get("teaching_Time", "未提供"))
-
-    case_info = f"""
-    姓名: {name}
-    性別: {gender}
-    障礙類別: {disability}
-    溝通問題: {communication_issues}
-    溝通方式: {communication_methods}
-    優勢能力: {strengths}
-    弱勢能力: {weaknesses}
-    預計教學時間: {teaching_time} 分鐘
-    """
-
-    return case_info
-
-
-def combine_pdf_buffers(asset_elements, evaluate_elements):
+    """單筆後端資料轉成 case_info；欄位解析與格式和批次匯入（roster）共用"""
+    return format_case_info(
+        {field: normalize_field(user_data.get(field)) for field, _ in CASE_FIELDS}
+    )
+
+
+@profiled("combine_pdf_buffers")
+def combine_pdf_buffers(asset_elements, evaluate_elements, title=""):
     combined_elements = asset_elements + evaluate_elements
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    doc.build(combined_elements)
-    
-    return buffer
+    # 頁首標題與頁尾免責聲明由共用的頁面範本繪製
+    return pdf_templates.build_pdf(combined_elements, title)
 
-def export_assets_pdf(buffer, main_title, sub_title):
+def export_assets_pdf(buffer, main_title, sub_title, on_click=None, args=None):
     st.download_button(
         label="下載 PDF",
         data=buffer,
         file_name=f"{main_title}-{sub_title}.pdf",
         mime="application/pdf",
-        key="pdf_download"  
+        key="pdf_download",
+        on_click=on_click,
+        args=args,
     )
 
+@profiled("generate_combined_docx")
 def generate_combined_docx(learning_asset: LearningAsset, learning_evaluate: EvaluationAssetTable, main_title, sub_title, case_info):
+    if DOCX_ENGINE == "python-docx":
+        return generate_combined_docx_python_docx(
+            learning_asset, learning_evaluate, main_title, sub_title, case_info
+        )
+    return docx_template.render_combined_docx(
+        learning_asset, learning_evaluate, main_title, sub_title, case_info
+    )
+
+def generate_combined_docx_python_docx(learning_asset: LearningAsset, learning_evaluate: EvaluationAssetTable, main_title, sub_title, case_info):
     doc = Document()
     
     # Set font for the entire document
@@ -199,13 +223,15 @@ def generate_combined_docx(learning_asset: LearningAsset, learning_evaluate: Eva
     docx_file.seek(0)
     return docx_file 
 
-def export_asset_docx(docx_buffer,  main_title, sub_title):
+def export_asset_docx(docx_buffer,  main_title, sub_title, on_click=None, args=None):
     st.download_button(
            label="下載 Word 文件",
-           data=docx_buffer.getvalue(),
+           data=docx_buffer if isinstance(docx_buffer, bytes) else docx_buffer.getvalue(),
            file_name=f"{main_title}-{sub_title}.docx",
            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-           key="docx_download"  # 添加唯一的 key
+           key="docx_download",  # 添加唯一的 key
+           on_click=on_click,
+           args=args,
        )               
 
 
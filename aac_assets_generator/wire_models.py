@@ -0,0 +1,209 @@
+"""LLM 呼叫用的精簡輸出格式
+
+短鍵名、清單直接用字串陣列、評分標準用依序排列的陣列，減少模型輸出的 token；
+欄位說明對應提示詞中的原欄位名稱，取回後無損轉換成公開的模型。
+"""
+import os
+from typing import List, Type
+
+from pydantic import BaseModel, Field
+
+from aac_assets_generator.learning_asset_models import (
+    ActivityGuide,
+    AssessmentMethod,
+    AssessmentQuestion,
+    LearningAsset,
+    LessonPlan,
+    PracticeQuestion,
+    ReflectionQuestion,
+    SelfAssessmentItem,
+    TeachingMethod,
+    TeachingStep,
+    WorksheetSection,
+)
+from aac_assets_generator.learning_evaluation_models import (
+    EvaluationAssetTable,
+    EvaluationItem,
+    ScoreLevelDescriptions,
+)
+from aac_assets_generator.learning_joint_models import LearningJointAssets
+
+COMPACT_WIRE_SCHEMA = os.getenv("AAC_COMPACT_WIRE_SCHEMA", "1") == "1"
+
+
+class WirePair(BaseModel):
+    t: str = Field(description="title")
+    e: str = Field(description="explanation")
+
+
+class WireLessonPlan(BaseModel):
+    t: str = Field(description="title 教案名稱")
+    o: str = Field(description="objectives 教學目標")
+    c: List[str] = Field(description="content 教學內容")
+    m: List[WirePair] = Field(description="teaching_methods 教學方法")
+    s: List[WirePair] = Field(description="teaching_steps 教學步驟")
+    a: List[WirePair] = Field(description="assessment_methods 評量方式")
+
+
+class WireWorksheet(BaseModel):
+    p: List[str] = Field(description="practice_questions 練習題")
+    g: List[str] = Field(description="activity_guides 活動指導")
+    r: List[str] = Field(description="reflection_questions 反思問題")
+    q: List[str] = Field(description="assessment_questions 評量題")
+    i: List[str] = Field(description="self_assessment_items 自我評估項目")
+    c: str = Field(description="collaborative_learning_activity 合作學習活動")
+
+
+class WireLearningAsset(BaseModel):
+    lp: WireLessonPlan = Field(description="lesson_plan 教案")
+    ws: WireWorksheet = Field(description="worksheet 學習單")
+
+
+class WireEvaluationItem(BaseModel):
+    t: str = Field(description="evaluation_item_title 評量項目")
+    m: str = Field(description="evaluation_metric 評量指標")
+    s: List[str] = Field(
+        description=(
+            "score_descriptions，固定四項並依序為 excellent_with_score_4、good_with_score_3、"
+            "fair_with_score_2、needs_improvement_with_score_1"
+        )
+    )
+
+
+class WireEvaluationAssetTable(BaseModel):
+    t: str = Field(description="evaluation_asset_title 評估表標題")
+    items: List[WireEvaluationItem] = Field(description="evaluation_items 評量項目")
+
+
+class WireLearningJointAssets(BaseModel):
+    la: WireLearningAsset = Field(description="教案與學習單")
+    ev: WireEvaluationAssetTable = Field(description="評估表")
+
+
+def _pairs(pairs: List[WirePair], model_cls):
+    return [model_cls(title=pair.t, explanation=pair.e) for pair in pairs]
+
+
+def learning_asset_from_wire(wire: WireLearningAsset) -> LearningAsset:
+    lesson_plan, worksheet = wire.lp, wire.ws
+    return LearningAsset(
+        lesson_plan=LessonPlan(
+            title=lesson_plan.t,
+            objectives=lesson_plan.o,
+            content=list(lesson_plan.c),
+            teaching_methods=_pairs(lesson_plan.m, TeachingMethod),
+            teaching_steps=_pairs(lesson_plan.s, TeachingStep),
+            assessment_methods=_pairs(lesson_plan.a, AssessmentMethod),
+        ),
+        worksheet=WorksheetSection(
+            practice_questions=[PracticeQuestion(question=q) for q in worksheet.p],
+            activity_guides=[ActivityGuide(description=g) for g in worksheet.g],
+            reflection_questions=[ReflectionQuestion(question=q) for q in worksheet.r],
+            assessment_questions=[AssessmentQuestion(question=q) for q in worksheet.q],
+            self_assessment_items=[SelfAssessmentItem(item=i) for i in worksheet.i],
+            collaborative_learning_activity=worksheet.c,
+        ),
+    )
+
+
+def learning_asset_to_wire(learning_asset: LearningAsset) -> WireLearningAsset:
+    lesson_plan, worksheet = learning_asset.lesson_plan, learning_asset.worksheet
+    return WireLearningAsset(
+        lp=WireLessonPlan(
+            t=lesson_plan.title,
+            o=lesson_plan.objectives,
+            c=list(lesson_plan.content),
+            m=[WirePair(t=m.title, e=m.explanation) for m in lesson_plan.teaching_methods],
+            s=[WirePair(t=s.title, e=s.explanation) for s in lesson_plan.teaching_steps],
+            a=[WirePair(t=m.title, e=m.explanation) for m in lesson_plan.assessment_methods],
+        ),
+        ws=WireWorksheet(
+            p=[q.question for q in worksheet.practice_questions],
+            g=[g.description for g in worksheet.activity_guides],
+            r=[q.question for q in worksheet.reflection_questions],
+            q=[q.question for q in worksheet.assessment_questions],
+            i=[i.item for i in worksheet.self_assessment_items],
+            c=worksheet.collaborative_learning_activity,
+        ),
+    )
+
+
+def evaluation_from_wire(wire: WireEvaluationAssetTable) -> EvaluationAssetTable:
+    items = []
+    for item in wire.items:
+        # 模型偶爾少給或多給等級描述，補空字串或截斷成四項
+        scores = (list(item.s) + [""] * 4)[:4]
+        items.append(
+            EvaluationItem(
+                evaluation_item_title=item.t,
+                evaluation_metric=item.m,
+                score_descriptions=ScoreLevelDescriptions(
+                    excellent_with_score_4=scores[0],
+                    good_with_score_3=scores[1],
+                    fair_with_score_2=scores[2],
+                    needs_improvement_with_score_1=scores[3],
+                ),
+            )
+        )
+    return EvaluationAssetTable(evaluation_asset_title=wire.t, evaluation_items=items)
+
+
+def evaluation_to_wire(evaluation: EvaluationAssetTable) -> WireEvaluationAssetTable:
+    return WireEvaluationAssetTable(
+        t=evaluation.evaluation_asset_title,
+        items=[
+            WireEvaluationItem(
+                t=item.evaluation_item_title,
+                m=item.evaluation_metric,
+                s=[
+                    item.score_descriptions.excellent_with_score_4,
+                    item.score_descriptions.good_with_score_3,
+                    item.score_descriptions.fair_with_score_2,
+                    item.score_descriptions.needs_improvement_with_score_1,
+                ],
+            )
+            for item in evaluation.evaluation_items
+        ],
+    )
+
+
+def joint_from_wire(wire: WireLearningJointAssets) -> LearningJointAssets:
+    return LearningJointAssets(
+        learning_asset=learning_asset_from_wire(wire.la),
+        learning_evaluate=evaluation_from_wire(wire.ev),
+    )
+
+
+def joint_to_wire(joint: LearningJointAssets) -> WireLearningJointAssets:
+    return WireLearningJointAssets(
+        la=learning_asset_to_wire(joint.learning_asset),
+        ev=evaluation_to_wire(joint.learning_evaluate),
+    )
+
+
+# 公開模型 → (精簡格式, 轉回公開模型, 轉成精簡格式)
+WIRE_FORMATS = {
+    LearningAsset: (WireLearningAsset, learning_asset_from_wire, learning_asset_to_wire),
+    EvaluationAssetTable: (WireEvaluationAssetTable, evaluation_from_wire, evaluation_to_wire),
+    LearningJointAssets: (WireLearningJointAssets, joint_from_wire, joint_to_wire),
+}
+
+
+def wire_format_for(model_cls: Type[BaseModel]) -> Type[BaseModel]:
+    """呼叫 LLM 時實際使用的 response_format"""
+    if not COMPACT_WIRE_SCHEMA or model_cls not in WIRE_FORMATS:
+        return model_cls
+    return WIRE_FORMATS[model_cls][0]
+
+
+def from_wire(model_cls: Type[BaseModel], parsed):
+    if parsed is None or isinstance(parsed, model_cls):
+        return parsed
+    return WIRE_FORMATS[model_cls][1](parsed)
+
+
+def to_wire(model_cls: Type[BaseModel], value):
+    """把公開模型轉成呼叫 LLM 時使用的格式（例如放進提示詞中的既有內容）"""
+    if wire_format_for(model_cls) is model_cls:
+        return value
+    return WIRE_FORMATS[model_cls][2](value)
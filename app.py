@@ -1,143 +1,206 @@
-import asyncio
+import dataclasses
 import os
+import time
 
-import aiohttp
 import streamlit as st
 from loguru import logger
 from openai import AsyncOpenAI
 
 from aac_assets_generator.generator.learning_asset import LearningAssetGenerator
 from aac_assets_generator.generator.learning_evaluate import LearningEvaluateGenerator
-from aac_assets_generator.learning_asset_models import LearningAsset
-from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
-from aac_assets_generator.prompts import AAC_TUTORIAL_PROMPT, AAC_EVALUATION_PROMPT
-from aac_assets_generator.utils import (
-    get_board_prompt_word_data_async,
-    get_user_study_sheet_data_async,
-    parse_user_data,
-    combine_pdf_buffers,
-    export_assets_pdf,
-    generate_combined_docx,
-    export_asset_docx,
-    render_streamlit_interface,
-    extract_main_title
+from aac_assets_generator import pipeline
+from aac_assets_generator.cancellation import (
+    KEEP_ABANDONED_RESULTS,
+    GenerationCancelled,
+    run_cancellable,
 )
-
-# Add this near the top of your script, after the imports
-if "learning_asset" not in st.session_state:
-    st.session_state.learning_asset = None
-
-if "learning_evaluate" not in st.session_state:
-    st.session_state.learning_evaluate = None
-
-if "main_title" not in st.session_state:
-     st.session_state.main_title = None
-
-if "sub_title" not in st.session_state:
-     st.session_state.sub_title = None
-
-if 'pdf_buffer' not in st.session_state:
-        st.session_state.pdf_buffer = None
-if 'docx_buffer' not in st.session_state:
-        st.session_state.docx_buffer = None
-if 'rendered' not in st.session_state:
-        st.session_state.rendered = False
-if 'case_info' not in st.session_state:
-        st.session_state.case_info = None
+from aac_assets_generator.circuit_breaker import CircuitOpenError
+from aac_assets_generator.deadline import (
+    STALE_REFRESH_INTERVAL,
+    DeadlineExceeded,
+    deadline_after,
+    get_refresh_tracker,
+)
+from aac_assets_generator.memory_governor import get_artifact_store
+from aac_assets_generator.prefetch import PREFETCH_ENABLED, BoardPrefetcher, interactive_activity
+from aac_assets_generator.profiling import (
+    is_admin_token,
+    profiled,
+    request_profiling,
+    should_profile,
+)
+from aac_assets_generator.recording import http_client_from_env
+from aac_assets_generator.result_cache import get_result_cache
+from aac_assets_generator.scheduler import get_scheduler
+from aac_assets_generator.service_metrics import start_metrics_logger
+from aac_assets_generator.session_cache import SessionResult, get_session_cache, result_key
+from aac_assets_generator.streamlit_views import (
+    render_downloads,
+    render_result_view,
+    render_series_bundle,
+    render_service_metrics,
+)
+from aac_assets_generator.utils import combine_pdf_buffers, generate_combined_docx
 
 # 設置 logger
 logger.add("app.log", rotation="500 MB")
+# 定期把排程佇列深度等指標寫入 log
+start_metrics_logger()
 
 # 初始化 AsyncOpenAI 客戶端
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-learningasset_generator = LearningAssetGenerator(client=client)
-learningevaluate_generator = LearningEvaluateGenerator(client=client)
-
-
-async def process_request(api_key, board_id):
-    try:
-        async with aiohttp.ClientSession() as session:
-            user_data_task = asyncio.create_task(get_user_study_sheet_data_async(session, api_key))
-            prompt_data_task = asyncio.create_task(
-                get_board_prompt_word_data_async(session, api_key, board_id)
-            )
-
-            user_data, prompt_data = await asyncio.gather(user_data_task, prompt_data_task)
-
-        info = parse_user_data(user_data)
-        prompt = AAC_TUTORIAL_PROMPT  # + prompt_data['promptContent']
-
-        learning_asset, case_info = await learningasset_generator.generate_learning_asset_async(
-            info, prompt_data["promptContent"], prompt=prompt
-        )
-
-        prompt = AAC_EVALUATION_PROMPT
-        learning_evaluate, case_info = await learningevaluate_generator.generate_learning_evaluate_async(
-            info, prompt_data["promptContent"], prompt=prompt
-        )
-        main_title = extract_main_title(prompt_data['promptContent'])
-        sub_title = prompt_data['promptTitle']
-
-        return learning_asset, learning_evaluate, main_title, sub_title, case_info
-    except Exception as e:
-        logger.error(f"處理請求時發生錯誤: {str(e)}")
-        return None, None, None, None, None, None
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client_from_env())
+learningasset_generator = LearningAssetGenerator(client=client, scheduler=get_scheduler())
+learningevaluate_generator = LearningEvaluateGenerator(client=client, scheduler=get_scheduler())
+
+
+@st.cache_resource
+def get_prefetcher():
+    # 整個程序共用一個預取器，避免每次重跑都建立新的背景執行緒
+    if not PREFETCH_ENABLED:
+        return None
+    return BoardPrefetcher(learningasset_generator, learningevaluate_generator)
+
+
+@profiled("process_request")
+async def process_request(api_key, board_id, deadline=None):
+    return await pipeline.process_request(
+        api_key,
+        board_id,
+        learningasset_generator,
+        learningevaluate_generator,
+        prefetcher=get_prefetcher(),
+        deadline=deadline,
+    )
+
+
+def store_result(cache_key):
+    return lambda result: get_result_cache().put(cache_key, SessionResult(*result))
+
+
+def keep_abandoned_result(cache_key):
+    # 只有設定保留且結果快取啟用時，使用者離開後才讓生成跑完
+    if not (KEEP_ABANDONED_RESULTS and get_result_cache().enabled):
+        return None
+    return store_result(cache_key)
+
+
+def ensure_artifacts(result):
+    store = get_artifact_store()
+    if result.is_complete and not store.contains(result.pdf_handle):
+        # 生成 PDF
+        asset_elements = learningasset_generator.markdown_to_pdf(result.learning_asset, result.main_title, result.sub_title, result.case_info)
+        evaluate_elements = learningevaluate_generator.markdown_to_pdf(result.learning_evaluate)
+        result.pdf_bytes = combine_pdf_buffers(
+            asset_elements, evaluate_elements, title=f"{result.main_title}-{result.sub_title}"
+        ).getvalue()
+    if result.is_complete and not store.contains(result.docx_handle):
+        # 生成 DOCX
+        result.docx_bytes = generate_combined_docx(result.learning_asset, result.learning_evaluate, result.main_title, result.sub_title, result.case_info).getvalue()
+    return result
+
+
+def show_stale_notice(result, refreshing):
+    generated_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(result.generated_at))
+    notice = f"目前顯示的是 {generated_at} 生成的舊版本（快取內容）"
+    st.info(f"{notice}，新版本完成後會自動更新。" if refreshing else f"{notice}。")
+
+
+@st.fragment(run_every=STALE_REFRESH_INTERVAL)
+def watch_fresh_result(cache_key):
+    """顯示舊結果期間定期檢查背景生成是否完成，完成後整頁重跑換上新結果"""
+    fresh = get_result_cache().get(cache_key)
+    if fresh is not None:
+        get_session_cache().put(cache_key, ensure_artifacts(fresh))
+        st.rerun()
+    if not get_refresh_tracker().pending(cache_key):
+        st.caption("新版本未能完成，目前仍顯示先前的版本。")
 
 
 def main():
     st.set_page_config(page_title="特教學習助手 - AI個性化學習單生成器", layout="wide")
     st.title("特教學習助手 - AI個性化學習單生成器")
 
+    # 管理者可用 ?admin=<token> 查看服務狀態
+    if is_admin_token(st.query_params.get("admin")):
+        render_service_metrics()
+
     # 從URL獲取參數
     api_key = st.query_params.get("apiKey", "")
     board_id = st.query_params.get("boardId", "")
 
     if api_key and board_id:
-        if st.session_state.learning_asset is None and st.session_state.learning_evaluate is None and st.session_state.main_title is None and st.session_state.sub_title is None and st.session_state.case_info is None:
-            with st.spinner("正在處理您的請求..."):
-                learning_asset, learning_evaluate, main_title, sub_title, case_info = asyncio.run(process_request(api_key, board_id))
-                st.session_state.learning_asset = learning_asset
-                st.session_state.learning_evaluate = learning_evaluate
-                st.session_state.main_title = main_title
-                st.session_state.sub_title = sub_title
-                st.session_state.case_info = case_info
-        else:
-            learning_asset = st.session_state.learning_asset
-            learning_evaluate = st.session_state.learning_evaluate
-            main_title = st.session_state.main_title
-            sub_title = st.session_state.sub_title
-            case_info = st.session_state.case_info
-        if isinstance(st.session_state.learning_asset, LearningAsset) and isinstance(st.session_state.learning_evaluate, EvaluationAssetTable) and isinstance(st.session_state.main_title, str) and isinstance(st.session_state.sub_title, str):
-            # 生成 PDF
-            if st.session_state.pdf_buffer is None:
-                asset_elements = learningasset_generator.markdown_to_pdf(learning_asset, main_title, sub_title, case_info)
-                evaluate_elements= learningevaluate_generator.markdown_to_pdf(learning_evaluate)
-
-                st.session_state.pdf_buffer = combine_pdf_buffers(
-                    asset_elements,
-                    evaluate_elements
-                )
-
-            # 生成 DOCX
-            if st.session_state.docx_buffer is None:
-                st.session_state.docx_buffer = generate_combined_docx(learning_asset, learning_evaluate, main_title, sub_title, case_info)
-
-
-            #st.subheader("下載 PDF 版本")
-            export_assets_pdf(st.session_state.pdf_buffer, main_title, sub_title)
-
-            #st.subheader("下載 Word 版本")
-            export_asset_docx(st.session_state.docx_buffer,  main_title, sub_title)
-       
-        if isinstance(learning_asset, LearningAsset):
-            learningasset_generator.render_at_streamlit(learning_asset, case_info)
-        else:
+        cache = get_session_cache()
+        cache_key = result_key(api_key, board_id)
+        result = cache.get(cache_key)
+        # 管理者可用 ?profile=<token> 剖析此次請求（也可用環境變數或抽樣啟用）
+        profile_this = should_profile(st.query_params.get("profile"))
+        with request_profiling(profile_this, label=f"board-{board_id}"):
+            if result is None:
+                # 預先生成或其他分頁已生成過的結果可直接使用
+                result = get_result_cache().get(cache_key)
+                previous = None
+                if result is None:
+                    # 之前生成過、已過期的結果：新版本來不及在時限內完成時先顯示
+                    previous = get_result_cache().get(cache_key, allow_stale=True)
+                if previous is not None and get_refresh_tracker().pending(cache_key):
+                    # 背景已在生成新版本（例如重新整理頁面），不再重複送出
+                    result = dataclasses.replace(previous, stale=True)
+                elif result is None:
+                    # 沒有舊結果可退回時不設時限：降低推理強度、縮短逾時都換不到任何好處
+                    deadline = deadline_after() if previous is not None else None
+                    try:
+                        with st.spinner("正在處理您的請求..."), interactive_activity.track():
+                            # 重跑或關閉分頁時會取消進行中的 LLM 與後端請求；
+                            # 有舊結果可顯示時，逾時後改在背景完成並寫入結果快取
+                            result = SessionResult(
+                                *run_cancellable(
+                                    process_request(api_key, board_id, deadline),
+                                    key=cache_key,
+                                    keep_result=store_result(cache_key)
+                                    if previous is not None
+                                    else keep_abandoned_result(cache_key),
+                                    deadline=deadline,
+                                )
+                            )
+                    except GenerationCancelled:
+                        st.warning("生成已取消，請重新整理頁面再試一次。")
+                        return
+                    except DeadlineExceeded as e:
+                        get_refresh_tracker().track(cache_key, e.job.future)
+                        result = dataclasses.replace(previous, stale=True)
+                    except CircuitOpenError as e:
+                        # 上游異常時不等待逾時：有舊的結果就先顯示，否則直接告知
+                        if previous is None:
+                            st.error(f"服務暫時繁忙或無法連線，請稍後再試。（{e}）")
+                            return
+                        st.warning("服務暫時異常，先顯示之前生成的內容。")
+                        result = dataclasses.replace(previous, stale=True)
+                result = ensure_artifacts(result)
+                if not result.stale:
+                    get_result_cache().put(cache_key, result)
+                # 生成失敗時不快取，下次重跑會再嘗試
+                if result.learning_asset is not None or result.learning_evaluate is not None:
+                    cache.put(cache_key, result)
+
+        if result.stale:
+            # 背景工作可能在顯示舊結果前就已完成，此時 fragment 會立即換上新結果
+            refreshing = get_refresh_tracker().pending(cache_key) or (
+                get_result_cache().get(cache_key) is not None
+            )
+            show_stale_notice(result, refreshing)
+            if refreshing:
+                watch_fresh_result(cache_key)
+        if result.is_complete:
+            # 下載按鈕與結果頁面皆為獨立 fragment，點擊下載不會重跑整頁
+            render_downloads(cache_key)
+            render_series_bundle(
+                api_key, board_id, learningasset_generator, learningevaluate_generator
+            )
+        if cache.get(cache_key) is None:
             st.error("生成學習單時發生錯誤，請檢查API密鑰和版面提示詞ID是否正確。")
-
-        if isinstance(learning_evaluate, EvaluationAssetTable):
-            learningevaluate_generator.render_at_streamlit(learning_evaluate)
-        else:
             st.error("生成評估表時發生錯誤，請檢查API密鑰和版面提示詞ID是否正確。")
+        else:
+            render_result_view(cache_key, learningasset_generator, learningevaluate_generator)
     else:
         st.warning("請通過AAC好教材服務來訪問此頁面，並提供必要的API密鑰和版面提示詞ID。")
 
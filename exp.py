@@ -1,22 +1,16 @@
 import streamlit as st
 import requests
 from openai import OpenAI
-import io
 
-import io
 import os
 
-import markdown
-from bs4 import BeautifulSoup
 from PIL import Image
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
 from streamlit import session_state as state
 
+from aac_assets_generator.markdown_stream import MarkdownStreamConverter, markdown_to_flowables
+from aac_assets_generator.pdf_templates import build_pdf
+from aac_assets_generator.utils import parse_user_data
+
 
 from loguru import logger
 import json
@@ -53,7 +47,8 @@ def get_board_prompt_word_data(api_key, board_id):
     else:
         raise Exception(f"GetBoardPromptWordData API调用失败，状态码 {response.status_code}")
 
-def generate_learning_asset(case_info, learn_assets_contents, prompt, model="gpt-4o-mini"):
+def stream_learning_asset(case_info, learn_assets_contents, prompt, model="gpt-4o-mini"):
+    """逐段回傳模型輸出的 Markdown"""
     full_prompt = prompt.replace("<case_info>", case_info)
     full_prompt = full_prompt.replace("<learn_assets_contents>", learn_assets_contents)
     logger.info(f"full_prompt:{full_prompt}")
@@ -62,115 +57,21 @@ def generate_learning_asset(case_info, learn_assets_contents, prompt, model="gpt
         messages=[
             {"role": "system", "content": full_prompt},
         ],
+        stream=True,
     )
-    return response.choices[0].message.content
-
-def markdown_to_pdf(markdown_text):
-    # Convert Markdown to HTML
-    html = markdown.markdown(markdown_text, extensions=["tables"], output_format="html5")
-    print(html)
-    # Parse HTML
-    soup = BeautifulSoup(html, "html.parser", from_encoding="utf-8")
-
-    # Create PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-
-    # Register fonts
-    pdfmetrics.registerFont(TTFont("NotoSansTC", "NotoSansTC-Regular.ttf"))
-
-    # Create styles
-    styles = getSampleStyleSheet()
-    styles.add(
-        ParagraphStyle(
-            name="CustomStyle", fontName="NotoSansTC", fontSize=12, leading=14, encoding="utf-8"
-        )
-    )
+    for chunk in response:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
-    # Update default styles to use the Chinese font
-    for style in styles.byName.values():
-        style.fontName = "NotoSansTC"
-
-    # Convert HTML elements to ReportLab elements
-    elements = []
-    for element in soup.find_all(["p", "h1", "h2", "h3", "ul", "ol", "li", "table"]):
-        if element.name in ["p", "h1", "h2", "h3"]:
-            style = (
-                "Heading1"
-                if element.name == "h1"
-                else (
-                    "Heading2"
-                    if element.name == "h2"
-                    else "Heading3" if element.name == "h3" else "CustomStyle"
-                )
-            )
-            elements.append(Paragraph(element.text, styles[style]))
-        elif element.name in ["ul", "ol"]:
-            for li in element.find_all("li"):
-                bullet = "• " if element.name == "ul" else f"{len(elements)+1}. "
-                elements.append(Paragraph(f"{bullet}{li.text}", styles["CustomStyle"]))
-        elif element.name == "table":
-            data = []
-            for row in element.find_all("tr"):
-                data.append(
-                    [
-                        Paragraph(cell.text, styles["CustomStyle"])
-                        for cell in row.find_all(["th", "td"])
-                    ]
-                )
-            table = Table(data)
-            table.setStyle(
-                TableStyle(
-                    [
-                        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                        ("FONTNAME", (0, 0), (-1, -1), "NotoSansTC"),
-                        ("FONTSIZE", (0, 0), (-1, -1), 12),
-                        ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
-                        ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-                        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                    ]
-                )
-            )
-            elements.append(table)
+def generate_learning_asset(case_info, learn_assets_contents, prompt, model="gpt-4o-mini"):
+    return "".join(stream_learning_asset(case_info, learn_assets_contents, prompt, model=model))
 
-    # Build PDF
-    doc.build(elements)
+def markdown_to_pdf(markdown_text):
+    # Markdown 直接轉成 ReportLab flowable（不經過 HTML 與 BeautifulSoup）
+    buffer = build_pdf(markdown_to_flowables(markdown_text))
     buffer.seek(0)
     return buffer
 
-def parse_user_data(user_data):
-    def parse_json_field(field):
-        if field:
-            try:
-                return ', '.join(json.loads(field))
-            except json.JSONDecodeError:
-                return field
-        return '未提供'
-
-    name = parse_json_field(user_data.get('name', '未提供'))
-    gender = parse_json_field(user_data.get('gender', '未提供'))
-    disability = parse_json_field(user_data.get('disability', '未提供'))
-    communication_issues = parse_json_field(user_data.get('communication_Issues', '未提供'))
-    communication_methods = parse_json_field(user_data.get('communication_Methods', '未提供'))
-    strengths = parse_json_field(user_data.get('strengths', '未提供'))
-    weaknesses = parse_json_field(user_data.get('weaknesses', '未提供'))
-    teaching_time = user_data.get('teaching_Time', '未提供')
-
-    case_info = f"""
-    姓名: {name}
-    性別: {gender}
-    障礙類別: {disability}
-    溝通問題: {communication_issues}
-    溝通方式: {communication_methods}
-    優勢能力: {strengths}
-    弱勢能力: {weaknesses}
-    預計教學時間: {teaching_time} 分鐘
-    """
-
-    return case_info
-
 SYSTEM_PROMPT = """
 你是一位經驗豐富的特殊教育專家，擁有20年以上的教學經驗和多項特教認證。
 你的任務是根據提供的<個案資料>/<學習單類型> 和<學習單內容>，生成高質量、專業的教案和學習單，格式要與提供的範例結構極為相似。
@@ -269,19 +170,27 @@ def main():
             info = parse_user_data(user_data)
 
             prompt = SYSTEM_PROMPT + prompt_data['promptContent']
-            with st.spinner("正在生成學習單..."):
-                learning_asset = generate_learning_asset(
+            # 邊顯示模型輸出邊轉成 PDF 元素，生成結束時只剩最後一段需要處理
+            converter = MarkdownStreamConverter()
+            elements = []
+
+            def stream_and_convert():
+                for chunk in stream_learning_asset(
                     info,
                     prompt_data['promptContent'],
                     prompt=prompt
-                )
+                ):
+                    elements.extend(converter.feed(chunk))
+                    yield chunk
 
+            st.write_stream(stream_and_convert())
+            elements.extend(converter.close())
             st.success("學習單已生成!")
-            st.markdown(learning_asset)
 
             # 匯出選項
             st.subheader("導出選項")
-            pdf_buffer = markdown_to_pdf(learning_asset)
+            pdf_buffer = build_pdf(elements)
+            pdf_buffer.seek(0)
             st.download_button(
                 label="下載 PDF",
                 data=pdf_buffer,
@@ -0,0 +1,66 @@
+"""量測打包 ZIP 的耗時與 Python 記憶體峰值：峰值應不隨文件數增加
+
+    python -m perf.bench_bundle --counts 5,20,50 --booklet
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from aac_assets_generator.bundle_export import BundleItem, export_bundle
+from aac_assets_generator.generator.learning_asset import LearningAssetGenerator
+from aac_assets_generator.generator.learning_evaluate import LearningEvaluateGenerator
+from aac_assets_generator.session_cache import SessionResult
+from perf.bench_docx import CASE_INFO, build_fixture
+
+
+def fixture_items(count: int, size: int):
+    # 每次產生新的結果物件，模擬逐份從快取或生成流程取出
+    for index in range(count):
+        learning_asset, learning_evaluate = build_fixture(size)
+        yield BundleItem(
+            f"board-{index}",
+            SessionResult(learning_asset, learning_evaluate, "主題", f"單元{index}", CASE_INFO),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ZIP 打包效能與記憶體量測")
+    parser.add_argument("--counts", default="5,20,50", help="以逗號分隔的文件數")
+    parser.add_argument("--size", type=int, default=10, help="每份文件的清單長度")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--booklet", action="store_true", help="同時產生合併的 PDF 手冊")
+    args = parser.parse_args()
+
+    learningasset_generator = LearningAssetGenerator(client=None)
+    learningevaluate_generator = LearningEvaluateGenerator(client=None)
+    print(f"{'docs':>6}{'seconds':>10}{'peak MB':>10}{'zip MB':>10}{'entries':>9}")
+    for count in (int(c) for c in args.counts.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bundle.zip")
+            tracemalloc.start()
+            start = time.perf_counter()
+            export_bundle(
+                fixture_items(count, args.size),
+                path,
+                learningasset_generator,
+                learningevaluate_generator,
+                title="測試系列",
+                booklet=args.booklet,
+                workers=args.workers,
+            )
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with zipfile.ZipFile(path) as bundle:
+                entries = len(bundle.namelist())
+            print(
+                f"{count:>6}{seconds:>10.2f}{peak / 2**20:>10.1f}"
+                f"{os.path.getsize(path) / 2**20:>10.2f}{entries:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""比較兩種 DOCX 產生方式在不同教案/評量規模下的耗時
+
+    python -m perf.bench_docx --sizes 5,20,100,300 --repeat 10
+"""
+import argparse
+import statistics
+import time
+
+from aac_assets_generator import docx_template, utils
+from aac_assets_generator.learning_asset_models import (
+    ActivityGuide,
+    AssessmentMethod,
+    AssessmentQuestion,
+    LearningAsset,
+    LessonPlan,
+    PracticeQuestion,
+    ReflectionQuestion,
+    SelfAssessmentItem,
+    TeachingMethod,
+    TeachingStep,
+    WorksheetSection,
+)
+from aac_assets_generator.learning_evaluation_models import (
+    EvaluationAssetTable,
+    EvaluationItem,
+    ScoreLevelDescriptions,
+)
+
+CASE_INFO = "姓名: 學生\n性別: 男\n障礙類別: 自閉症\n溝通方式: 圖片, 手勢\n預計教學時間: 40分鐘"
+TEXT = "學生在教師引導下練習以圖卡表達需求，並在同儕活動中輪流使用。"
+
+
+def build_fixture(size: int):
+    """size 為教學步驟、練習題與評量項目等清單的長度"""
+    items = range(size)
+    learning_asset = LearningAsset(
+        lesson_plan=LessonPlan(
+            title="測試教案",
+            objectives=TEXT,
+            content=[f"{TEXT}{i}" for i in items],
+            teaching_methods=[TeachingMethod(title=f"方法{i}", explanation=TEXT) for i in items],
+            teaching_steps=[TeachingStep(title=f"步驟{i}", explanation=TEXT) for i in items],
+            assessment_methods=[AssessmentMethod(title=f"評量{i}", explanation=TEXT) for i in items],
+        ),
+        worksheet=WorksheetSection(
+            practice_questions=[PracticeQuestion(question=TEXT) for _ in items],
+            activity_guides=[ActivityGuide(description=TEXT) for _ in items],
+            reflection_questions=[ReflectionQuestion(question=TEXT) for _ in items],
+            assessment_questions=[AssessmentQuestion(question=TEXT) for _ in items],
+            self_assessment_items=[SelfAssessmentItem(item=f"項目{i}") for i in items],
+            collaborative_learning_activity=TEXT,
+        ),
+    )
+    learning_evaluate = EvaluationAssetTable(
+        evaluation_asset_title="評量表",
+        evaluation_items=[
+            EvaluationItem(
+                evaluation_item_title=f"項目{i}",
+                evaluation_metric=TEXT,
+                score_descriptions=ScoreLevelDescriptions(
+                    excellent_with_score_4=TEXT,
+                    good_with_score_3=TEXT,
+                    fair_with_score_2=TEXT,
+                    needs_improvement_with_score_1=TEXT,
+                ),
+            )
+            for i in items
+        ],
+    )
+    return learning_asset, learning_evaluate
+
+
+def _measure(render, fixture, repeat):
+    learning_asset, learning_evaluate = fixture
+    timings, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        docx_file = render(learning_asset, learning_evaluate, "主題", "單元", CASE_INFO)
+        timings.append(time.perf_counter() - start)
+        size = len(docx_file.getvalue())
+    return statistics.median(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DOCX 產生效能比較")
+    parser.add_argument("--sizes", default="5,20,100,300", help="以逗號分隔的清單長度")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    # 範本只在第一次使用時載入，不計入量測
+    docx_template.get_template()
+    engines = [
+        ("python-docx", utils.generate_combined_docx_python_docx),
+        ("template", docx_template.render_combined_docx),
+    ]
+    print(f"{'size':>6}{'python-docx':>14}{'template':>12}{'speedup':>10}{'bytes':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        fixture = build_fixture(size)
+        (baseline, _), (fast, fast_bytes) = (
+            _measure(render, fixture, args.repeat) for _, render in engines
+        )
+        print(
+            f"{size:>6}{baseline * 1000:>12.1f}ms{fast * 1000:>10.1f}ms"
+            f"{baseline / fast:>9.1f}x{fast_bytes:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""比較分兩次呼叫（separate）、一次合併呼叫（joint）與兩階段生成（two_tier）的總 token 數與延遲
+
+    # 對真實服務量測（需設定 OPENAI_API_KEY）
+    python -m perf.bench_joint --boards 5
+    # 本機模擬服務只能反映輸出格式大小與提示詞長度，延遲以每個輸出 token 的耗時近似
+    python -m perf.bench_joint --boards 5 --spawn-fake --seconds-per-token 0.002
+    # 班級情境：每個版面多位學生，two_tier 的 o3 呼叫次數只與版面數成正比
+    python -m perf.bench_joint --boards 3 --students 8 --modes separate,two_tier --spawn-fake
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from loguru import logger
+from openai import AsyncOpenAI
+
+from aac_assets_generator import pipeline
+from aac_assets_generator.generator.learning_asset import LearningAssetGenerator
+from aac_assets_generator.generator.learning_evaluate import LearningEvaluateGenerator
+from aac_assets_generator.metrics import percentile, token_stats
+from aac_assets_generator.two_tier import get_base_asset_cache
+from perf.fake_servers import (
+    FakeServer,
+    LatencyProfile,
+    create_openai_app,
+    fake_prompt_data,
+    fake_user_data,
+)
+
+
+def _token_totals() -> dict:
+    totals = {"prompt": 0, "completion": 0, "reasoning": 0, "calls": 0}
+    for name in token_stats.summary():
+        if name.endswith(":prompt"):
+            kind = "prompt"
+        elif ":reasoning:" in name:
+            kind = "reasoning"
+        else:
+            kind = "completion"
+            totals["calls"] += len(token_stats.samples(name))
+        totals[kind] += sum(token_stats.samples(name))
+    return totals
+
+
+async def run_mode(mode, boards, students, learningasset_generator, learningevaluate_generator):
+    pipeline.GENERATION_MODE = mode
+    token_stats.reset()
+    latencies, failures = [], 0
+    for board_id in range(1, boards + 1):
+        for student in range(students):
+            start = time.perf_counter()
+            learning_asset, learning_evaluate, *_ = await pipeline.generate_board_assets(
+                fake_user_data(f"bench-{mode}-{student}"),
+                fake_prompt_data(str(board_id)),
+                learningasset_generator,
+                learningevaluate_generator,
+            )
+            latencies.append(time.perf_counter() - start)
+            failures += learning_asset is None or learning_evaluate is None
+    return latencies, failures, _token_totals()
+
+
+async def run(args):
+    server = None
+    base_url = args.openai_base_url or os.getenv("OPENAI_BASE_URL")
+    if args.spawn_fake:
+        server = FakeServer(
+            create_openai_app(
+                LatencyProfile(args.openai_latency, sigma=0.0),
+                seconds_per_token=args.seconds_per_token,
+            )
+        )
+        base_url = await server.start() + "/v1"
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY", "bench"), base_url=base_url)
+    learningasset_generator = LearningAssetGenerator(client=client)
+    learningevaluate_generator = LearningEvaluateGenerator(client=client)
+
+    requests = args.boards * args.students
+    print(
+        f"{'mode':<10}{'ok':>4}{'calls':>7}{'p50':>9}{'p95':>9}"
+        f"{'prompt':>10}{'output':>10}{'reasoning':>11}{'total':>10}"
+    )
+    try:
+        for mode in args.modes.split(","):
+            latencies, failures, totals = await run_mode(
+                mode,
+                args.boards,
+                args.students,
+                learningasset_generator,
+                learningevaluate_generator,
+            )
+            per_request = {kind: value / requests for kind, value in totals.items()}
+            print(
+                f"{mode:<10}{requests - failures:>4}{totals['calls']:>7}"
+                f"{statistics.median(latencies):>8.1f}s{percentile(latencies, 0.95):>8.1f}s"
+                f"{per_request['prompt']:>10.0f}{per_request['completion']:>10.0f}"
+                f"{per_request['reasoning']:>11.0f}"
+                f"{per_request['prompt'] + per_request['completion']:>10.0f}"
+            )
+    finally:
+        if server is not None:
+            await server.stop()
+    print("token 數為每個請求的平均；output 已包含 reasoning")
+    print(f"通用教材快取: {get_base_asset_cache().metrics()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分開生成與合併生成的比較")
+    parser.add_argument("--boards", type=int, default=5, help="每種模式生成的版面數")
+    parser.add_argument("--students", type=int, default=1, help="每個版面的學生數")
+    parser.add_argument("--modes", default="separate,joint,two_tier")
+    parser.add_argument("--openai-base-url", default=None)
+    parser.add_argument("--spawn-fake", action="store_true", help="在本機啟動模擬 OpenAI 服務")
+    parser.add_argument("--openai-latency", type=float, default=1.0, help="模擬服務的固定延遲")
+    parser.add_argument("--seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(lambda message: print(message, end=""), level=args.log_level)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""比較 SDK parse() 與快速路徑處理一次 structured output 回應的本機耗時（不含網路）
+
+    python -m perf.bench_parse --sizes 5,20,100 --repeat 200
+
+sdk：每次重新產生 strict schema、建立 ChatCompletion、以 SDK 解析並把整個回應轉成字串寫入日誌；
+fast：使用快取的 schema，外層 JSON 解析一次，內容以 pydantic 驗證器一次完成解析與驗證。
+"""
+import argparse
+import json
+import statistics
+import time
+
+from openai.lib._parsing._completions import parse_chat_completion, type_to_response_format_param
+from openai.types.chat import ChatCompletion
+
+from aac_assets_generator.learning_asset_models import LearningAsset
+from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+from aac_assets_generator.serialization import model_to_json
+from aac_assets_generator.structured_output import (
+    StructuredResult,
+    _validate_content,
+    response_format_param,
+)
+from aac_assets_generator.wire_models import to_wire, wire_format_for
+from perf.bench_docx import build_fixture
+
+
+def response_bytes(content: str) -> bytes:
+    return json.dumps(
+        {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "o3",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content, "refusal": None},
+                }
+            ],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+def sdk_path(response_format, body: bytes):
+    type_to_response_format_param(response_format)
+    completion = ChatCompletion.model_validate(json.loads(body))
+    parsed = parse_chat_completion(
+        response_format=response_format, input_tools=[], chat_completion=completion
+    )
+    # 舊流程會以 logger.info(f"response:{completion}") 記錄整個回應
+    str(parsed)
+    return parsed.choices[0].message.parsed
+
+
+def fast_path(response_format, body: bytes):
+    response_format_param(response_format)
+    result = _validate_content(response_format, StructuredResult(json.loads(body)))
+    return result.parsed
+
+
+def _measure(fn, response_format, body, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert fn(response_format, body) is not None
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="structured output 解析耗時量測")
+    parser.add_argument("--sizes", default="5,20,100", help="以逗號分隔的清單長度")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'format':<28}{'size':>6}{'bytes':>9}{'sdk':>10}{'fast':>10}{'speedup':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        learning_asset, learning_evaluate = build_fixture(size)
+        for model_cls, value in (
+            (LearningAsset, learning_asset),
+            (EvaluationAssetTable, learning_evaluate),
+        ):
+            response_format = wire_format_for(model_cls)
+            body = response_bytes(model_to_json(to_wire(model_cls, value)))
+            sdk_ms = _measure(sdk_path, response_format, body, args.repeat)
+            fast_ms = _measure(fast_path, response_format, body, args.repeat)
+            print(
+                f"{response_format.__name__:<28}{size:>6}{len(body):>9}"
+                f"{sdk_ms:>8.3f}ms{fast_ms:>8.3f}ms{sdk_ms / fast_ms:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
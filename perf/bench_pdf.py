@@ -0,0 +1,52 @@
+"""量測 PDF 排版耗時：第一份（含字型與固定段落初始化）與批次產生時的每份耗時
+
+    python -m perf.bench_pdf --sizes 5,10,20 --batch 50
+    # 長清單：檢查耗時是否隨清單長度大致線性成長（ms/row 應大致持平）且不會排版失敗
+    python -m perf.bench_pdf --sizes 5,20,50,100,200,500 --batch 3
+"""
+import argparse
+import statistics
+import time
+
+from aac_assets_generator import utils
+from aac_assets_generator.generator.learning_asset import LearningAssetGenerator
+from aac_assets_generator.generator.learning_evaluate import LearningEvaluateGenerator
+from perf.bench_docx import CASE_INFO, build_fixture
+
+
+def render_pdf(learningasset_generator, learningevaluate_generator, fixture):
+    learning_asset, learning_evaluate = fixture
+    asset_elements = learningasset_generator.markdown_to_pdf(
+        learning_asset, "主題", "單元", CASE_INFO
+    )
+    evaluate_elements = learningevaluate_generator.markdown_to_pdf(learning_evaluate)
+    return utils.combine_pdf_buffers(asset_elements, evaluate_elements, title="主題-單元")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 排版效能量測")
+    parser.add_argument("--sizes", default="5,20,50,100,200,500", help="以逗號分隔的清單長度")
+    parser.add_argument("--batch", type=int, default=5, help="每種規模連續產生的份數")
+    args = parser.parse_args()
+
+    learningasset_generator = LearningAssetGenerator(client=None)
+    learningevaluate_generator = LearningEvaluateGenerator(client=None)
+    print(f"{'size':>6}{'first':>10}{'p50':>10}{'p95':>10}{'bytes':>10}{'ms/row':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        fixture = build_fixture(size)
+        timings, pdf_bytes = [], 0
+        for _ in range(args.batch):
+            start = time.perf_counter()
+            buffer = render_pdf(learningasset_generator, learningevaluate_generator, fixture)
+            timings.append(time.perf_counter() - start)
+            pdf_bytes = len(buffer.getvalue())
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        print(
+            f"{size:>6}{timings[0] * 1000:>8.1f}ms{statistics.median(timings) * 1000:>8.1f}ms"
+            f"{p95 * 1000:>8.1f}ms{pdf_bytes:>10}"
+            f"{statistics.median(timings) * 1000 / size:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""比較逐筆 parse_user_data 與批次匯入（Roster）的耗時，並列出分組後需要生成的次數
+
+    python -m perf.bench_roster --students 1000,10000 --accounts 300
+"""
+import argparse
+import time
+
+from aac_assets_generator.roster import Roster
+from aac_assets_generator.utils import parse_user_data
+from perf.fake_servers import fake_user_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="名單匯入效能量測")
+    parser.add_argument("--students", default="1000,10000", help="以逗號分隔的名單大小")
+    parser.add_argument(
+        "--accounts", type=int, default=300, help="不同的假資料來源數（越少重複的個案特徵越多）"
+    )
+    args = parser.parse_args()
+
+    print(f"{'students':>9}{'per-record':>12}{'roster':>10}{'profiles':>10}{'speedup':>9}")
+    for count in (int(c) for c in args.students.split(",")):
+        records = [fake_user_data(f"bench-{i % args.accounts}") for i in range(count)]
+        start = time.perf_counter()
+        expected = [parse_user_data(record) for record in records]
+        per_record = time.perf_counter() - start
+        start = time.perf_counter()
+        roster = Roster.from_records(records, drop_duplicates=False)
+        bulk = time.perf_counter() - start
+        assert list(roster.frame["case_info"]) == expected
+        print(
+            f"{count:>9}{per_record * 1000:>10.1f}ms{bulk * 1000:>8.1f}ms"
+            f"{roster.metrics()['unique_profiles']:>10}{per_record / bulk:>8.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
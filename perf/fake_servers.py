@@ -0,0 +1,251 @@
+"""本機模擬的 AAC 後端與 OpenAI chat-completions 服務，供壓力測試使用
+
+    python -m perf.fake_servers --backend-port 8081 --openai-port 8082 --openai-latency 20
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from typing import List, NamedTuple, Optional
+
+from aiohttp import web
+
+COMMUNICATION_METHODS = [
+    "眼睛凝視", "聲音", "手語", "照片", "書寫／打字", "臉部表情", "聲調抑揚頓挫", "口語",
+    "圖片", "語音溝通器", "肢體動作", "手勢", "實物", "字卡",
+]
+SERIES = ["生活自理", "社交溝通", "休閒娛樂", "職業教育", "居家生活"]
+
+
+class LatencyProfile(NamedTuple):
+    """對數常態延遲（中位數，秒）與錯誤率"""
+
+    median: float
+    sigma: float = 0.5
+    error_rate: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+def _seed(*parts) -> int:
+    return int(hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def fake_user_data(api_key: str) -> dict:
+    rng = random.Random(_seed("user", api_key))
+    return {
+        "id": rng.randint(1, 10000),
+        "name": json.dumps([f"測試學生{rng.randint(1, 999)}"], ensure_ascii=False),
+        "gender": json.dumps([rng.choice(["男", "女"])], ensure_ascii=False),
+        "disability": json.dumps(rng.sample(["自閉症", "智能障礙", "肢體障礙"], 2), ensure_ascii=False),
+        "communication_Issues": json.dumps(["表達困難"], ensure_ascii=False),
+        "communication_Methods": json.dumps(rng.sample(COMMUNICATION_METHODS, 2), ensure_ascii=False),
+        "strengths": json.dumps(["視覺辨識"], ensure_ascii=False),
+        "weaknesses": json.dumps(["注意力短暫"], ensure_ascii=False),
+        "teaching_Time": json.dumps(["40"]),
+        "userAccount": f"user-{_seed('account', api_key) % 100000}",
+    }
+
+
+def fake_prompt_data(board_id: str) -> dict:
+    try:
+        number = int(board_id)
+    except (TypeError, ValueError):
+        number = _seed("board", board_id) % 1000
+    # 每 10 個連號版面屬於同一系列，方便測試預取
+    series = SERIES[(number // 10) % len(SERIES)]
+    title = f"單元{number}"
+    return {
+        "promptTitle": title,
+        "promptContent": f"這是{series}系列的{title}學習單，請設計相關的教學活動。",
+    }
+
+
+def fake_instance(schema: dict, defs: dict, rng: random.Random, text_chars: int, list_items: int):
+    """依 JSON schema 產生一份合法的假資料"""
+    if "$ref" in schema:
+        return fake_instance(defs[schema["$ref"].split("/")[-1]], defs, rng, text_chars, list_items)
+    if "anyOf" in schema:
+        return fake_instance(schema["anyOf"][0], defs, rng, text_chars, list_items)
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        return {
+            name: fake_instance(prop, defs, rng, text_chars, list_items)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [
+            fake_instance(schema["items"], defs, rng, text_chars, list_items)
+            for _ in range(list_items)
+        ]
+    if schema_type == "integer":
+        return rng.randint(1, 4)
+    if schema_type == "number":
+        return rng.random()
+    if schema_type == "boolean":
+        return True
+    if schema_type == "null":
+        return None
+    return "".join(rng.choice("學習活動教師引導學生練習溝通表達觀察") for _ in range(text_chars))
+
+
+class FakeServer:
+    def __init__(self, app: web.Application):
+        self.app = app
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def create_backend_app(latency: LatencyProfile, shapes: Optional[List[dict]] = None, seed=0):
+    """模擬 GetUserStudySheetData / GetBoardPromptWordData
+
+    shapes 為從 app.log 擷取的請求樣貌（user_data 與 prompt_data），有提供時輪流回放。
+    """
+    rng = random.Random(seed)
+
+    async def _delay_or_fail():
+        await asyncio.sleep(latency.sample(rng))
+        if rng.random() < latency.error_rate:
+            raise web.HTTPInternalServerError(text="fake backend error")
+
+    def _shape(key: str):
+        return shapes[_seed(key) % len(shapes)] if shapes else None
+
+    async def user_study_sheet(request):
+        await _delay_or_fail()
+        api_key = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        shape = _shape(api_key)
+        return web.json_response(shape["user_data"] if shape else fake_user_data(api_key))
+
+    async def board_prompt_word(request):
+        await _delay_or_fail()
+        body = await request.text()
+        board_id = str(json.loads(body).get("ID", "")) if body else ""
+        shape = _shape(board_id)
+        return web.json_response(shape["prompt_data"] if shape else fake_prompt_data(board_id))
+
+    app = web.Application()
+    app.router.add_get("/api/WebAAC/GetUserStudySheetData", user_study_sheet)
+    app.router.add_get("/api/WebAAC/GetBoardPromptWordData", board_prompt_word)
+    return app
+
+
+def create_openai_app(
+    latency: LatencyProfile,
+    text_chars: int = 40,
+    list_items: int = 4,
+    seed=0,
+    seconds_per_token: float = 0.0,
+):
+    """模擬 chat-completions 的 structured output 回應
+
+    seconds_per_token 大於 0 時，延遲另加上與輸出 token 數成正比的生成時間。
+    """
+    rng = random.Random(seed)
+    counter = {"n": 0}
+
+    async def chat_completions(request):
+        payload = await request.json()
+        delay = latency.sample(rng)
+        if rng.random() < latency.error_rate:
+            await asyncio.sleep(delay)
+            status = rng.choice([429, 500])
+            return web.json_response(
+                {"error": {"message": "fake upstream error", "type": "server_error"}},
+                status=status,
+            )
+
+        response_format = payload.get("response_format") or {}
+        json_schema = response_format.get("json_schema", {}).get("schema")
+        if json_schema:
+            content = json.dumps(
+                fake_instance(json_schema, json_schema.get("$defs", {}), rng, text_chars, list_items),
+                ensure_ascii=False,
+            )
+        else:
+            content = "# 教案\n\n" + "學習活動內容。" * text_chars
+
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+        completion_tokens = len(content)
+        await asyncio.sleep(delay + completion_tokens * seconds_per_token)
+        counter["n"] += 1
+        return web.json_response(
+            {
+                "id": f"chatcmpl-fake-{counter['n']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": payload.get("model", "o3"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content, "refusal": None},
+                        "finish_reason": "stop",
+                        "logprobs": None,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_chars,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_chars + completion_tokens,
+                    "completion_tokens_details": {"reasoning_tokens": completion_tokens // 2},
+                },
+            }
+        )
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/chat/completions", chat_completions)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="啟動模擬的 AAC 後端與 OpenAI 服務")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--backend-port", type=int, default=8081)
+    parser.add_argument("--openai-port", type=int, default=8082)
+    parser.add_argument("--backend-latency", type=float, default=0.2, help="中位數延遲（秒）")
+    parser.add_argument("--backend-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-latency", type=float, default=20.0, help="中位數延遲（秒）")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--sigma", type=float, default=0.5, help="對數常態分布的 sigma")
+    args = parser.parse_args()
+
+    async def serve():
+        backend = FakeServer(
+            create_backend_app(
+                LatencyProfile(args.backend_latency, args.sigma, args.backend_error_rate)
+            )
+        )
+        openai_server = FakeServer(
+            create_openai_app(
+                LatencyProfile(args.openai_latency, args.sigma, args.openai_error_rate)
+            )
+        )
+        print("AAC_BACKEND_URL=" + await backend.start(args.host, args.backend_port))
+        print("OPENAI_BASE_URL=" + await openai_server.start(args.host, args.openai_port) + "/v1")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""以 N 個並行虛擬使用者驅動 process_request 與 PDF/DOCX 排版，回報各階段延遲
+
+    # 自動啟動本機模擬服務
+    python -m perf.loadtest --users 20 --requests-per-user 3 --spawn-fakes --openai-latency 2
+    # 回放 app.log 中的請求樣貌
+    python -m perf.loadtest --users 10 --spawn-fakes --replay app.log
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+
+from loguru import logger
+from openai import AsyncOpenAI
+
+from aac_assets_generator import pipeline, utils
+from aac_assets_generator.circuit_breaker import CircuitOpenError, breaker_metrics
+from aac_assets_generator.generator.learning_asset import LearningAssetGenerator
+from aac_assets_generator.generator.learning_evaluate import LearningEvaluateGenerator
+from aac_assets_generator.metrics import parse_stats, stage_stats, stage_timer, token_stats
+from aac_assets_generator.scheduler import FairScheduler
+from perf.fake_servers import FakeServer, LatencyProfile, create_backend_app, create_openai_app
+
+FONT_PATH = "NotoSansTC-Regular.ttf"
+
+_LOG_ENTRY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d+ \|", re.MULTILINE)
+_CASE_FIELDS = {
+    "姓名": "name",
+    "性別": "gender",
+    "障礙類別": "disability",
+    "溝通問題": "communication_Issues",
+    "溝通方式": "communication_Methods",
+    "優勢能力": "strengths",
+    "弱勢能力": "weaknesses",
+}
+
+
+def _case_info_to_user_data(case_info: str) -> dict:
+    user_data = {}
+    for line in case_info.split("\n"):
+        label, _, value = line.strip().partition(": ")
+        if label in _CASE_FIELDS:
+            values = [] if value == "未提供" else value.split(", ")
+            user_data[_CASE_FIELDS[label]] = json.dumps(values, ensure_ascii=False)
+        elif label == "預計教學時間":
+            user_data["teaching_Time"] = json.dumps([value.replace("分鐘", "").strip()])
+    return user_data
+
+
+def load_shapes_from_log(path: str) -> list:
+    """從 app.log 的 full_prompt 紀錄還原個案資料與版面內容"""
+    with open(path, encoding="utf-8") as log_file:
+        text = log_file.read()
+
+    shapes, seen = [], set()
+    starts = [m.start() for m in _LOG_ENTRY_PATTERN.finditer(text)] + [len(text)]
+    for start, end in zip(starts, starts[1:]):
+        entry = text[start:end]
+        if "full_prompt:" not in entry or "<學習單內容>:" not in entry:
+            continue
+        case_part = entry.split("<個案資料>:", 1)[1].split("<學習單內容>:", 1)[0]
+        contents = entry.split("<學習單內容>:", 1)[1].split("\n---", 1)[0].strip()
+        key = (case_part.strip(), contents)
+        if key in seen:
+            continue
+        seen.add(key)
+        shapes.append(
+            {
+                "user_data": _case_info_to_user_data(case_part),
+                "prompt_data": {"promptTitle": f"回放{len(shapes) + 1}", "promptContent": contents},
+            }
+        )
+    return shapes
+
+
+def _render(learningasset_generator, learningevaluate_generator, result):
+    learning_asset, learning_evaluate, main_title, sub_title, case_info = result
+    if learning_asset is None or learning_evaluate is None:
+        return
+    if os.path.exists(FONT_PATH):
+        with stage_timer("pdf_render"):
+            asset_elements = learningasset_generator.markdown_to_pdf(
+                learning_asset, main_title, sub_title, case_info
+            )
+            evaluate_elements = learningevaluate_generator.markdown_to_pdf(learning_evaluate)
+            utils.combine_pdf_buffers(
+                asset_elements, evaluate_elements, title=f"{main_title}-{sub_title}"
+            )
+    with stage_timer("docx_render"):
+        utils.generate_combined_docx(
+            learning_asset, learning_evaluate, main_title, sub_title, case_info
+        )
+
+
+async def virtual_user(user_index, args, learningasset_generator, learningevaluate_generator):
+    rng = random.Random(user_index)
+    api_key = f"loadtest-user-{user_index}"
+    for _ in range(args.requests_per_user):
+        board_id = str(rng.randint(1, args.boards))
+        with stage_timer("end_to_end"):
+            try:
+                with stage_timer("process_request"):
+                    result = await pipeline.process_request(
+                        api_key, board_id, learningasset_generator, learningevaluate_generator
+                    )
+            except CircuitOpenError:
+                # 斷路中的請求立即失敗，這裡的耗時即介面回應錯誤訊息的時間
+                stage_stats.record("circuit_open", 0.0, ok=False)
+                continue
+            if result[0] is None or result[1] is None:
+                stage_stats.record("failed_requests", 0.0, ok=False)
+            elif not args.no_render:
+                # Streamlit 的排版在 script 執行緒中進行，這裡以執行緒模擬
+                await asyncio.to_thread(
+                    _render, learningasset_generator, learningevaluate_generator, result
+                )
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1.0 / args.think_time))
+
+
+def print_report(elapsed: float, completed: int):
+    print(f"\n總耗時 {elapsed:.1f} 秒，完成 {completed} 個請求，吞吐量 {completed / elapsed:.2f} req/s")
+    print(f"{'stage':<20}{'count':>8}{'errors':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, stats in sorted(stage_stats.summary().items()):
+        print(
+            f"{stage:<20}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}"
+        )
+    for response_format, stats in sorted(token_stats.summary().items()):
+        print(
+            f"{'tokens:' + response_format:<20}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats['p50']:>10.0f}{stats['p95']:>10.0f}{stats['p99']:>10.0f}"
+        )
+    for response_format, stats in sorted(parse_stats.summary().items()):
+        print(
+            f"{'parse:' + response_format:<20}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats['p50']:>10.4f}{stats['p95']:>10.4f}{stats['p99']:>10.4f}"
+        )
+    print(f"斷路器: {breaker_metrics()}")
+
+
+async def run(args):
+    servers = []
+    backend_url = args.backend_url or utils.AAC_BACKEND_URL
+    openai_base_url = args.openai_base_url or os.getenv("OPENAI_BASE_URL")
+    if args.spawn_fakes:
+        shapes = load_shapes_from_log(args.replay) if args.replay else None
+        if shapes is not None:
+            logger.info(f"從 {args.replay} 載入 {len(shapes)} 種請求樣貌")
+        backend = FakeServer(
+            create_backend_app(
+                LatencyProfile(args.backend_latency, args.sigma, args.backend_error_rate), shapes
+            )
+        )
+        openai_server = FakeServer(
+            create_openai_app(
+                LatencyProfile(args.openai_latency, args.sigma, args.openai_error_rate)
+            )
+        )
+        backend_url = await backend.start()
+        openai_base_url = await openai_server.start() + "/v1"
+        servers = [backend, openai_server]
+
+    utils.AAC_BACKEND_URL = backend_url
+    client = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY", "loadtest"), base_url=openai_base_url
+    )
+    scheduler = FairScheduler(max_concurrency=args.llm_concurrency)
+    learningasset_generator = LearningAssetGenerator(client=client, scheduler=scheduler)
+    learningevaluate_generator = LearningEvaluateGenerator(client=client, scheduler=scheduler)
+
+    stage_stats.reset()
+    token_stats.reset()
+    parse_stats.reset()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(
+            *(
+                virtual_user(i, args, learningasset_generator, learningevaluate_generator)
+                for i in range(args.users)
+            )
+        )
+    finally:
+        for server in servers:
+            await server.stop()
+    elapsed = time.perf_counter() - start
+    print_report(elapsed, len(stage_stats.samples("end_to_end")))
+    print(f"排程器狀態: {json.dumps(scheduler.metrics(), ensure_ascii=False)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AAC 學習單生成服務壓力測試")
+    parser.add_argument("--users", type=int, default=10, help="並行虛擬使用者數")
+    parser.add_argument("--requests-per-user", type=int, default=1)
+    parser.add_argument("--boards", type=int, default=50, help="隨機選取的版面 ID 範圍")
+    parser.add_argument("--think-time", type=float, default=0.0, help="請求間平均間隔（秒）")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--no-render", action="store_true", help="不執行 PDF/DOCX 排版")
+    parser.add_argument("--backend-url", default=None)
+    parser.add_argument("--openai-base-url", default=None)
+    parser.add_argument("--spawn-fakes", action="store_true", help="在本機啟動模擬服務")
+    parser.add_argument("--replay", default=None, help="從 app.log 回放請求樣貌")
+    parser.add_argument("--backend-latency", type=float, default=0.2)
+    parser.add_argument("--backend-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-latency", type=float, default=5.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(lambda message: print(message, end=""), level=args.log_level)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
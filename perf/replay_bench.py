@@ -0,0 +1,106 @@
+"""以錄製檔離線重播完整流程（process_request → PDF/DOCX），得到可重現的基準數據
+
+    # 錄製（對真實服務，或加上 --spawn-fakes 對本機模擬服務）
+    python -m perf.replay_bench record --cassette fixtures/run.json --api-key KEY --boards 12,13
+    # 重播：--time-scale 1 重現原始延遲，0 只量測本機 CPU 時間
+    python -m perf.replay_bench replay --cassette fixtures/run.json --iterations 5 --time-scale 0
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from loguru import logger
+from openai import AsyncOpenAI
+
+from aac_assets_generator import pipeline, recording, utils
+from aac_assets_generator.generator.learning_asset import LearningAssetGenerator
+from aac_assets_generator.generator.learning_evaluate import LearningEvaluateGenerator
+from aac_assets_generator.metrics import stage_stats, stage_timer
+from perf.fake_servers import FakeServer, LatencyProfile, create_backend_app, create_openai_app
+from perf.loadtest import FONT_PATH, print_report
+
+
+def _render(learningasset_generator, learningevaluate_generator, result):
+    learning_asset, learning_evaluate, main_title, sub_title, case_info = result
+    if os.path.exists(FONT_PATH):
+        with stage_timer("pdf_render"):
+            asset_elements = learningasset_generator.markdown_to_pdf(
+                learning_asset, main_title, sub_title, case_info
+            )
+            evaluate_elements = learningevaluate_generator.markdown_to_pdf(learning_evaluate)
+            utils.combine_pdf_buffers(
+                asset_elements, evaluate_elements, title=f"{main_title}-{sub_title}"
+            )
+    with stage_timer("docx_render"):
+        utils.generate_combined_docx(
+            learning_asset, learning_evaluate, main_title, sub_title, case_info
+        )
+
+
+async def run_pipeline(client, api_key, board_ids, iterations):
+    learningasset_generator = LearningAssetGenerator(client=client)
+    learningevaluate_generator = LearningEvaluateGenerator(client=client)
+    completed = 0
+    for _ in range(iterations):
+        for board_id in board_ids:
+            with stage_timer("end_to_end"):
+                result = await pipeline.process_request(
+                    api_key, board_id, learningasset_generator, learningevaluate_generator
+                )
+                if result[0] is None or result[1] is None:
+                    logger.error(f"版面 {board_id} 重播失敗")
+                    continue
+                _render(learningasset_generator, learningevaluate_generator, result)
+            completed += 1
+    return completed
+
+
+async def record(args):
+    servers = []
+    if args.spawn_fakes:
+        backend = FakeServer(create_backend_app(LatencyProfile(0.05)))
+        openai_server = FakeServer(create_openai_app(LatencyProfile(0.5)))
+        utils.AAC_BACKEND_URL = await backend.start()
+        os.environ["OPENAI_BASE_URL"] = await openai_server.start() + "/v1"
+        servers = [backend, openai_server]
+
+    cassette, http_client = recording.install("record", args.cassette)
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY", "fake"), http_client=http_client)
+    try:
+        await run_pipeline(client, args.api_key, args.boards.split(","), 1)
+    finally:
+        cassette.save()
+        for server in servers:
+            await server.stop()
+
+
+async def replay(args):
+    cassette, http_client = recording.install("replay", args.cassette, args.time_scale)
+    client = AsyncOpenAI(api_key="replay", http_client=http_client, max_retries=0)
+    board_ids = args.boards.split(",") if args.boards else cassette.board_ids()
+    stage_stats.reset()
+    start = time.perf_counter()
+    completed = await run_pipeline(client, args.api_key, board_ids, args.iterations)
+    print_report(time.perf_counter() - start, completed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="錄製/重播完整生成流程的基準測試")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--cassette", default=recording.CASSETTE_PATH)
+    parser.add_argument("--api-key", default="replay")
+    parser.add_argument("--boards", default="", help="以逗號分隔的版面 ID；重播時預設為錄製檔中的版面")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--spawn-fakes", action="store_true", help="錄製本機模擬服務（示範用）")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(lambda message: print(message, end=""), level=args.log_level)
+    asyncio.run(record(args) if args.mode == "record" else replay(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""比較公開模型與精簡格式的輸出 token 數，並確認轉換無損
+
+    python -m perf.wire_tokens --sizes 3,5,10,20
+"""
+import argparse
+
+from aac_assets_generator.learning_asset_models import LearningAsset
+from aac_assets_generator.learning_evaluation_models import EvaluationAssetTable
+from aac_assets_generator.prompt_builder import estimate_tokens
+from aac_assets_generator.serialization import model_to_json
+from aac_assets_generator.wire_models import WIRE_FORMATS
+from perf.bench_docx import build_fixture
+
+
+def main():
+    parser = argparse.ArgumentParser(description="精簡輸出格式的 token 量測")
+    parser.add_argument("--sizes", default="3,5,10,20", help="以逗號分隔的清單長度")
+    args = parser.parse_args()
+
+    print(f"{'model':<22}{'size':>6}{'public':>10}{'wire':>10}{'saved':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        for model_cls, public in zip((LearningAsset, EvaluationAssetTable), build_fixture(size)):
+            _, from_wire, to_wire = WIRE_FORMATS[model_cls]
+            wire = to_wire(public)
+            if from_wire(wire) != public:
+                raise AssertionError(f"{model_cls.__name__} 轉換前後不一致（size={size}）")
+            public_tokens = estimate_tokens(model_to_json(public))
+            wire_tokens = estimate_tokens(model_to_json(wire))
+            print(
+                f"{model_cls.__name__:<22}{size:>6}{public_tokens:>10}{wire_tokens:>10}"
+                f"{1 - wire_tokens / public_tokens:>9.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import time
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from aac_assets_generator import pipeline
+from aac_assets_generator.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+from aac_assets_generator.result_cache import get_result_cache
+from aac_assets_generator.session_cache import SessionResult, result_key
+from perf.bench_docx import CASE_INFO, build_fixture
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app.py")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class UpstreamError(Exception):
+    pass
+
+
+def _breaker(clock):
+    return CircuitBreaker(
+        "test",
+        slow_call_seconds=10,
+        window=60,
+        min_calls=2,
+        error_rate=0.5,
+        slow_rate=0.8,
+        open_seconds=30,
+        half_open_probes=1,
+        clock=clock,
+    )
+
+
+def _call(breaker, clock, fail=False, seconds=0.0):
+    async def call():
+        async with breaker.guard():
+            clock.advance(seconds)
+            if fail:
+                raise UpstreamError()
+
+    try:
+        asyncio.run(call())
+    except UpstreamError:
+        pass
+
+
+def test_breaker_opens_then_recovers_through_half_open():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _call(breaker, clock, fail=True)
+    assert breaker.state == CLOSED
+    _call(breaker, clock, fail=True)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.check()
+    assert excinfo.value.retry_after == 30
+    clock.advance(29)
+    with pytest.raises(CircuitOpenError):
+        _call(breaker, clock)
+
+    clock.advance(1)
+    breaker.check()
+    _call(breaker, clock)
+    assert breaker.state == CLOSED
+    assert breaker.metrics()["calls"] == 0
+    assert breaker.metrics()["rejected"] == 2
+
+
+def test_failed_probe_reopens_breaker():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _call(breaker, clock, fail=True)
+    _call(breaker, clock, fail=True)
+    clock.advance(30)
+
+    _call(breaker, clock, fail=True)
+
+    assert breaker.state == OPEN
+    # 重新計時：再等完整的 open_seconds 才放行下一個試探
+    clock.advance(29)
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_half_open_admits_limited_probes():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _call(breaker, clock, fail=True)
+    _call(breaker, clock, fail=True)
+    clock.advance(30)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def probe():
+            async with breaker.guard():
+                await release.wait()
+
+        task = asyncio.create_task(probe())
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            async with breaker.guard():
+                pass
+        release.set()
+        await task
+
+    asyncio.run(scenario())
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_open_breaker():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _call(breaker, clock, seconds=11)
+    _call(breaker, clock, seconds=11)
+    assert breaker.state == OPEN
+
+
+def test_window_forgets_old_failures():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    _call(breaker, clock, fail=True)
+    clock.advance(61)
+    _call(breaker, clock, fail=True)
+    assert breaker.state == CLOSED
+
+
+@pytest.fixture
+def circuit_open(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+    async def process_request(*args, **kwargs):
+        raise CircuitOpenError("openai", 12)
+
+    monkeypatch.setattr(pipeline, "process_request", process_request)
+
+
+def _app(api_key, board_id):
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.query_params["apiKey"] = api_key
+    app.query_params["boardId"] = board_id
+    return app.run()
+
+
+def test_app_reports_open_circuit_without_previous_result(circuit_open):
+    app = _app("breaker-key-1", "101")
+
+    assert not app.exception
+    assert len(app.error) == 1
+    assert "服務暫時繁忙" in app.error[0].value
+    assert "openai" in app.error[0].value
+
+
+def test_app_falls_back_to_previous_result_when_circuit_open(circuit_open):
+    api_key, board_id = "breaker-key-2", "102"
+    learning_asset, learning_evaluate = build_fixture(2)
+    previous = SessionResult(learning_asset, learning_evaluate, "主題", "單元102", CASE_INFO)
+    # 檔案已在 ArtifactStore 中，測試不需要排版 PDF 用的字型
+    previous.pdf_bytes = b"%PDF-1.4 previous"
+    previous.docx_bytes = b"PK previous"
+    cache = get_result_cache()
+    # 已過期的結果：只在上游異常時當作備用內容
+    with cache._lock:
+        cache._remember(result_key(api_key, board_id), (time.monotonic() - cache.ttl - 1, previous))
+
+    app = _app(api_key, board_id)
+
+    assert not app.exception
+    assert not app.error
+    assert any("服務暫時異常" in warning.value for warning in app.warning)
+    assert any("舊版本" in info.value for info in app.info)
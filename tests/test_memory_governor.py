@@ -0,0 +1,82 @@
+import pytest
+
+from aac_assets_generator import memory_governor
+from aac_assets_generator.memory_governor import ArtifactStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(memory_governor, "time", clock)
+    return clock
+
+
+def _store(tmp_path, memory_cap, idle_seconds=60):
+    return ArtifactStore(
+        directory=str(tmp_path), memory_cap=memory_cap, idle_seconds=idle_seconds, disk_ttl=3600
+    )
+
+
+def test_put_spills_to_disk_beyond_cap(tmp_path, clock):
+    store = _store(tmp_path, memory_cap=150)
+    handles = [store.put(bytes([i]) * 60) for i in range(3)]
+
+    metrics = store.metrics()
+    assert metrics["resident_artifact_bytes"] <= 150
+    assert metrics["resident_artifacts"] == 2
+    assert metrics["spilled_total"] == 1
+    # 釋放的只是記憶體中的複本，磁碟上仍在
+    assert all((tmp_path / handle).exists() for handle in handles)
+    assert all(store.contains(handle) for handle in handles)
+
+
+def test_idle_session_is_evicted_before_older_active_one(tmp_path, clock):
+    store = _store(tmp_path, memory_cap=250, idle_seconds=60)
+    active = store.put(b"a" * 100)
+    idle = store.put(b"b" * 100)
+    store.touch_session("idle", [idle])
+    clock.advance(120)
+    store.touch_session("active", [active])
+
+    newest = store.put(b"c" * 100)
+
+    # 依最近使用順序 active 較舊，但閒置 session 的檔案先釋放
+    resident = set(store._hot)
+    assert resident == {active, newest}
+    metrics = store.metrics()
+    assert metrics["idle_sessions"] == 1
+    assert metrics["spilled_total"] == 1
+
+
+def test_get_reloads_evicted_artifact_from_disk(tmp_path, clock):
+    store = _store(tmp_path, memory_cap=100)
+    first = store.put(b"x" * 80)
+    store.put(b"y" * 80)
+    assert first not in store._hot
+
+    assert store.get(first) == b"x" * 80
+
+    metrics = store.metrics()
+    assert metrics["disk_reads_total"] == 1
+    assert first in store._hot
+    assert metrics["resident_artifact_bytes"] <= 100
+
+
+def test_get_missing_handle_returns_none(tmp_path, clock):
+    store = _store(tmp_path, memory_cap=100)
+    assert store.get("0" * 64) is None
+    assert store.get(None) is None
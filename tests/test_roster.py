@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+from aac_assets_generator import pipeline
+from aac_assets_generator.roster import Roster
+from aac_assets_generator.scheduler import Priority
+from perf.fake_servers import fake_user_data
+
+
+def _student(api_key, name, account="teacher-1"):
+    record = fake_user_data(api_key)
+    record["name"] = json.dumps([name], ensure_ascii=False)
+    record["userAccount"] = account
+    return record
+
+
+def test_roster_generates_once_per_profile_and_fans_out(monkeypatch):
+    calls = []
+
+    async def fake_generate_board_assets(user_data, prompt_data, *args, priority, case_info):
+        calls.append((user_data["userAccount"], prompt_data["board"], priority, case_info))
+        return f"asset-{prompt_data['board']}", "evaluate", "主標題", "副標題", case_info
+
+    monkeypatch.setattr(pipeline, "generate_board_assets", fake_generate_board_assets)
+    # 前兩位學生只有姓名不同，屬於同一種個案特徵
+    roster = Roster.from_records(
+        [_student("k1", "小明"), _student("k1", "小華"), _student("k2", "小美")]
+    )
+    boards = [("b1", {"board": "b1"}), ("b2", {"board": "b2"})]
+
+    results = asyncio.run(pipeline.generate_roster_assets(roster, boards, None, None, "teacher-1"))
+
+    assert len(roster.groups()) == 2
+    assert len(calls) == 4
+    # 排程器看到的是真正的帳號，整份名單與其他使用者公平分享名額
+    assert {account for account, _, _, _ in calls} == {"teacher-1"}
+    assert {priority for _, _, priority, _ in calls} == {Priority.BATCH}
+    # 送去生成的內容不含姓名
+    assert all("小明" not in info and "小華" not in info for _, _, _, info in calls)
+    assert len(results) == 6
+    for row in range(len(roster)):
+        for board_id, _ in boards:
+            learning_asset, _, _, _, case_info = results[(row, board_id)]
+            assert learning_asset == f"asset-{board_id}"
+            assert case_info == roster.frame["case_info"].iloc[row]
+    assert "小華" in results[(1, "b1")][4]
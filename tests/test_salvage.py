@@ -0,0 +1,127 @@
+import asyncio
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from aac_assets_generator import salvage
+from aac_assets_generator.salvage import repair_json, salvage_locally
+
+
+class Item(BaseModel):
+    question: str
+
+
+class Worksheet(BaseModel):
+    title: str
+    items: List[Item]
+    notes: str
+
+
+class Guide(BaseModel):
+    goal: str
+    steps: List[str]
+
+
+class Doc(BaseModel):
+    summary: str
+    worksheet: Worksheet
+    guide: Guide
+
+
+FULL = (
+    '{"summary": "s", "worksheet": {"title": "t", "items": [{"question": "q1"}, '
+    '{"question": "q2"}], "notes": "n"}, "guide": {"goal": "g", "steps": ["a", "b"]}}'
+)
+
+
+def _cut_before(marker):
+    return FULL[: FULL.index(marker)]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": "hel', {"a": "hel"}),
+        ('{"a": "x\\', {"a": "x"}),
+        ('{"a": [1, 2, 3', {"a": [1, 2, 3]}),
+        ('{"a": 1, "b": [', {"a": 1, "b": []}),
+        ('{"a": {"b": 1, "c": {"d": "x"', {"a": {"b": 1, "c": {"d": "x"}}}),
+        ('{"a": [{"b": 1}, {"b": 2, "c"', {"a": [{"b": 1}, {"b": 2}]}),
+        ('{"a": 1, "b":', {"a": 1}),
+        ('```json\n{"a": 1}\n```', {"a": 1}),
+    ],
+    ids=[
+        "mid-string",
+        "mid-escape",
+        "mid-array",
+        "empty-array",
+        "mid-object",
+        "dangling-key",
+        "missing-value",
+        "code-fence",
+    ],
+)
+def test_repair_json_closes_truncated_output(text, expected):
+    assert repair_json(text) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "not json"])
+def test_repair_json_gives_up_on_garbage(text):
+    assert repair_json(text) is None
+
+
+def test_salvage_complete_output():
+    parsed, _, sections = salvage_locally(FULL, Doc)
+    assert parsed == Doc.model_validate_json(FULL)
+    assert sections == []
+
+
+def test_salvage_drops_truncated_list_item():
+    # 第二題只剩一半：丟掉後其餘內容仍不完整，但已寫完的題目保留
+    _, data, sections = salvage_locally(_cut_before('ion": "q2"'), Doc)
+    assert data["worksheet"]["items"] == [{"question": "q1"}]
+    assert set(sections) == {("worksheet", "notes"), ("guide",)}
+
+
+def test_salvage_narrows_to_missing_field():
+    _, data, sections = salvage_locally(_cut_before('"steps"'), Doc)
+    assert data["guide"] == {"goal": "g"}
+    assert sections == [("guide", "steps")]
+
+
+def test_salvage_requests_whole_section_when_all_fields_missing():
+    _, _, sections = salvage_locally(_cut_before('"title"'), Doc)
+    assert set(sections) == {("worksheet",), ("guide",)}
+
+
+def test_salvage_keeps_sibling_fields_separate():
+    text = (
+        '{"summary": "s", "worksheet": {"items": [{"question": "q"}]}, '
+        '"guide": {"goal": "g", "steps": ["a"]}}'
+    )
+    _, _, sections = salvage_locally(text, Doc)
+    assert set(sections) == {("worksheet", "title"), ("worksheet", "notes")}
+
+
+def test_salvage_rejects_non_object():
+    assert salvage_locally('["x"]', Doc) == (None, {}, [()])
+
+
+def test_missing_sections_are_requested_in_one_patch_call(monkeypatch):
+    _, data, sections = salvage_locally(_cut_before('"notes"'), Doc)
+    assert set(sections) == {("worksheet", "notes"), ("guide",)}
+    requested = []
+
+    async def fake_call_structured(client, model, messages, response_format, **kwargs):
+        requested.append(set(response_format.model_fields))
+        patch = response_format(worksheet__notes="n", guide=Guide(goal="g", steps=["a"]))
+        return patch, None, None, None
+
+    monkeypatch.setattr(salvage, "_call_structured", fake_call_structured)
+    result = asyncio.run(salvage.request_missing_sections(None, "o3", [], Doc, data, sections))
+
+    assert requested == [{"worksheet__notes", "guide"}]
+    assert result.worksheet.notes == "n"
+    assert result.worksheet.items == [Item(question="q1"), Item(question="q2")]
+    assert result.guide.steps == ["a"]
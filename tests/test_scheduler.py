@@ -0,0 +1,201 @@
+import asyncio
+
+from aac_assets_generator.scheduler import FairScheduler, Priority
+from aac_assets_generator.service_metrics import summary_line
+
+
+class Holder:
+    """取得名額後一直持有，直到測試放行"""
+
+    def __init__(self, scheduler, granted):
+        self.scheduler = scheduler
+        self.granted = granted
+        self.done = {}
+
+    def start(self, name, user, priority=Priority.INTERACTIVE):
+        done = self.done[name] = asyncio.Event()
+
+        async def run():
+            async with self.scheduler.slot(user, priority):
+                self.granted.append(name)
+                await done.wait()
+
+        return asyncio.create_task(run())
+
+    async def finish(self, name):
+        self.done[name].set()
+        await _settle()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def _run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_per_user_cap_limits_one_account():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=8, per_user_limit=2, interactive_reserve=0)
+        granted = []
+        holder = Holder(scheduler, granted)
+        tasks = [holder.start(f"a{i}", "school-a") for i in range(4)]
+        tasks.append(holder.start("b0", "school-b"))
+        await _settle()
+        snapshot = list(granted)
+        metrics = scheduler.metrics()
+        await holder.finish("a0")
+        after_release = list(granted)
+        for name in holder.done:
+            holder.done[name].set()
+        await asyncio.gather(*tasks)
+        return snapshot, metrics, after_release
+
+    snapshot, metrics, after_release = _run(scenario)
+    assert sorted(snapshot) == ["a0", "a1", "b0"]
+    assert metrics["running_by_user"] == {"school-a": 2, "school-b": 1}
+    assert metrics["classes"]["interactive"]["queued"] == 2
+    assert after_release[-1] == "a2"
+
+
+def test_accounts_take_turns_when_the_pool_is_full():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, interactive_reserve=0)
+        granted = []
+        holder = Holder(scheduler, granted)
+        tasks = [holder.start("blocker", "other")]
+        await _settle()
+        tasks += [holder.start(f"a{i}", "school-a") for i in range(3)]
+        tasks += [holder.start(f"b{i}", "school-b") for i in range(2)]
+        await _settle()
+        for name in ["blocker", "a0", "b0", "a1", "b1", "a2"]:
+            await holder.finish(name)
+        await asyncio.gather(*tasks)
+        return granted
+
+    # 先排隊的使用者不會一次用完所有名額
+    assert _run(scenario) == ["blocker", "a0", "b0", "a1", "b1", "a2"]
+
+
+def test_weights_give_heavier_accounts_a_larger_share():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, interactive_reserve=0)
+        scheduler.set_weight("paid", 2.0)
+        granted = []
+        holder = Holder(scheduler, granted)
+        tasks = [holder.start("blocker", "other")]
+        await _settle()
+        tasks += [holder.start(f"p{i}", "paid") for i in range(4)]
+        tasks += [holder.start(f"f{i}", "free") for i in range(2)]
+        await _settle()
+        while len(granted) < 7:
+            await holder.finish(granted[-1])
+        await holder.finish(granted[-1])
+        await asyncio.gather(*tasks)
+        return granted
+
+    # 權重 2 的使用者每輪分到兩倍的名額
+    assert _run(scenario) == ["blocker", "p0", "f0", "p1", "p2", "f1", "p3"]
+
+
+def test_interactive_requests_go_ahead_of_background_work():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=4, interactive_reserve=0)
+        granted = []
+        holder = Holder(scheduler, granted)
+        tasks = [holder.start("blocker", "other")]
+        await _settle()
+        tasks.append(holder.start("batch", "school-a", Priority.BATCH))
+        tasks.append(holder.start("prefetch", "school-a", Priority.PREFETCH))
+        tasks.append(holder.start("interactive", "school-b"))
+        await _settle()
+        for name in ["blocker", "interactive", "prefetch", "batch"]:
+            await holder.finish(name)
+        await asyncio.gather(*tasks)
+        return granted
+
+    assert _run(scenario) == ["blocker", "interactive", "prefetch", "batch"]
+
+
+def test_background_work_cannot_use_the_interactive_reserve():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=4, per_user_limit=10, interactive_reserve=2)
+        granted = []
+        holder = Holder(scheduler, granted)
+        tasks = [holder.start(f"batch{i}", f"school-{i}", Priority.BATCH) for i in range(10)]
+        await _settle()
+        background = list(granted)
+        # 背景工作塞滿可用名額時，互動請求仍立即取得保留的名額
+        tasks += [holder.start(f"user{i}", f"teacher-{i}") for i in range(2)]
+        await _settle()
+        admitted = list(granted)
+        metrics = scheduler.metrics()
+        for name in holder.done:
+            holder.done[name].set()
+        await asyncio.gather(*tasks)
+        return background, admitted, metrics
+
+    background, admitted, metrics = _run(scenario)
+    assert len(background) == 2
+    assert admitted[2:] == ["user0", "user1"]
+    assert metrics["classes"]["interactive"]["wait_p95"] < 0.1
+    assert metrics["classes"]["batch"]["queued"] == 8
+    assert metrics["running_total"] == 4
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, interactive_reserve=0)
+        granted = []
+        holder = Holder(scheduler, granted)
+        tasks = [holder.start("blocker", "other")]
+        await _settle()
+        waiting = holder.start("gone", "school-a")
+        await _settle()
+        waiting.cancel()
+        await _settle()
+        depth = scheduler.queue_depth()
+        await holder.finish("blocker")
+        await asyncio.gather(*tasks)
+        return depth, scheduler.metrics()["running_total"]
+
+    assert _run(scenario) == (0, 0)
+
+
+def test_summary_line_reports_queue_depth():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, per_user_limit=1, interactive_reserve=0)
+        holder = Holder(scheduler, [])
+        holder.start("blocker", "u0")
+        holder.start("queued", "u1", Priority.BATCH)
+        await _settle()
+        line = summary_line({"scheduler": scheduler.metrics()})
+        await holder.finish("blocker")
+        await holder.finish("queued")
+        return line
+
+    line = _run(scenario)
+    assert "執行中 1" in line
+    assert "batch=1" in line
+
+
+def test_batch_work_uses_its_own_per_user_cap():
+    async def scenario():
+        scheduler = FairScheduler(
+            max_concurrency=8, per_user_limit=1, interactive_reserve=2, batch_per_user_limit=3
+        )
+        granted = []
+        holder = Holder(scheduler, granted)
+        for i in range(5):
+            holder.start(f"b{i}", "teacher", Priority.BATCH)
+        holder.start("other", "someone", Priority.BATCH)
+        await _settle()
+        admitted = list(granted)
+        for name in ["b0", "b1", "b2", "other", "b3", "b4"]:
+            await holder.finish(name)
+        return admitted
+
+    # 批次上限之內仍與其他使用者輪流：第二個帳號不必等整份名單跑完
+    assert sorted(_run(scenario)) == ["b0", "b1", "b2", "other"]
@@ -0,0 +1,214 @@
+import asyncio
+
+import pytest
+from pydantic import BaseModel
+
+from aac_assets_generator import singleflight
+from aac_assets_generator.scheduler import Priority
+from aac_assets_generator.serialization import model_to_json
+from aac_assets_generator.singleflight import SingleFlight, StateFlightStore
+from aac_assets_generator.state_backend import MemoryStateBackend
+
+
+class Answer(BaseModel):
+    value: str
+
+
+class FakeCall:
+    """可控制完成時機的假 LLM 呼叫"""
+
+    def __init__(self, result="ok", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        call = FakeCall()
+        waiters = [asyncio.create_task(flight.do("k", call)) for _ in range(3)]
+        await _settle()
+        call.release.set()
+        results = await asyncio.gather(*waiters)
+        return flight, call, results
+
+    flight, call, results = asyncio.run(scenario())
+    assert results == ["ok", "ok", "ok"]
+    assert call.calls == 1
+    assert flight.metrics()["leaders"] == 1
+    assert flight.metrics()["coalesced"] == 2
+    assert flight.in_flight() == 0
+
+
+def test_cancelling_one_waiter_keeps_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        call = FakeCall()
+        leader = asyncio.create_task(flight.do("k", call))
+        follower = asyncio.create_task(flight.do("k", call))
+        await _settle()
+        leader.cancel()
+        await _settle()
+        call.release.set()
+        return call, leader, await follower
+
+    call, leader, result = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert result == "ok"
+    assert call.cancelled == 0
+
+
+def test_last_waiter_leaving_cancels_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        call = FakeCall()
+        waiters = [asyncio.create_task(flight.do("k", call)) for _ in range(2)]
+        await _settle()
+        for waiter in waiters:
+            waiter.cancel()
+        await _settle()
+        return flight, call
+
+    flight, call = asyncio.run(scenario())
+    assert call.cancelled == 1
+    assert flight.in_flight() == 0
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    async def scenario():
+        flight = SingleFlight()
+        failing = FakeCall(error=RuntimeError("boom"))
+        waiters = [asyncio.create_task(flight.do("k", failing)) for _ in range(2)]
+        await _settle()
+        failing.release.set()
+        outcomes = await asyncio.gather(*waiters, return_exceptions=True)
+        retry = FakeCall()
+        retry.release.set()
+        return outcomes, await flight.do("k", retry)
+
+    outcomes, retried = asyncio.run(scenario())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert retried == "ok"
+
+
+def test_interactive_caller_supersedes_a_prefetch_flight():
+    async def scenario():
+        flight = SingleFlight()
+        prefetch = FakeCall("prefetch")
+        interactive = FakeCall("interactive")
+        batch = FakeCall("batch")
+        background = asyncio.create_task(flight.do("k", prefetch, priority=Priority.PREFETCH))
+        await _settle()
+        user = asyncio.create_task(flight.do("k", interactive, priority=Priority.INTERACTIVE))
+        await _settle()
+        # 較低優先權的請求加入已提升的互動呼叫
+        late = asyncio.create_task(flight.do("k", batch, priority=Priority.BATCH))
+        await _settle()
+        interactive.release.set()
+        results = await asyncio.gather(background, user, late)
+        return flight, prefetch, batch, results
+
+    flight, prefetch, batch, results = asyncio.run(scenario())
+    assert results == ["interactive"] * 3
+    assert prefetch.cancelled == 1
+    assert batch.calls == 0
+    assert flight.metrics()["promoted"] == 1
+
+
+def test_background_caller_joins_an_interactive_flight():
+    async def scenario():
+        flight = SingleFlight()
+        interactive = FakeCall("interactive")
+        prefetch = FakeCall("prefetch")
+        user = asyncio.create_task(flight.do("k", interactive))
+        await _settle()
+        background = asyncio.create_task(flight.do("k", prefetch, priority=Priority.PREFETCH))
+        await _settle()
+        interactive.release.set()
+        return prefetch, await asyncio.gather(user, background)
+
+    prefetch, results = asyncio.run(scenario())
+    assert results == ["interactive", "interactive"]
+    assert prefetch.calls == 0
+
+
+@pytest.fixture
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLEFLIGHT_POLL_INTERVAL", 0.01)
+
+
+def test_other_replica_waits_for_the_published_result(fast_polling):
+    async def scenario():
+        store = StateFlightStore(MemoryStateBackend())
+        replica_a, replica_b = SingleFlight(store), SingleFlight(store)
+        call_a = FakeCall(Answer(value="from a"))
+        call_b = FakeCall(Answer(value="from b"))
+        task_a = asyncio.create_task(replica_a.do("k", call_a, model_cls=Answer))
+        await asyncio.sleep(0.05)
+        task_b = asyncio.create_task(replica_b.do("k", call_b, model_cls=Answer))
+        await asyncio.sleep(0.05)
+        call_a.release.set()
+        return replica_b, call_b, await task_a, await task_b, store
+
+    replica_b, call_b, result_a, result_b, store = asyncio.run(scenario())
+    assert result_a == result_b == Answer(value="from a")
+    assert call_b.calls == 0
+    assert replica_b.metrics()["remote_coalesced"] == 1
+    # 領頭者完成後釋放租約
+    assert store.try_acquire("k", 1) is not None
+
+
+def test_follower_generates_itself_when_the_lease_runs_out(fast_polling, monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLEFLIGHT_LEASE_SECONDS", 0.1)
+
+    async def scenario():
+        store = StateFlightStore(MemoryStateBackend())
+        # 另一個副本取得租約後就沒有回應
+        stuck_token = store.try_acquire("k", 60)
+        call = FakeCall(Answer(value="own"))
+        call.release.set()
+        result = await SingleFlight(store).do("k", call, model_cls=Answer)
+        return store, stuck_token, call, result
+
+    store, stuck_token, call, result = asyncio.run(scenario())
+    assert result == Answer(value="own")
+    assert call.calls == 1
+    # 沒有持有租約的一方不會釋放別人的租約
+    assert store.try_acquire("k", 1) is None
+    store.release("k", stuck_token)
+    assert store.try_acquire("k", 1) is not None
+
+
+def test_result_published_just_before_the_lease_is_released_is_reused():
+    async def scenario():
+        store = StateFlightStore(MemoryStateBackend())
+        # 前一位領頭者已發布結果並釋放租約，之後才輪到這個副本輪詢
+        store.publish("k", model_to_json(Answer(value="published")), 60)
+        call = FakeCall(Answer(value="duplicate"))
+        call.release.set()
+        result = await SingleFlight(store).do("k", call, model_cls=Answer)
+        return store, call, result
+
+    store, call, result = asyncio.run(scenario())
+    assert result == Answer(value="published")
+    assert call.calls == 0
+    assert store.try_acquire("k", 1) is not None
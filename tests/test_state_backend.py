@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from aac_assets_generator import state_backend
+from aac_assets_generator.state_backend import (
+    REPLICA_ID,
+    MemoryStateBackend,
+    SQLiteStateBackend,
+    finish_job,
+    job_status,
+    publish_job,
+    running_elsewhere,
+)
+
+
+class FakeClock:
+    """同時取代 monotonic（memory）與 time（sqlite）"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(state_backend, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryStateBackend()
+    return SQLiteStateBackend(str(tmp_path / "state.sqlite3"))
+
+
+def test_nx_refuses_to_overwrite_live_key(backend):
+    assert backend.set("lease", "owner-a", ttl=10, nx=True)
+    assert not backend.set("lease", "owner-b", ttl=10, nx=True)
+    assert backend.get("lease") == b"owner-a"
+
+
+def test_nx_refuses_key_without_ttl(backend):
+    assert backend.set("lease", "owner-a")
+    assert not backend.set("lease", "owner-b", ttl=10, nx=True)
+    assert backend.get("lease") == b"owner-a"
+
+
+def test_nx_succeeds_after_expiry(backend, clock):
+    assert backend.set("lease", "owner-a", ttl=10, nx=True)
+    clock.advance(11)
+    assert backend.get("lease") is None
+    assert not backend.exists("lease")
+    assert backend.set("lease", "owner-b", ttl=10, nx=True)
+    assert backend.get("lease") == b"owner-b"
+
+
+def test_delete_if_refuses_other_owner(backend):
+    backend.set("lease", "owner-a", ttl=10)
+    assert not backend.delete_if("lease", "owner-b")
+    assert backend.get("lease") == b"owner-a"
+    assert backend.delete_if("lease", "owner-a")
+    assert backend.get("lease") is None
+
+
+def test_delete_if_ignores_expired_lease(backend, clock):
+    backend.set("lease", "owner-a", ttl=10)
+    clock.advance(11)
+    assert not backend.delete_if("lease", "owner-a")
+
+
+def test_set_without_nx_overwrites(backend):
+    backend.set("key", b"\x00binary", ttl=10)
+    backend.set("key", "text")
+    assert backend.get("key") == b"text"
+    backend.delete("key")
+    assert backend.get("key") is None
+
+
+@pytest.fixture
+def shared_backend(monkeypatch, tmp_path, clock):
+    backend = SQLiteStateBackend(str(tmp_path / "shared.sqlite3"))
+    monkeypatch.setattr(state_backend, "_state_backend", backend)
+    return backend
+
+
+def test_finish_job_removes_own_status(shared_backend):
+    publish_job("board", 7)
+    assert job_status("board")["replica"] == REPLICA_ID
+    assert not running_elsewhere("board")
+
+    finish_job("board", 7)
+
+    assert job_status("board") is None
+
+
+def test_finish_job_keeps_newer_job(shared_backend):
+    publish_job("board", 7)
+    publish_job("board", 8)
+
+    finish_job("board", 7)
+
+    assert job_status("board")["job_id"] == 8
+
+
+def test_finish_job_keeps_other_replica(shared_backend):
+    status = {"replica": "other-host:1", "job_id": 7, "started_at": 0}
+    shared_backend.set("job:board", json.dumps(status), ttl=60)
+
+    finish_job("board", 7)
+
+    assert running_elsewhere("board")
+
+
+def test_job_status_is_local_only_without_shared_backend(monkeypatch, clock):
+    monkeypatch.setattr(state_backend, "_state_backend", MemoryStateBackend())
+    publish_job("board", 7)
+    assert job_status("board") is None
+    assert not running_elsewhere("board")
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from aac_assets_generator.circuit_breaker import CircuitOpenError
+from aac_assets_generator.learning_joint_models import LearningJointAssets
+from aac_assets_generator.two_tier import TwoTierGenerator
+from perf.bench_docx import CASE_INFO, build_fixture
+
+
+def _joint(size):
+    learning_asset, learning_evaluate = build_fixture(size)
+    return LearningJointAssets(learning_asset=learning_asset, learning_evaluate=learning_evaluate)
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    generator = TwoTierGenerator(client=None)
+    base = _joint(1)
+
+    async def get_base(*args, **kwargs):
+        return base
+
+    monkeypatch.setattr(generator, "get_base", get_base)
+    return generator
+
+
+def _generate(generator, board):
+    return asyncio.run(generator.generate_two_tier_async(CASE_INFO, f"版面內容 {board}"))
+
+
+def test_adapted_result_is_returned(generator, monkeypatch):
+    adapted = _joint(3)
+
+    async def adapt(*args, **kwargs):
+        return adapted
+
+    monkeypatch.setattr(generator, "_adapt", adapt)
+
+    assert _generate(generator, "ok") == (
+        adapted.learning_asset,
+        adapted.learning_evaluate,
+        CASE_INFO,
+    )
+
+
+@pytest.mark.parametrize("outcome", [None, ValueError("bad output")], ids=["empty", "error"])
+def test_failed_adaptation_does_not_return_generic_base(generator, monkeypatch, outcome):
+    async def adapt(*args, **kwargs):
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(generator, "_adapt", adapt)
+
+    # 通用教材不能當成這位學生的個人化結果
+    assert _generate(generator, f"fail-{outcome}") == (None, None, CASE_INFO)
+
+
+def test_open_circuit_propagates(generator, monkeypatch):
+    async def adapt(*args, **kwargs):
+        raise CircuitOpenError("openai", 10)
+
+    monkeypatch.setattr(generator, "_adapt", adapt)
+
+    with pytest.raises(CircuitOpenError):
+        _generate(generator, "circuit")